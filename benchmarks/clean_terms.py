@@ -0,0 +1,142 @@
+"""Check the results of cleaning concept definition terms, and measure the cost of cleaning them.
+
+The cleaned forms of a set of regression cases (covering quoted phrases, unbalanced quotes and unusual whitespace) are
+checked first, followed by the time taken to clean both typical terms and pathological ones (e.g. long terms with an
+unbalanced quote). The regular expression based cleaner that was used before is timed alongside for comparison.
+
+Run from the top level directory with:
+    python -m benchmarks.clean_terms
+
+"""
+
+# Python imports.
+import argparse
+import random
+import re
+import time
+
+# User imports.
+from webapp.utilities import cleaners
+
+
+# The regression cases, as pairs of a term and its cleaned form.
+_REGRESSION_CASES = [
+    ('', ''),
+    ("   ", ''),
+    ("type 2 diabetes", "type 2 diabetes"),
+    ("  type   2\tdiabetes  ", "type 2 diabetes"),
+    ("type  2 diabetes", "type 2 diabetes"),
+    ('  the    dog \t\t  " jumped   over   the    "     fence    ', 'the dog " jumped   over   the    " fence'),
+    ('"quoted   at   start"  then  text', '"quoted   at   start" then text'),
+    ('text  then  "quoted   at   end"', 'text then "quoted   at   end"'),
+    ('"one  "  and  "two  "', '"one  " and "two  "'),
+    ('"adjacent  ""quotes  "', '"adjacent  ""quotes  "'),
+    ('a  "b  c"d  e', 'a "b  c"d e'),
+    ('""  empty  quotes', '"" empty quotes'),
+    ('unbalanced  "quote  here', 'unbalanced "quote here'),
+    ('"balanced  "  then  "unbalanced  one', '"balanced  " then "unbalanced one'),
+    ('quote  "across\nlines  "  here', 'quote "across lines " here'),
+    ('"   "', '"   "'),
+    ('  "leading  quote"', '"leading  quote"'),
+]
+
+
+def main(terms=100000, repeats=5, seed=0):
+    """Run the regression checks and the benchmark.
+
+    :param terms:   The number of typical terms to clean.
+    :type terms:    int
+    :param repeats: The number of times to time each cleaner. The fastest time is reported.
+    :type repeats:  int
+    :param seed:    The seed of the random number generator used to make the typical terms.
+    :type seed:     int
+
+    """
+
+    # Check the regression cases.
+    failures = [(i, j, cleaners.term_cleaner(i)) for i, j in _REGRESSION_CASES if cleaners.term_cleaner(i) != j]
+    for term, expected, cleaned in failures:
+        print("FAILED: {0!r} was cleaned to {1!r} rather than {2!r}".format(term, cleaned, expected))
+    if cleaners.terms_cleaner([i for i, _ in _REGRESSION_CASES]) != [j for _, j in _REGRESSION_CASES]:
+        failures.append(None)
+        print("FAILED: the batch cleaner does not match the single term cleaner")
+    if failures:
+        raise ValueError("{0:d} regression checks failed.".format(len(failures)))
+    print("Regression cases: all {0:d} passed".format(len(_REGRESSION_CASES)))
+
+    # Make the typical terms, with whitespace runs of varying lengths and some quoted phrases.
+    rng = random.Random(seed)
+    words = ["diabetes", "type", "1", "2", "mellitus", "insulin", "retinopathy", "renal", "foot", "ulcer"]
+    typicalTerms = []
+    for _ in range(terms):
+        term = ''.join(rng.choice(words) + rng.choice([' ', ' ', "  ", '\t', " \t "]) for _ in range(rng.randint(1, 6)))
+        if rng.random() < 0.2:
+            term = '{0:s}"{1:s}  {2:s}"'.format(term, rng.choice(words), rng.choice(words))
+        typicalTerms.append("  " + term)
+
+    # Make the pathological terms.
+    pathologicalTerms = [
+        ("Long unbalanced quote", ['"' + "word   " * 20000]),
+        ("Many unbalanced quotes", ['" ' * 20000 + "word   " * 20000]),
+        ("Many quoted phrases", ['"quoted   phrase"   ' * 20000]),
+        ("Long whitespace runs", [(" " * 10000 + "word") * 20])
+    ]
+
+    # Time the cleaners.
+    cases = [("{0:d} typical terms".format(terms), typicalTerms)] + pathologicalTerms
+    for name, caseTerms in cases:
+        batchTime = _fastest_time(lambda: cleaners.terms_cleaner(caseTerms), repeats)
+        singleTime = _fastest_time(lambda: [cleaners.term_cleaner(i) for i in caseTerms], repeats)
+        referenceTime = _fastest_time(lambda: [_reference_term_cleaner(i) for i in caseTerms], repeats)
+        print("{0:s}: batch {1:.4f}s, one at a time {2:.4f}s, previous cleaner {3:.4f}s".format(
+            name, batchTime, singleTime, referenceTime))
+
+
+def _fastest_time(function, repeats):
+    """Time a function.
+
+    :param function:    The function to time.
+    :type function:     function
+    :param repeats:     The number of times to time the function.
+    :type repeats:      int
+    :return:            The fastest time taken, in seconds.
+    :rtype:             float
+
+    """
+
+    times = []
+    for _ in range(repeats):
+        startTime = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - startTime)
+    return min(times)
+
+
+def _reference_term_cleaner(term):
+    """Clean a term in the way it was done before the single pass cleaner (for timing only, as it mangled quotes).
+
+    :param term:    The term to clean.
+    :type term:     str
+    :return:        The cleaned term.
+    :rtype:         str
+
+    """
+
+    findWhitespace = re.compile("\s+")
+    currentTermIndex = 0
+    newTerm = ""
+    for i in re.finditer('(".*?")', term.strip()):
+        subString = findWhitespace.sub(' ', term[currentTermIndex:i.span()[0]])
+        newTerm += subString + i.group()
+        currentTermIndex = i.span()[1] + 1
+    subString = findWhitespace.sub(' ', term[currentTermIndex:])
+    newTerm += subString
+    return newTerm
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check and benchmark the cleaning of concept definition terms.")
+    parser.add_argument("-t", "--terms", type=int, default=100000, help="The number of typical terms to clean.")
+    parser.add_argument("-r", "--repeats", type=int, default=5, help="The number of times to time each cleaner.")
+    args = parser.parse_args()
+    main(args.terms, args.repeats)
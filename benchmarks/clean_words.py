@@ -0,0 +1,101 @@
+"""Measure the cost per description of splitting the descriptions of a Read V2 release into their cleaned words.
+
+The batch tokeniser (cleaners.tokenise_descriptions) is compared with tokenising one description at a time, and with
+the regular expression split and per-call tables that were used before. The words found by each are checked to be the
+same.
+
+Run from the top level directory with:
+    python -m benchmarks.clean_words database_setup/Data/Current/ReadV2Data.gz
+
+"""
+
+# Python imports.
+import argparse
+import gzip
+import re
+import time
+
+# User imports.
+from webapp.utilities import cleaners
+
+
+def main(fileReadV2Data, repeats=5):
+    """Run the benchmark.
+
+    :param fileReadV2Data:  The location of the Read V2 data file to take the descriptions from.
+    :type fileReadV2Data:   str
+    :param repeats:         The number of times to time each tokeniser. The fastest time is reported.
+    :type repeats:          int
+
+    """
+
+    # Extract the longest description on each line.
+    descriptions = []
+    with gzip.open(fileReadV2Data, 'rt', encoding="utf-8") as fidReadV2Data:
+        for line in fidReadV2Data:
+            chunks = line.strip()[1:-1].split('","')
+            descriptions.append(chunks[4] if chunks[4] else (chunks[3] if chunks[3] else chunks[2]))
+    print("Tokenising {0:d} descriptions".format(len(descriptions)))
+
+    tokenisers = [
+        ("Per-call tables", lambda: [_reference_tokeniser(i) for i in descriptions]),
+        ("One at a time", lambda: [cleaners.tokenise_description(i) for i in descriptions]),
+        ("Batch", lambda: cleaners.tokenise_descriptions(descriptions))
+    ]
+    expectedWords = None
+    for name, tokeniser in tokenisers:
+        tokenTimes = []
+        for _ in range(repeats):
+            startTime = time.perf_counter()
+            words = tokeniser()
+            tokenTimes.append(time.perf_counter() - startTime)
+        if expectedWords is None:
+            expectedWords = words
+        elif words != expectedWords:
+            raise ValueError("{0:s} found different words to the per-call tables.".format(name))
+        print("{0:s}: {1:.2f}s ({2:.0f}ns per description)".format(
+            name, min(tokenTimes), min(tokenTimes) / len(descriptions) * 1e9))
+
+
+def _reference_tokeniser(description):
+    """Split a description into its cleaned words in the way it was done before the tables were precompiled.
+
+    :param description: The description to split.
+    :type description:  str
+    :return:            The cleaned words of the description.
+    :rtype:             list
+
+    """
+
+    wordFinder = re.compile("\s+")
+    bracketFinder = re.compile("(\[.*?\])\s*")
+    splittableDescription = description.lower()
+    isBracketedStart = bracketFinder.match(splittableDescription)
+    if isBracketedStart:
+        splittableDescription = splittableDescription[isBracketedStart.span()[1]:]
+    words = wordFinder.split(splittableDescription)
+
+    endPunctuation = {'.', ',', '-', '+', '*', '%', '&', ':', ';', '?', '!', '[', ']', '{', '}', '(', ')', "'", '=',
+                      '"'}
+    wordsToRemove = {'a', "an", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of", "on", "that",
+                     "the", "this", "to", "was", "with", "the"}
+    wordsToRemove |= endPunctuation
+    cleanedWords = []
+    for i in words:
+        if i in wordsToRemove:
+            continue
+        while i and i[0] in endPunctuation:
+            i = i[1:]
+        while i and i[-1] in endPunctuation:
+            i = i[:-1]
+        if i:
+            cleanedWords.append(i)
+    return cleanedWords
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the splitting of descriptions into words.")
+    parser.add_argument("fileReadV2Data", help="The location of the Read V2 data file to take the descriptions from.")
+    parser.add_argument("-r", "--repeats", type=int, default=5, help="The number of times to time each tokeniser.")
+    args = parser.parse_args()
+    main(args.fileReadV2Data, args.repeats)
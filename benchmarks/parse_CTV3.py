@@ -0,0 +1,147 @@
+"""Measure the time taken to parse a CTV3 release, and the memory needed to parse it.
+
+Unless the directory of a real release is given, a synthetic release of about the size of CTV3 is generated to parse.
+The synthetic release has the same file layout as a real one (Terms.v3, Descrip.v3, V3hier.v3 and Redun.map), with a
+hierarchy that has multiple parents for some concepts, several terms per concept and a share of redundant codes.
+
+Run from the top level directory with:
+    python -m benchmarks.parse_CTV3
+    python -m benchmarks.parse_CTV3 --release database_setup/Data/Current/CTV3
+
+"""
+
+# Python imports.
+import argparse
+import gc
+import os
+import random
+import resource
+import tempfile
+import time
+
+# User imports.
+from database_setup import ontology_parsing
+
+
+# The characters that CTV3 codes (and term IDs) are made up of.
+_CODE_CHARACTERS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+
+def main(dirCTV3Data=None, concepts=300000, repeats=3):
+    """Run the benchmark.
+
+    :param dirCTV3Data: The directory containing the CTV3 data files to parse. If None, a synthetic release is
+                            generated and parsed.
+    :type dirCTV3Data:  str
+    :param concepts:    The number of concepts in the synthetic release.
+    :type concepts:     int
+    :param repeats:     The number of times to time the parsing. The fastest time is reported.
+    :type repeats:      int
+
+    """
+
+    with tempfile.TemporaryDirectory() as dirTemp:
+        if dirCTV3Data is None:
+            dirCTV3Data = dirTemp
+            startTime = time.perf_counter()
+            write_release(dirCTV3Data, concepts)
+            print("Generated a synthetic release in {0:.2f}s".format(time.perf_counter() - startTime))
+        for i in sorted(os.listdir(dirCTV3Data)):
+            print("    {0:s}: {1:.1f}MB".format(i, os.path.getsize(os.path.join(dirCTV3Data, i)) / 2 ** 20))
+
+        # Time the parsing.
+        parseTimes = []
+        for _ in range(repeats):
+            startTime = time.perf_counter()
+            hierarchy = ontology_parsing.parse_CTV3(dirCTV3Data)
+            parseTimes.append(time.perf_counter() - startTime)
+            del hierarchy
+            gc.collect()
+        print("Parse time: {0:.2f}s (fastest of {1:d})".format(min(parseTimes), repeats))
+
+        # Report the peak resident set size of the process while parsing (ru_maxrss is in kilobytes on Linux).
+        print("Peak RSS while parsing: {0:.1f}MB".format(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10))
+
+        concepts, terms, words, relationships = ontology_parsing.parse_CTV3(dirCTV3Data)
+        print("Records: {0:d} concepts, {1:d} terms, {2:d} words and {3:d} relationships".format(
+            len(concepts), len(terms), len(words), len(relationships)))
+
+
+def write_release(dirOutput, concepts, seed=0):
+    """Write a synthetic CTV3 release.
+
+    :param dirOutput:   The directory to write the data files to.
+    :type dirOutput:    str
+    :param concepts:    The number of (non-redundant) concepts in the release.
+    :type concepts:     int
+    :param seed:        The seed of the random number generator, so that the same release is always generated.
+    :type seed:         int
+
+    """
+
+    rng = random.Random(seed)
+    vocabulary = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 12)))
+                  for _ in range(20000)]
+    conceptIDs = ["....."] + [_code('X', i) for i in range(concepts - 1)]
+    redundantIDs = [_code('R', i) for i in range(concepts // 30)]
+    termCount = 0
+
+    with open(os.path.join(dirOutput, "Terms.v3"), 'w') as fidTerms, \
+            open(os.path.join(dirOutput, "Descrip.v3"), 'w') as fidDescrip, \
+            open(os.path.join(dirOutput, "V3hier.v3"), 'w') as fidHierarchy, \
+            open(os.path.join(dirOutput, "Redun.map"), 'w') as fidRedundant:
+        for i, conceptID in enumerate(conceptIDs + redundantIDs):
+            # Give the concept one primary and up to three secondary terms.
+            for j in range(rng.choice([1, 1, 1, 2, 2, 3, 4])):
+                termID = _code('Y', termCount)
+                termCount += 1
+                description = ' '.join(rng.choice(vocabulary) for _ in range(rng.randint(2, 8))).capitalize()
+                shortDescription = description[:30]
+                longerDescription = description[:60] if len(description) > 30 else ''
+                longestDescription = description if len(description) > 60 else ''
+                fidTerms.write("{0:s}|{1:s}|{2:s}|{3:s}|{4:s}\n".format(
+                    termID, rng.choice("CCCCO"), shortDescription, longerDescription, longestDescription))
+                fidDescrip.write("{0:s}|{1:s}|{2:s}\n".format(conceptID, termID, 'P' if j == 0 else 'S'))
+
+            # Give each concept (other than the root) a parent that was generated before it, with some concepts
+            # having a second parent. The first concepts are the top level concepts, and are children of the root.
+            if i == 0:
+                continue
+            parents = {0 if i <= 20 else rng.randrange(1, min(i, len(conceptIDs)))}
+            if i > 20 and rng.random() < 0.15:
+                parents.add(rng.randrange(1, min(i, len(conceptIDs))))
+            for j in sorted(parents):
+                fidHierarchy.write("{0:s}|{1:s}|{2:02d}\n".format(conceptID, conceptIDs[j], rng.randint(0, 99)))
+
+        # Redirect each redundant code to a concept.
+        for i in redundantIDs:
+            fidRedundant.write("{0:s}|{1:s}\n".format(conceptIDs[rng.randrange(1, len(conceptIDs))], i))
+
+
+def _code(prefix, number):
+    """Create a five character code.
+
+    :param prefix:  The first character of the code.
+    :type prefix:   str
+    :param number:  The number to encode in the remaining characters.
+    :type number:   int
+    :return:        The code.
+    :rtype:         str
+
+    """
+
+    characters = []
+    for _ in range(4):
+        number, remainder = divmod(number, len(_CODE_CHARACTERS))
+        characters.append(_CODE_CHARACTERS[remainder])
+    return prefix + "".join(reversed(characters))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the parsing of a CTV3 release.")
+    parser.add_argument("--release", help="The directory of a CTV3 release to parse instead of a synthetic one.")
+    parser.add_argument("-c", "--concepts", type=int, default=300000,
+                        help="The number of concepts in the synthetic release.")
+    parser.add_argument("-r", "--repeats", type=int, default=3, help="The number of times to time the parsing.")
+    args = parser.parse_args()
+    main(args.release, args.concepts, args.repeats)
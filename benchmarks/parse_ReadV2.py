@@ -0,0 +1,191 @@
+"""Measure the time and memory taken to parse a Read V2 release, before and after the records were made compact.
+
+The parser is compared with the string based parser that was used before, which held the parsed hierarchy as the tab
+separated lines of the Neo4j data files. Each parse is run in a fresh child process, so that the peak resident set
+size of one parse isn't hidden by that of the parses run before it.
+
+Run from the top level directory with:
+    python -m benchmarks.parse_ReadV2 database_setup/Data/Current/ReadV2Data.gz
+
+"""
+
+# Python imports.
+import argparse
+import gzip
+import multiprocessing
+import re
+import resource
+import time
+import tracemalloc
+
+# User imports.
+from database_setup import ontology_parsing
+
+
+def main(fileReadV2Data, repeats=3):
+    """Run the benchmark.
+
+    :param fileReadV2Data:  The location of the Read V2 data file to parse.
+    :type fileReadV2Data:   str
+    :param repeats:         The number of times to time each parser. The fastest time is reported.
+    :type repeats:          int
+
+    """
+
+    context = multiprocessing.get_context("spawn")
+    for parserName in sorted(_PARSERS):
+        # Time the parsing without tracing the memory allocations, as tracing slows the parsing down.
+        runs = []
+        for _ in range(repeats):
+            with context.Pool(1) as pool:
+                runs.append(pool.apply(_run_parser, (parserName, fileReadV2Data, False)))
+        parseTime = min(i[0] for i in runs)
+        peakRSS = max(i[1][1] for i in runs)
+        parseRSS = max(i[1][1] - i[1][0] for i in runs)
+
+        # Measure the memory held by the parsed hierarchy, and the peak memory allocated while parsing.
+        with context.Pool(1) as pool:
+            _, _, heldMemory, peakMemory, sizes = pool.apply(_run_parser, (parserName, fileReadV2Data, True))
+
+        print("{0:s} parser".format(parserName.capitalize()))
+        print("    Records: {0:d} concepts, {1:d} terms, {2:d} words and {3:d} relationships".format(*sizes))
+        print("    Parse time: {0:.2f}s (fastest of {1:d})".format(parseTime, repeats))
+        print("    Peak RSS while parsing: {0:.1f}MB ({1:.1f}MB above the peak before parsing)".format(
+            peakRSS / 2 ** 10, parseRSS / 2 ** 10))  # ru_maxrss is in KB on Linux.
+        print("    Memory held by the parsed hierarchy: {0:.1f}MB (peak while parsing {1:.1f}MB)".format(
+            heldMemory / 2 ** 20, peakMemory / 2 ** 20))
+
+
+def _baseline_input_word_cleaner(words):
+    """Clean a collection of words in the way that cleaners.input_word_cleaner used to.
+
+    :param words:   The collection of words to clean.
+    :type words:    list
+    :return:        The cleaned words.
+    :rtype:         list
+
+    """
+
+    endPunctuation = {'.', ',', '-', '+', '*', '%', '&', ':', ';', '?', '!', '[', ']', '{', '}', '(', ')', "'", '=',
+                      '"'}
+    wordsToRemove = {'a', "an", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of", "on", "that",
+                     "the", "this", "to", "was", "with", "the"}
+    wordsToRemove |= endPunctuation
+
+    subsetWords = [i for i in words if i not in wordsToRemove]
+    cleanedWords = []
+    for i in subsetWords:
+        while i and i[0] in endPunctuation:
+            i = i[1:]
+        while i and i[-1] in endPunctuation:
+            i = i[:-1]
+        if i:
+            cleanedWords.append(i)
+    return cleanedWords
+
+
+def _baseline_parse_ReadV2(fileReadV2Data):
+    """Parse a Read V2 release in the way that ontology_parsing.parse_ReadV2 used to.
+
+    :param fileReadV2Data:  The location where the Read V2 ontology data can be found.
+    :type fileReadV2Data:   str
+    :return:                The concepts, terms, words and relationships needed to model the Read V2 hierarchy.
+    :rtype:                 dict, dict, set, dict
+
+    """
+
+    concepts = dict()
+    domains = dict()
+    terms = dict()
+    words = []
+    relationships = dict()
+
+    wordFinder = re.compile("\\s+")
+    bracketFinder = re.compile("(\\[.*?\\])\\s*")
+
+    with gzip.open(fileReadV2Data, 'r') as fidReadV2Data:
+        for line in fidReadV2Data:
+            line = str(line.strip(), "utf-8")
+            chunks = line.split('","')
+            chunks[0] = chunks[0][1:]
+            chunks[-1] = chunks[-1][:-1]
+
+            conceptID = chunks[7].replace('.', '')
+            termIDRoot = chunks[5]
+            termID = "{0:s}_{1:s}".format(conceptID, termIDRoot)
+            description = chunks[4] if chunks[4] else (chunks[3] if chunks[3] else chunks[2])
+            descriptionLower = description.lower()
+
+            splittableDescription = descriptionLower
+            isBracketedStart = bracketFinder.match(splittableDescription)
+            if isBracketedStart:
+                splittableDescription = splittableDescription[isBracketedStart.span()[1]:]
+            termWords = _baseline_input_word_cleaner(wordFinder.split(splittableDescription))
+            words.extend(termWords)
+
+            terms[termID] = "{0:s}\ttrue\t{1:s}\t{2:s}\tReadV2_Term".format(termID, description, descriptionLower)
+            concepts[conceptID] = "{0:s}\ttrue\t{1:s}\t{2:d}\tReadV2_Concept".format(conceptID, "{0:s}", len(conceptID))
+
+            for i in termWords:
+                key = tuple(sorted([termID, i]))
+                relationships[key] = "{0:s}\tReadV2_Term\t{1:s}\tWord\t\tContains".format(termID, i)
+
+            key = tuple(sorted([conceptID, termID]))
+            relationships[key] = "{0:s}\tReadV2_Concept\t{1:s}\tReadV2_Term\t{2:s}\tDescribedBy".format(
+                conceptID, termID, "true" if termIDRoot == "00" else 'false')
+
+            if len(conceptID) > 1:
+                key = tuple(sorted([conceptID, conceptID[:-1]]))
+                relationships[key] = "{0:s}\tReadV2_Concept\t{1:s}\tReadV2_Concept\tparent\tParent".format(
+                    conceptID, conceptID[:-1])
+            elif termIDRoot == "00":
+                domains[conceptID] = description
+
+    for i in concepts:
+        concepts[i] = concepts[i].format(domains["{0:s}".format(i[0])])
+    words = set(words)
+
+    return concepts, terms, words, relationships
+
+
+def _run_parser(parserName, fileReadV2Data, traceMemory):
+    """Parse a Read V2 release in a child process, and measure the resources used.
+
+    :param parserName:      The name of the parser to run (a key of _PARSERS).
+    :type parserName:       str
+    :param fileReadV2Data:  The location of the Read V2 data file to parse.
+    :type fileReadV2Data:   str
+    :param traceMemory:     Whether to trace the memory allocated while parsing.
+    :type traceMemory:      bool
+    :return:                The time taken to parse the release, the peak resident set size of the process before
+                                and after parsing (in KB), the memory held by the parsed hierarchy and the peak memory
+                                allocated while parsing (both in bytes, and None when not traced), and the number of
+                                concepts, terms, words and relationships parsed.
+    :rtype:                 float, tuple, int, int, list
+
+    """
+
+    startRSS = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if traceMemory:
+        tracemalloc.start()
+    startTime = time.perf_counter()
+    hierarchy = _PARSERS[parserName](fileReadV2Data)
+    parseTime = time.perf_counter() - startTime
+    heldMemory = peakMemory = None
+    if traceMemory:
+        heldMemory, peakMemory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    peakRSS = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return parseTime, (startRSS, peakRSS), heldMemory, peakMemory, [len(i) for i in hierarchy]
+
+
+# The parsers being compared, keyed by their names.
+_PARSERS = {"baseline": _baseline_parse_ReadV2, "records": ontology_parsing.parse_ReadV2}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the parsing of a Read V2 release.")
+    parser.add_argument("fileReadV2Data", help="The location of the Read V2 data file to parse.")
+    parser.add_argument("-r", "--repeats", type=int, default=3, help="The number of times to time each parser.")
+    args = parser.parse_args()
+    main(args.fileReadV2Data, args.repeats)
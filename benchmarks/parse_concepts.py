@@ -0,0 +1,126 @@
+"""Measure the time taken and memory needed to parse a large file of concept definitions.
+
+Synthetic concept files are generated in both the flat file and JSON formats, and parsed by streaming the concepts
+from them one at a time. The JSON file is also loaded in one go (as was done before the parser streamed the concepts,
+though without the validation and cleaning), and the concepts found by each parser are checked to be the same. The
+peak memory reported is that allocated by Python while parsing (measured with tracemalloc), and so excludes the memory
+of the interpreter itself.
+
+Run from the top level directory with:
+    python -m benchmarks.parse_concepts
+
+"""
+
+# Python imports.
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+# User imports.
+from webapp.mod_concept_discovery.ConceptCollection import ConceptCollection
+
+
+def main(concepts=20000, seed=0):
+    """Run the benchmark.
+
+    :param concepts:    The number of concepts in the synthetic concept files.
+    :type concepts:     int
+    :param seed:        The seed of the random number generator used to make the concepts.
+    :type seed:         int
+
+    """
+
+    with tempfile.TemporaryDirectory() as dirTemp:
+        fileFlat = os.path.join(dirTemp, "Concepts.txt")
+        fileJSON = os.path.join(dirTemp, "Concepts.json")
+        write_concepts(fileFlat, fileJSON, concepts, seed)
+        for i in (fileFlat, fileJSON):
+            print("{0:s}: {1:.1f}MB".format(os.path.basename(i), os.path.getsize(i) / 2 ** 20))
+
+        parsers = [
+            ("Streamed flat file", fileFlat, lambda fid: _count_concepts(ConceptCollection(fid, "flatfile"))),
+            ("Streamed JSON", fileJSON, lambda fid: _count_concepts(ConceptCollection(fid, "json"))),
+            ("Loaded JSON", fileJSON, lambda fid: len(json.load(fid)))
+        ]
+        for name, fileConcepts, parser in parsers:
+            # Time the parsing, and then measure the memory needed in a separate run as tracing the allocations slows
+            # the parsing down.
+            startTime = time.perf_counter()
+            with open(fileConcepts, 'r') as fidConcepts:
+                conceptsFound = parser(fidConcepts)
+            parseTime = time.perf_counter() - startTime
+            tracemalloc.start()
+            with open(fileConcepts, 'r') as fidConcepts:
+                parser(fidConcepts)
+            peakMemory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            if conceptsFound != concepts:
+                raise ValueError("{0:s} found {1:d} concepts rather than {2:d}.".format(name, conceptsFound, concepts))
+            print("{0:s}: {1:.2f}s, peak memory {2:.1f}MB".format(name, parseTime, peakMemory / 2 ** 20))
+
+        # Check that both formats give the same concepts.
+        with open(fileFlat, 'r') as fidFlat, open(fileJSON, 'r') as fidJSON:
+            if list(ConceptCollection(fidFlat, "flatfile")) != list(ConceptCollection(fidJSON, "json")):
+                raise ValueError("The flat file and JSON parsers found different concepts.")
+
+
+def write_concepts(fileFlat, fileJSON, concepts, seed=0):
+    """Write the same synthetic concepts in the flat file and JSON formats.
+
+    :param fileFlat:    The location to write the flat file of concepts to.
+    :type fileFlat:     str
+    :param fileJSON:    The location to write the JSON file of concepts to.
+    :type fileJSON:     str
+    :param concepts:    The number of concepts to write.
+    :type concepts:     int
+    :param seed:        The seed of the random number generator, so that the same concepts are always generated.
+    :type seed:         int
+
+    """
+
+    rng = random.Random(seed)
+    words = ["diabetes", "type", "1", "2", "mellitus", "insulin", "retinopathy", "renal", "foot", "ulcer"]
+    with open(fileFlat, 'w') as fidFlat, open(fileJSON, 'w') as fidJSON:
+        fidJSON.write('{\n')
+        for i in range(concepts):
+            definition = {}
+            for j in ("Positive", "Negative"):
+                codes = ["{0:s}{1:d}..".format(rng.choice("ABC"), rng.randrange(100)) for _ in range(rng.randint(0, 5))]
+                terms = [' '.join(rng.sample(words, rng.randint(1, 4))) for _ in range(rng.randint(1, 10))]
+                definition[j] = {"Codes": codes, "Terms": terms}
+            fidFlat.write("#Concept{0:d}\n".format(i))
+            for j in ("Positive", "Negative"):
+                fidFlat.write("${0:s}\n".format(j.lower()))
+                fidFlat.write(''.join(">{0:s}\n".format(k) for k in definition[j]["Codes"]))
+                fidFlat.write(''.join("{0:s}\n".format(k) for k in definition[j]["Terms"]))
+            fidJSON.write("{0:s}{1:s}: {2:s}\n".format(
+                ',' if i else ' ', json.dumps("Concept{0:d}".format(i)), json.dumps(definition)))
+        fidJSON.write('}\n')
+
+
+def _count_concepts(conceptCollection):
+    """Parse a collection of concepts, keeping a count of them rather than the concepts themselves.
+
+    :param conceptCollection:   The collection to parse.
+    :type conceptCollection:    ConceptCollection
+    :return:                    The number of concepts parsed.
+    :rtype:                     int
+
+    """
+
+    numberParsed = sum(1 for _ in conceptCollection)
+    if conceptCollection.errors:
+        raise ValueError("Errors found while parsing - {0:s}".format(' '.join(conceptCollection.errors)))
+    return numberParsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the parsing of files of concept definitions.")
+    parser.add_argument("-c", "--concepts", type=int, default=20000,
+                        help="The number of concepts in the synthetic concept files.")
+    args = parser.parse_args()
+    main(args.concepts)
@@ -12,11 +12,26 @@ class Config(object):
     ALLOWED_EXTENSIONS = ["csv", "json", "tsv", "txt"]
     CELERY_BROKER_URL = "amqp://"
     CELERY_RESULT_BACKEND = "rpc://"
+    CELERY_ROUTES = {  # Run the concept discovery sub-tasks on workers of their own (see long_task).
+        "webapp.mod_concept_discovery.long_task.describe_codes": {"queue": "discovery_subtasks"},
+        "webapp.mod_concept_discovery.long_task.find_codes": {"queue": "discovery_subtasks"}
+    }
+    CONCEPT_UPLOAD_DIR = os.path.join(BASE_DIR, "Uploads")  # The directory that validated concept files are saved in.
     CSRF_ENABLED = True  # Enable protection against Cross-site Request Forgery (CSRF).
+    DATABASE_CONCURRENT_QUERIES = 8  # The maximum number of Neo4j queries that a single search runs at once.
     DATABASE_PASSWORD = "root"
+    DATABASE_POOL_SIZE = 50  # The maximum number of idle Neo4j sessions (and of query threads) each process keeps.
     DATABASE_URI = ""
     DATABASE_USERNAME = "neo4j"
     DEBUG = False  # Disable debug mode.
+    DISCOVERY_CODES_PER_TASK = 1000  # The number of codes each concept discovery sub-task fetches the descriptions of.
+    DISCOVERY_CONCEPTS_IN_FLIGHT = 8  # The maximum number of concepts a concept discovery task evaluates at once.
+    DISCOVERY_TERMS_PER_TASK = 50  # The number of terms each concept discovery sub-task searches for.
+    ONTOLOGY_FILES = {"ReadV2": os.path.join(BASE_DIR, "database_setup", "Data", "Indices", "ReadV2.idx")}
+    RESULT_CACHE_SIZE = 10000  # The maximum number of search results cached by each process.
+    RESULT_CACHE_TTL = 24 * 60 * 60  # The number of seconds a cached search result is kept for.
+    RESULT_CACHE_URL = None  # The URL of a Redis server to share cached search results through (e.g. redis://).
+    SEARCH_BACKEND = "neo4j"  # Search the Neo4j database ("neo4j") or in-memory indices of ONTOLOGY_FILES ("index").
     TESTING = False  # Disable testing mode.
     WTF_CSRF_SECRET_KEY = SECRET_KEY = "Some Random Secret String"  # Setup the csrf and regular Flask secret keys.
 
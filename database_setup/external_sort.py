@@ -0,0 +1,156 @@
+"""Functions to sort and join collections of keyed records that are too large to comfortably hold in memory."""
+
+# Python imports.
+import heapq
+import operator
+import os
+import tempfile
+
+
+class RecordSorter(object):
+    """Sort (key, value) records by key, spilling sorted runs of records to disk to keep memory usage bounded.
+
+    When records share a key, only the one added last is kept (as would be the case if they were stored in a dict).
+
+    """
+
+    def __init__(self, dirTemp, runSize=1000000):
+        """Initialise an empty sorter.
+
+        :param dirTemp: The directory to write the sorted runs of records to. The runs are removed once the sorted
+                            records have been iterated over.
+        :type dirTemp:  str
+        :param runSize: The maximum number of records to hold in memory at once.
+        :type runSize:  int
+
+        """
+
+        self._dirTemp = dirTemp
+        self._runSize = runSize
+        self._buffer = []
+        self._runs = []  # The locations of the runs written to disk, in the order they were written.
+
+    def add(self, key, value):
+        """Add a record.
+
+        Neither the key nor the value may contain a newline or a null character.
+
+        :param key:     The key to sort the record on.
+        :type key:      str
+        :param value:   The value of the record.
+        :type value:    str
+
+        """
+
+        self._buffer.append((key, value))
+        if len(self._buffer) >= self._runSize:
+            self._write_run()
+
+    def sorted_records(self):
+        """Generate the records in order of their keys.
+
+        :return:    The (key, value) records in ascending key order, with each key occurring once.
+        :rtype:     generator
+
+        """
+
+        if not self._runs:
+            # All the records fit in memory, so there's no need to go to disk.
+            self._buffer.sort(key=operator.itemgetter(0))
+            records = self._buffer
+            self._buffer = []
+            yield from _last_of_each_key(records)
+            return
+
+        # Merge the runs. Each record is tagged with the position of its run, so that ties between runs are resolved in
+        # the order the runs were written, and the record from the latest run comes last and is the one that is kept.
+        # The keys within a run are unique, so the values are never compared.
+        self._write_run()
+        fids = [open(i, 'r', encoding="utf-8", newline='\n') for i in self._runs]
+        try:
+            runs = [_read_run(j, i) for i, j in enumerate(fids)]
+            yield from _last_of_each_key((i, k) for i, _, k in heapq.merge(*runs))
+        finally:
+            for i, j in zip(fids, self._runs):
+                i.close()
+                os.remove(j)
+            self._runs = []
+
+    def _write_run(self):
+        """Sort the records held in memory and write them to disk as a new run."""
+
+        self._buffer.sort(key=operator.itemgetter(0))
+        fd, fileRun = tempfile.mkstemp(suffix=".run", dir=self._dirTemp)
+        with open(fd, 'w', encoding="utf-8", newline='\n') as fidRun:
+            fidRun.writelines("{0:s}\0{1:s}\n".format(i, j) for i, j in _last_of_each_key(self._buffer))
+        self._runs.append(fileRun)
+        self._buffer = []
+
+
+def merge_join(previous, current):
+    """Join two sequences of records that are sorted by (unique) key.
+
+    :param previous:    The (key, value) records of the previous version of a collection, in ascending key order.
+    :type previous:     iterable
+    :param current:     The (key, value) records of the current version of a collection, in ascending key order.
+    :type current:      iterable
+    :return:            A (key, previous value, current value) record for every key in either version, in ascending key
+                            order. The value from a version that does not contain the key is None.
+    :rtype:             generator
+
+    """
+
+    previous = iter(previous)
+    current = iter(current)
+    previousRecord = next(previous, None)
+    currentRecord = next(current, None)
+    while previousRecord is not None or currentRecord is not None:
+        if currentRecord is None or (previousRecord is not None and previousRecord[0] < currentRecord[0]):
+            # The record has been removed.
+            yield previousRecord[0], previousRecord[1], None
+            previousRecord = next(previous, None)
+        elif previousRecord is None or currentRecord[0] < previousRecord[0]:
+            # The record has been added.
+            yield currentRecord[0], None, currentRecord[1]
+            currentRecord = next(current, None)
+        else:
+            # The record is in both versions.
+            yield currentRecord[0], previousRecord[1], currentRecord[1]
+            previousRecord = next(previous, None)
+            currentRecord = next(current, None)
+
+
+def _last_of_each_key(records):
+    """Remove all but the last of each group of records that share a key.
+
+    :param records: The (key, value) records, sorted by key.
+    :type records:  iterable
+    :return:        The last record with each key.
+    :rtype:         generator
+
+    """
+
+    lastRecord = None
+    for i in records:
+        if lastRecord is not None and lastRecord[0] != i[0]:
+            yield lastRecord
+        lastRecord = i
+    if lastRecord is not None:
+        yield lastRecord
+
+
+def _read_run(fidRun, runNumber):
+    """Read the records of a run, tagging each with the position of the run.
+
+    :param fidRun:      The open file of the run.
+    :type fidRun:       file object
+    :param runNumber:   The position of the run in the order the runs were written.
+    :type runNumber:    int
+    :return:            The (key, run number, value) records of the run, in ascending key order.
+    :rtype:             generator
+
+    """
+
+    for i in fidRun:
+        key, value = i[:-1].split('\0', 1)
+        yield key, runNumber, value
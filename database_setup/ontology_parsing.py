@@ -1,24 +1,115 @@
 """Functions to generate the files needed to load the concept hierarchies into Neo4j."""
 
 # Python imports.
+from collections import defaultdict, deque, OrderedDict
+from contextlib import contextmanager
+import csv
+import gc
 import gzip
+import itertools
+import multiprocessing
 import os
 import re
+from sys import intern
+import tempfile
 
 # User imports.
+from .external_sort import merge_join, RecordSorter
+from .ontology_records import Concept, Relationship, RelationshipLabels, Term
+from . import snapshots
 from webapp.utilities import cleaners
+from webapp.utilities import hierarchy_numbering
 
 
-def main(dirNeo4jData, readV2Files):
+# The number of chunks of a data file queued for each worker process when parsing with multiple processes. This bounds
+# the memory needed to hold the decompressed chunks waiting to be parsed.
+_CHUNKS_PER_PROCESS = 2
+
+# The position of the domain among the fields of a concept's line in the data files.
+_CONCEPT_DOMAIN_FIELD = Concept.__slots__.index("domain")
+
+# The labels of the kinds of relationships in the Read V2 hierarchy.
+_READV2_CONTAINS = RelationshipLabels("ReadV2_Term", "Word", "Contains")
+_READV2_DESCRIBED_BY = RelationshipLabels("ReadV2_Concept", "ReadV2_Term", "DescribedBy")
+_READV2_PARENT = RelationshipLabels("ReadV2_Concept", "ReadV2_Concept", "Parent")
+
+# The labels of the kinds of relationships in the CTV3 hierarchy.
+_CTV3_CONTAINS = RelationshipLabels("CTV3_Term", "Word", "Contains")
+_CTV3_DESCRIBED_BY = RelationshipLabels("CTV3_Concept", "CTV3_Term", "DescribedBy")
+_CTV3_PARENT = RelationshipLabels("CTV3_Concept", "CTV3_Concept", "Parent")
+
+# The labels of the kinds of relationships in the SNOMED CT hierarchy.
+_SNOMED_CT_CONTAINS = RelationshipLabels("SNOMED_CT_Term", "Word", "Contains")
+_SNOMED_CT_DESCRIBED_BY = RelationshipLabels("SNOMED_CT_Concept", "SNOMED_CT_Term", "DescribedBy")
+_SNOMED_CT_PARENT = RelationshipLabels("SNOMED_CT_Concept", "SNOMED_CT_Concept", "Parent")
+
+# The SNOMED CT concept IDs of the types of descriptions and relationships that are loaded.
+_SNOMED_CT_FSN_TYPE = "900000000000003001"  # Fully specified names, which are used as the primary terms.
+_SNOMED_CT_SYNONYM_TYPE = "900000000000013009"
+_SNOMED_CT_IS_A_TYPE = "116680003"
+
+# The regular expression used to extract the semantic tag (e.g. disorder) from the end of a fully specified name.
+_SEMANTIC_TAG_FINDER = re.compile("\(([^()]+)\)\s*$")
+
+
+def main(dirNeo4jData, readV2Files, initial=False, releaseIDs=None, external=False, runSize=1000000, processes=1,
+         dirSnapshots=None, ctv3Files=None, dirSNOMEDCTData=None):
     """Parse the ontology data files and generate the outputs needed by the Neo4j data loader.
 
+    By default the files of additions, updates and removals needed to turn the previous version of the hierarchies
+    into the current one are generated. When performing the initial load of an empty database, the files needed by
+    the Neo4j offline importer (neo4j-admin import) are generated from the current versions instead.
+
+    The additions, updates and removals are found by joining the records of the two versions on their keys. By default
+    both versions are parsed into memory for this. In external mode, each version's records are instead sorted on disk
+    in runs of at most runSize records and the sorted runs are merged and joined as the files are written, which keeps
+    the memory needed bounded however large the releases are. Both modes generate identical files.
+
+    SNOMED CT is loaded from the changes recorded in an RF2 release rather than by comparing two releases. See
+    _write_SNOMED_CT_changes.
+
     :param dirNeo4jData:    The directory containing the files of the formatted data to be loaded into Neo4j.
     :type dirNeo4jData:     str
     :param readV2Files:     The locations where the current and previous version of the Read V2 ontology can be found.
     :type readV2Files:      list
+    :param initial:         Whether to generate the files for the offline importer rather than the incremental loader.
+    :type initial:          bool
+    :param releaseIDs:      The identifiers of the current releases, keyed by concept format. Only used for the
+                                initial load, as the incremental loader records the releases itself.
+    :type releaseIDs:       dict
+    :param external:        Whether to join the versions by sorting their records on disk rather than in memory.
+    :type external:         bool
+    :param runSize:         The maximum number of records of each type held in memory per version in external mode.
+    :type runSize:          int
+    :param processes:       The number of processes to parse each data file with. See _generate_ReadV2_records.
+    :type processes:        int
+    :param dirSnapshots:    The directory containing the snapshots of the parsed versions of the hierarchies. Only
+                                used when the versions are joined in memory, as the snapshots must be loaded into
+                                memory. See parse_ReadV2.
+    :type dirSnapshots:     str
+    :param ctv3Files:       The directories where the current and previous version of the CTV3 ontology can be found.
+                                None if CTV3 is not being loaded.
+    :type ctv3Files:        list
+    :param dirSNOMEDCTData: The directory of the SNOMED CT RF2 release whose changes are to be loaded. None if SNOMED CT
+                                is not being loaded. Not used for the initial load.
+    :type dirSNOMEDCTData:  str
+    :return:                When performing the initial load, the locations of the node files and relationship files
+                                generated for the offline importer. Otherwise None.
+    :rtype:                 list, list
 
     """
 
+    # Gather the releases of each code format being loaded. The code formats are kept in a fixed order, as the changes
+    # to each are written to the same files one code format after another.
+    releaseFiles = OrderedDict([("ReadV2", readV2Files)])
+    if ctv3Files:
+        releaseFiles["CTV3"] = ctv3Files
+
+    if initial:
+        hierarchies = OrderedDict(
+            (i, _parse_release(i, releaseFiles[i][0], processes, dirSnapshots)) for i in releaseFiles)
+        return _write_import_files(dirNeo4jData, hierarchies, releaseIDs or {})
+
     # Create the output locations for the Neo4j data files.
     fileAddConcepts = os.path.join(dirNeo4jData, "Concepts_Add.tsv")
     fileAddTerms = os.path.join(dirNeo4jData, "Terms_Add.tsv")
@@ -33,7 +124,8 @@ def main(dirNeo4jData, readV2Files):
     fileRemoveRelationships = os.path.join(dirNeo4jData, "Relationships_Remove.tsv")
 
     # Generate the Neo4j data.
-    with open(fileAddConcepts, 'w') as fidAddConcepts, open(fileUpdateConcepts, 'w') as fidUpdateConcepts, \
+    with tempfile.TemporaryDirectory(dir=dirNeo4jData) as dirTemp, \
+            open(fileAddConcepts, 'w') as fidAddConcepts, open(fileUpdateConcepts, 'w') as fidUpdateConcepts, \
             open(fileRemoveConcepts, 'w') as fidRemoveConcepts, open(fileAddTerms, 'w') as fidAddTerms, \
             open(fileUpdateTerms, 'w') as fidUpdateTerms, open(fileRemoveTerms, 'w') as fidRemoveTerms, \
             open(fileAddWords, 'w') as fidAddWords, open(fileRemoveWords, 'w') as fidRemoveWords, \
@@ -42,7 +134,7 @@ def main(dirNeo4jData, readV2Files):
             open(fileRemoveRelationships, 'w') as fidRRemoveRelationships:
         # Add the headers for the Neo4j files.
         for i in [fidAddConcepts, fidUpdateConcepts, fidRemoveConcepts]:
-            i.write("ID\tCurrent\tDomain\tLevel\tLabels\n")
+            i.write("ID\tCurrent\tDomain\tLevel\tLeft\tRight\tLabels\n")
         for i in [fidAddTerms, fidUpdateTerms, fidRemoveTerms]:
             i.write("ID\tCurrent\tPretty\tSearchable\tLabels\n")
         for i in [fidAddWords, fidRemoveWords]:
@@ -50,176 +142,985 @@ def main(dirNeo4jData, readV2Files):
         for i in [fidAddRelationships, fidUpdateRelationships, fidRRemoveRelationships]:
             i.write("Node_1\tNode_1_Label\tNode_2\tNode_2_Label\tType\tRelationship_Labels\n")
 
-        # The words may occur in multiple ontologies, so must be recorded across them (unlike the concepts and terms).
-        allCurrentWords = set()
-        allPreviousWords = set()
-
-        # Parse the Read V2 data.
-        currentConcepts, currentTerms, currentWords, currentRelationships = parse_ReadV2(readV2Files[0])
-        previousConcepts, previousTerms, previousWords, previousRelationships = parse_ReadV2(readV2Files[1])
-
-        # Add the words found to the records of the words in the current and previous hierarchies.
-        allCurrentWords |= currentWords
-        allPreviousWords |= previousWords
-
-        # Record the concept updates needed.
-        conceptsToAdd = currentConcepts.keys() - previousConcepts.keys()
-        conceptsToAdd = [currentConcepts[i] for i in conceptsToAdd]
-        if conceptsToAdd:
-            fidAddConcepts.write('\n'.join(conceptsToAdd))
-            fidAddConcepts.write('\n')
-        conceptsToUpdate = [currentConcepts[i] for i in currentConcepts
-                            if i in previousConcepts and currentConcepts[i] != previousConcepts[i]]
-        if conceptsToUpdate:
-            fidUpdateConcepts.write('\n'.join(conceptsToUpdate))
-            fidUpdateConcepts.write('\n')
-        conceptsToRemove = previousConcepts.keys() - currentConcepts.keys()
-        conceptsToRemove = ["{0:s}\t\t\t\t\t\t\tReadV2_Concept".format(i) for i in conceptsToRemove]
-        if conceptsToRemove:
-            fidRemoveConcepts.write('\n'.join(conceptsToRemove))
-            fidRemoveConcepts.write('\n')
-
-        # Record the term updates needed.
-        termsToAdd = currentTerms.keys() - previousTerms.keys()
-        termsToAdd = [currentTerms[i] for i in termsToAdd]
-        if termsToAdd:
-            fidAddTerms.write('\n'.join(termsToAdd))
-            fidAddTerms.write('\n')
-        termsToUpdate = [currentTerms[i] for i in currentTerms
-                         if i in previousTerms and currentTerms[i] != previousTerms[i]]
-        if termsToUpdate:
-            fidUpdateTerms.write('\n'.join(termsToUpdate))
-            fidUpdateTerms.write('\n')
-        termsToRemove = previousTerms.keys() - currentTerms.keys()
-        termsToRemove = ["{0:s}\t\t\t\t\t\t\tReadV2_Term".format(i) for i in termsToRemove]
-        if termsToRemove:
-            fidRemoveTerms.write('\n'.join(termsToRemove))
-            fidRemoveTerms.write('\n')
-
-        # Record the relationship updates needed.
-        relationshipsToAdd = currentRelationships.keys() - previousRelationships.keys()
-        relationshipsToAdd = [currentRelationships[i] for i in relationshipsToAdd]
-        if relationshipsToAdd:
-            fidAddRelationships.write('\n'.join(relationshipsToAdd))
-            fidAddRelationships.write('\n')
-        relationshipsToUpdate = [currentRelationships[i] for i in currentRelationships
-                                 if i in previousRelationships and currentRelationships[i] != previousRelationships[i]]
-        if relationshipsToUpdate:
-            fidUpdateRelationships.write('\n'.join(relationshipsToUpdate))
-            fidUpdateRelationships.write('\n')
-        relationshipsToRemove = previousRelationships.keys() - currentRelationships.keys()
-        relationshipsToRemove = [previousRelationships[i] for i in relationshipsToRemove]
-        if relationshipsToRemove:
-            fidRRemoveRelationships.write('\n'.join(relationshipsToRemove))
-            fidRRemoveRelationships.write('\n')
-
-        # Determine the words to add and remove.
-        wordsToAdd = allCurrentWords - allPreviousWords
-        wordsToAdd = ["{0:s}\tWord".format(i) for i in wordsToAdd]
-        fidAddWords.write('\n'.join(wordsToAdd))
-        wordsToRemove = allPreviousWords - allCurrentWords
-        wordsToRemove = ["{0:s}\tWord".format(i) for i in wordsToRemove]
-        fidRemoveWords.write('\n'.join(wordsToRemove))
-
-
-def parse_CTV3():
-    pass
-
-
-def parse_ReadV2(fileReadV2Data):
+        # Pair up the records of the current and previous versions of each hierarchy.
+        if external:
+            changes, wordChanges = _join_sorted_records(releaseFiles, dirTemp, runSize, processes)
+        else:
+            changes, wordChanges = _join_parsed_records(releaseFiles, processes, dirSnapshots)
+
+        # Record the updates needed. Records are written in key order (whichever way they were joined), so that the
+        # files generated from the same releases are identical and an interrupted database load can be resumed using
+        # the regenerated files.
+        for i in releaseFiles:
+            _write_changes(changes[i]["concepts"], fidAddConcepts, fidUpdateConcepts, fidRemoveConcepts,
+                           "{{0:s}}\t\t\t\t\t\t\t{0:s}_Concept".format(i))
+            _write_changes(changes[i]["terms"], fidAddTerms, fidUpdateTerms, fidRemoveTerms,
+                           "{{0:s}}\t\t\t\t\t\t\t{0:s}_Term".format(i))
+            _write_changes(changes[i]["relationships"], fidAddRelationships, fidUpdateRelationships,
+                           fidRRemoveRelationships, "{1!s}")
+
+        # Record the SNOMED CT changes, which come straight from the release.
+        if dirSNOMEDCTData is not None:
+            _write_SNOMED_CT_changes(
+                dirSNOMEDCTData, fidAddTerms, fidRemoveTerms, fidUpdateConcepts, fidRemoveConcepts, fidAddWords,
+                fidAddRelationships, fidUpdateRelationships, fidRRemoveRelationships)
+
+        # The words may occur in multiple ontologies, so are joined across them (unlike the concepts and terms). As a
+        # word has no attributes, it can only be added or removed. The words of the SNOMED CT terms already in the
+        # database aren't known when loading SNOMED CT changes, so no words are removed then (a word without any terms
+        # matches nothing when searching, so is harmless).
+        _write_changes(wordChanges, fidAddWords, None, None if dirSNOMEDCTData else fidRemoveWords, "{1!s}")
+
+
+def parse_CTV3(dirCTV3Data, dirSnapshots=None):
+    """Identify the concepts, terms, words and relationships in a version of the CTV3 ontology.
+
+    When a snapshot directory is given, the hierarchy is loaded from the snapshot of the version if there is one.
+    Otherwise the version is parsed and a snapshot of it saved, so that it never needs parsing again.
+
+    :param dirCTV3Data:     The directory where the CTV3 ontology data files (Terms.v3, Descrip.v3, V3hier.v3 and
+                                Redun.map) can be found.
+    :type dirCTV3Data:      str
+    :param dirSnapshots:    The directory containing the snapshots of the parsed versions.
+    :type dirSnapshots:     str
+    :return:                The concepts, terms, words and relationships needed to model the CTV3 hierarchy, in the
+                                same form as returned by parse_ReadV2.
+    :rtype:                 dict, dict, set, dict
+
+    """
+
+    return _gather_hierarchy("CTV3", dirCTV3Data, _generate_CTV3_records(dirCTV3Data), dirSnapshots)
+
+
+def _follow_redirections(conceptID, redirections):
+    """Find the code that a redundant code has ultimately been replaced by.
+
+    :param conceptID:       The redundant code.
+    :type conceptID:        str
+    :param redirections:    The code that replaced each redundant code.
+    :type redirections:     dict
+    :return:                The last code in the chain of replacements starting at the redundant code. If the chain
+                                loops back on itself, the last code before the loop is returned.
+    :rtype:                 str
+
+    """
+
+    seen = {conceptID}
+    while conceptID in redirections and redirections[conceptID] not in seen:
+        conceptID = redirections[conceptID]
+        seen.add(conceptID)
+    return conceptID
+
+
+def _generate_CTV3_records(dirCTV3Data):
+    """Generate the records of the concepts, terms, words and relationships in a version of the CTV3 ontology.
+
+    The data files are streamed through in the order Redun.map, V3hier.v3, Terms.v3 (for the IDs of the terms only),
+    Descrip.v3 and Terms.v3 again, with the joins between them made through in-memory indices of the files already
+    read. Only the indices (the redirections, the children of each code and the IDs of the concepts and terms) are held
+    in memory, and the terms and relationships are generated as they are found. Codes that have been made redundant are
+    replaced by the codes that they're redirected to by Redun.map, with the terms of a redundant code becoming
+    secondary terms of its replacement. Descriptions whose term is not in Terms.v3 are skipped, so that no relationship
+    is generated to a term that doesn't exist.
+
+    The level of a concept is the length of the shortest path from it to a root of the hierarchy (a code without
+    parents), and its domain is the primary description of the top level concept (a child of a root) on that path. The
+    roots are their own domains. As these are only known once the whole hierarchy has been read, the concepts are
+    generated last and with their domains, unlike the Read V2 concepts. Concepts outside the hierarchy (or only
+    reachable through a cycle) are given a level of 0 and no domain.
+
+    The records are otherwise generated in the same form as by _generate_ReadV2_records.
+
+    :param dirCTV3Data: The directory where the CTV3 ontology data files can be found.
+    :type dirCTV3Data:  str
+    :return:            The records as (collection, key, value) tuples, where the collection is one of "concepts",
+                            "terms", "words" and "relationships".
+    :rtype:             generator
+
+    """
+
+    # Index the code that replaced each redundant code. Redun.map lines have the form:
+    # new code|old code
+    redirections = {i[1]: i[0] for i in _read_CTV3_file(os.path.join(dirCTV3Data, "Redun.map")) if i[0] != i[1]}
+    redirections = {i: intern(_follow_redirections(i, redirections)) for i in redirections}
+
+    # Index the children of each code, recording the parent relationships as they're found. V3hier.v3 lines have the
+    # form:
+    # child code|parent code|order
+    conceptIDs = OrderedDict()  # The IDs of the concepts in the order they're found (used as an ordered set).
+    children = defaultdict(list)
+    childIDs = set()
+    for i in _read_CTV3_file(os.path.join(dirCTV3Data, "V3hier.v3")):
+        childID = intern(redirections.get(i[0], i[0]))
+        parentID = intern(redirections.get(i[1], i[1]))
+        if childID == parentID:
+            # The relationship is between a redundant code and its replacement.
+            continue
+        conceptIDs[childID] = None
+        conceptIDs[parentID] = None
+        children[parentID].append(childID)
+        childIDs.add(childID)
+        yield "relationships", childID + '\t' + parentID, Relationship(childID, parentID, "parent", _CTV3_PARENT)
+
+    # Determine the level of each concept in the hierarchy, and the concept whose description is its domain.
+    positions = _position_CTV3_concepts([i for i in conceptIDs if i not in childIDs], children)
+    domainIDs = {i[1] for i in positions.values()}
+    del children, childIDs
+
+    # Join the terms to the concepts they describe, recording the primary terms of the concepts that are domains.
+    # Descrip.v3 lines have the form:
+    # code|term ID|P(rimary) or S(econdary)
+    knownTermIDs = {intern(i[0]) for i in _read_CTV3_file(os.path.join(dirCTV3Data, "Terms.v3"))}
+    termIDs = set()
+    primaryTerms = {}
+    for i in _read_CTV3_file(os.path.join(dirCTV3Data, "Descrip.v3")):
+        if i[1] not in knownTermIDs:
+            # The term is missing from Terms.v3.
+            continue
+        conceptID = intern(redirections.get(i[0], i[0]))
+        termID = intern(i[1])
+        isPrimary = i[2] == 'P' and conceptID == i[0]
+        if isPrimary and conceptID in domainIDs:
+            primaryTerms[conceptID] = termID
+        conceptIDs[conceptID] = None
+        termIDs.add(termID)
+        yield "relationships", conceptID + '\t' + termID, \
+            Relationship(conceptID, termID, "true" if isPrimary else "false", _CTV3_DESCRIBED_BY)
+    del knownTermIDs
+
+    # Record the terms that describe a concept, along with the words they contain and the descriptions of the domains.
+    # Terms.v3 lines have the form:
+    # term ID|O(ptional) or C(urrent)|short description|longer description|longest description
+    domainTermIDs = set(primaryTerms.values())
+    domainDescriptions = {}
+    for i in _read_CTV3_file(os.path.join(dirCTV3Data, "Terms.v3")):
+        if i[0] not in termIDs:
+            # The term does not describe any concept.
+            continue
+        termID = intern(i[0])
+        description = i[4] if i[4] else (i[3] if i[3] else i[2])
+        termWords = [intern(j) for j in cleaners.tokenise_description(description)]
+        for j in termWords:
+            yield "words", j, j
+        yield "terms", termID, Term(termID, i[1] == 'C', description, "CTV3_Term")
+        for j in termWords:
+            yield "relationships", termID + '\t' + j, Relationship(termID, j, '', _CTV3_CONTAINS)
+        if termID in domainTermIDs:
+            domainDescriptions[termID] = description
+
+    # Record the concepts. Redundant codes are not recorded (having been replaced), so all concepts are current.
+    for i in conceptIDs:
+        level, domainID = positions.get(i, (0, None))
+        domain = domainDescriptions.get(primaryTerms.get(domainID), '')
+        yield "concepts", i, Concept(i, True, domain, level, None, None, "CTV3_Concept")
+
+
+def _position_CTV3_concepts(roots, children):
+    """Determine the level of each concept in the CTV3 hierarchy, and the concept whose description is its domain.
+
+    The hierarchy is traversed breadth first from its roots, so that each concept is reached first by (one of) the
+    shortest paths to it. Children are visited in the order they occur in the data, so the same path is always taken.
+
+    :param roots:       The IDs of the concepts without parents.
+    :type roots:        list
+    :param children:    The IDs of the children of each concept.
+    :type children:     dict
+    :return:            The level of each concept reachable from a root, and the ID of the concept that is its domain.
+    :rtype:             dict
+
+    """
+
+    positions = {i: (0, i) for i in roots}
+    level = 0
+    frontier = roots
+    while frontier:
+        level += 1
+        nextFrontier = []
+        for i in frontier:
+            domainID = positions[i][1]
+            for j in children.get(i, []):
+                if j not in positions:
+                    positions[j] = (level, j if level == 1 else domainID)
+                    nextFrontier.append(j)
+        frontier = nextFrontier
+    return positions
+
+
+def _read_CTV3_file(fileData):
+    """Split the lines of a (pipe delimited) CTV3 data file into their fields.
+
+    :param fileData:    The location of the file.
+    :type fileData:     str
+    :return:            The fields of each non-empty line.
+    :rtype:             generator
+
+    """
+
+    with open(fileData, 'r', encoding="utf-8") as fidData:
+        for line in fidData:
+            line = line.rstrip("\r\n")
+            if line:
+                yield line.split('|')
+
+
+def _gather_hierarchy(codeFormat, fileData, records, dirSnapshots):
+    """Gather the generated records of a version of a hierarchy, loading or saving the snapshot of the version.
+
+    :param codeFormat:      The code format of the hierarchy (e.g. ReadV2).
+    :type codeFormat:       str
+    :param fileData:        The location of the version's data.
+    :type fileData:         str
+    :param records:         The (collection, key, value) records of the version (e.g. from _generate_ReadV2_records).
+                                These are not generated if the hierarchy is loaded from its snapshot.
+    :type records:          generator
+    :param dirSnapshots:    The directory containing the snapshots of the parsed versions. None to not use snapshots.
+    :type dirSnapshots:     str
+    :return:                The concepts, terms, words and relationships of the hierarchy. See parse_ReadV2.
+    :rtype:                 dict, dict, set, dict
+
+    """
+
+    if dirSnapshots is not None:
+        with _paused_gc():
+            hierarchy = snapshots.load(dirSnapshots, codeFormat, fileData)
+        if hierarchy is not None:
+            records.close()
+            return hierarchy
+
+    # Create the collection of concepts (and their domains), terms, words and relationships.
+    collections = {"concepts": {}, "domains": {}, "terms": {}, "words": {}, "relationships": {}}
+
+    # Gather the records.
+    with _paused_gc():
+        for collection, key, value in records:
+            collections[collection][key] = value
+
+    # Add the domain information to the concepts that were generated without it.
+    domains = collections["domains"]
+    for i in collections["concepts"].values():
+        if i.domain is None:
+            i.domain = domains[i.id[0]]
+
+    hierarchy = collections["concepts"], collections["terms"], set(collections["words"]), collections["relationships"]
+    if dirSnapshots is not None:
+        with _paused_gc():
+            snapshots.save(dirSnapshots, codeFormat, fileData, hierarchy)
+    return hierarchy
+
+
+def _fill_domains(records, domains):
+    """Fill in the domains of sorted concept records that were sorted without their domain.
+
+    :param records:     The (key, value) records of the concepts, sorted by key. Each value is the line of a concept
+                            (see ontology_records.Concept), with an empty domain field if the domain is to be filled in.
+    :type records:      iterable
+    :param domains:     The domains keyed by the first character of the IDs of the concepts they apply to. If empty,
+                            the concepts were generated with their domains, and are left unchanged.
+    :type domains:      dict
+    :return:            The records with their domains filled in.
+    :rtype:             generator
+
+    """
+
+    if not domains:
+        yield from records
+        return
+    for i, j in records:
+        fields = j.split('\t')
+        if not fields[_CONCEPT_DOMAIN_FIELD]:
+            fields[_CONCEPT_DOMAIN_FIELD] = domains[i[0]]
+        yield i, '\t'.join(fields)
+
+
+def _generate_release_records(codeFormat, location, processes):
+    """Generate the records of a version of a hierarchy of any code format.
+
+    :param codeFormat:  The code format of the hierarchy (ReadV2 or CTV3).
+    :type codeFormat:   str
+    :param location:    The location of the version's data.
+    :type location:     str
+    :param processes:   The number of processes to parse the data with. Only used for Read V2.
+    :type processes:    int
+    :return:            The (collection, key, value) records. See _generate_ReadV2_records.
+    :rtype:             generator
+
+    """
+
+    if codeFormat == "CTV3":
+        return _generate_CTV3_records(location)
+    return _generate_ReadV2_records(location, processes)
+
+
+def _join_parsed_records(releaseFiles, processes, dirSnapshots):
+    """Join the records of the current and previous versions of the hierarchies by parsing both into memory.
+
+    :param releaseFiles:    The locations where the current and previous version of each hierarchy can be found, keyed
+                                by code format.
+    :type releaseFiles:     dict
+    :param processes:       The number of processes to parse each data file with.
+    :type processes:        int
+    :param dirSnapshots:    The directory containing the snapshots of the parsed versions of the hierarchies.
+    :type dirSnapshots:     str
+    :return:                A generator of (key, previous value, current value) records, in ascending key order, for
+                                each of the concepts, terms and relationships of each code format, and a generator of
+                                the same for the words across all code formats. See external_sort.merge_join.
+    :rtype:                 dict, generator
+
+    """
+
+    changes = {}
+    currentWords = set()
+    previousWords = set()
+    for i in releaseFiles:
+        currentConcepts, currentTerms, words, currentRelationships = \
+            _parse_release(i, releaseFiles[i][0], processes, dirSnapshots)
+        currentWords |= words
+        previousConcepts, previousTerms, words, previousRelationships = \
+            _parse_release(i, releaseFiles[i][1], processes, dirSnapshots)
+        previousWords |= words
+        changes[i] = {
+            "concepts": _join_dicts(previousConcepts, currentConcepts),
+            "terms": _join_dicts(previousTerms, currentTerms),
+            "relationships": _join_dicts(previousRelationships, currentRelationships)
+        }
+
+    currentWords = {i: "{0:s}\tWord".format(i) for i in currentWords}
+    previousWords = {i: "{0:s}\tWord".format(i) for i in previousWords}
+    return changes, _join_dicts(previousWords, currentWords)
+
+
+def _join_dicts(previous, current):
+    """Join the records of two versions of a collection held in memory.
+
+    :param previous:    The records of the previous version, keyed by their keys.
+    :type previous:     dict
+    :param current:     The records of the current version, keyed by their keys.
+    :type current:      dict
+    :return:            A (key, previous value, current value) record for every key in either version, in ascending key
+                            order. The value from a version that does not contain the key is None.
+    :rtype:             generator
+
+    """
+
+    for i in sorted(previous.keys() | current.keys()):
+        yield i, previous.get(i), current.get(i)
+
+
+def _join_sorted_records(releaseFiles, dirTemp, runSize, processes):
+    """Join the records of the current and previous versions of the hierarchies by sorting both on disk.
+
+    :param releaseFiles:    The locations where the current and previous version of each hierarchy can be found, keyed
+                                by code format.
+    :type releaseFiles:     dict
+    :param dirTemp:         The directory to write the sorted runs of records to.
+    :type dirTemp:          str
+    :param runSize:         The maximum number of records of each type held in memory per version.
+    :type runSize:          int
+    :param processes:       The number of processes to parse each data file with.
+    :type processes:        int
+    :return:                A generator of (key, previous value, current value) records, in ascending key order, for
+                                each of the concepts, terms and relationships of each code format, and a generator of
+                                the same for the words across all code formats. See external_sort.merge_join.
+    :rtype:                 dict, generator
+
+    """
+
+    # Sort the records of each version. Only the domains are kept in memory, as there is one per top level concept. The
+    # words are shared by the code formats, so the words of every code format are sorted together.
+    changes = {}
+    currentWordSorter = RecordSorter(dirTemp, runSize)
+    previousWordSorter = RecordSorter(dirTemp, runSize)
+    for codeFormat in releaseFiles:
+        versions = []
+        for i, wordSorter in zip(releaseFiles[codeFormat][:2], [currentWordSorter, previousWordSorter]):
+            sorters = {j: RecordSorter(dirTemp, runSize) for j in ["concepts", "terms", "relationships"]}
+            domains = {}
+            for collection, key, value in _generate_release_records(codeFormat, i, processes):
+                if collection == "domains":
+                    domains[key] = value
+                elif collection == "words":
+                    wordSorter.add(key, "{0:s}\tWord".format(value))
+                else:
+                    # Concepts without a domain are sorted with an empty domain field, which is filled in as the
+                    # sorted records are merged.
+                    sorters[collection].add(key, str(value))
+            versions.append((sorters, domains))
+        (currentSorters, currentDomains), (previousSorters, previousDomains) = versions
+
+        # Join the sorted records, filling in the domains of the concepts as they are merged.
+        changes[codeFormat] = {
+            i: merge_join(previousSorters[i].sorted_records(), currentSorters[i].sorted_records())
+            for i in ["terms", "relationships"]
+        }
+        changes[codeFormat]["concepts"] = merge_join(
+            _fill_domains(previousSorters["concepts"].sorted_records(), previousDomains),
+            _fill_domains(currentSorters["concepts"].sorted_records(), currentDomains)
+        )
+
+    return changes, merge_join(previousWordSorter.sorted_records(), currentWordSorter.sorted_records())
+
+
+def _parse_release(codeFormat, location, processes, dirSnapshots):
+    """Parse a version of a hierarchy of any code format.
+
+    :param codeFormat:      The code format of the hierarchy (ReadV2 or CTV3).
+    :type codeFormat:       str
+    :param location:        The location of the version's data.
+    :type location:         str
+    :param processes:       The number of processes to parse the data with. Only used for Read V2.
+    :type processes:        int
+    :param dirSnapshots:    The directory containing the snapshots of the parsed versions.
+    :type dirSnapshots:     str
+    :return:                The concepts, terms, words and relationships of the hierarchy. See parse_ReadV2.
+    :rtype:                 dict, dict, set, dict
+
+    """
+
+    if codeFormat == "CTV3":
+        return parse_CTV3(location, dirSnapshots)
+    return parse_ReadV2(location, processes, dirSnapshots)
+
+
+def _write_changes(changes, fidAdd, fidUpdate, fidRemove, removalFormat):
+    """Write the records that have been added, updated and removed between two versions of a collection.
+
+    :param changes:         The (key, previous value, current value) records of the collection. Values are written
+                                out using str, so may be records from ontology_records or lines of a data file.
+    :type changes:          iterable
+    :param fidAdd:          The file to write the added records to.
+    :type fidAdd:           file
+    :param fidUpdate:       The file to write the updated records to. None if records can not be updated.
+    :type fidUpdate:        file
+    :param fidRemove:       The file to write the removed records to. None if records are not to be removed.
+    :type fidRemove:        file
+    :param removalFormat:   The format of a removal line. This is formatted with the key and previous value of the
+                                removed record.
+    :type removalFormat:    str
+
+    """
+
+    for key, previousValue, currentValue in changes:
+        if previousValue is None:
+            fidAdd.write(str(currentValue))
+            fidAdd.write('\n')
+        elif currentValue is None:
+            if fidRemove is not None:
+                fidRemove.write(removalFormat.format(key, previousValue))
+                fidRemove.write('\n')
+        elif previousValue != currentValue and fidUpdate is not None:
+            fidUpdate.write(str(currentValue))
+            fidUpdate.write('\n')
+
+
+def _write_import_files(dirImportData, hierarchies, releaseIDs):
+    """Write the CSV files needed to load an empty database with the Neo4j offline importer.
+
+    The concepts and terms of each code format are given their own ID spaces (e.g. ReadV2_Concept and ReadV2_Term), as
+    concept IDs and term IDs are only unique within their own type and code format. The words share one ID space (Word)
+    across the code formats. As a relationship file's headers name the ID spaces of its start and end nodes, a separate
+    file is written for each type of relationship of each code format.
+
+    :param dirImportData:   The directory to write the files to.
+    :type dirImportData:    str
+    :param hierarchies:     The concepts, terms, words and relationships of each hierarchy, as returned by parse_ReadV2
+                                and parse_CTV3, keyed by code format.
+    :type hierarchies:      dict
+    :param releaseIDs:      The identifiers of the releases being loaded, keyed by concept format.
+    :type releaseIDs:       dict
+    :return:                The locations of the node files and the relationship files.
+    :rtype:                 list, list
+
+    """
+
+    nodeFiles = []
+    relationshipFiles = []
+    words = set()
+    for codeFormat in hierarchies:
+        concepts, terms, formatWords, relationships = hierarchies[codeFormat]
+        words |= formatWords
+        fileConcepts = os.path.join(dirImportData, "{0:s}_Concepts.csv".format(codeFormat))
+        fileTerms = os.path.join(dirImportData, "{0:s}_Terms.csv".format(codeFormat))
+        fileDescribedBy = os.path.join(dirImportData, "{0:s}_DescribedBy.csv".format(codeFormat))
+        fileContains = os.path.join(dirImportData, "{0:s}_Contains.csv".format(codeFormat))
+        fileParent = os.path.join(dirImportData, "{0:s}_Parent.csv".format(codeFormat))
+        conceptSpace = "{0:s}_Concept".format(codeFormat)
+        termSpace = "{0:s}_Term".format(codeFormat)
+
+        # Write the nodes.
+        with open(fileConcepts, 'w', newline='') as fidConcepts:
+            writer = csv.writer(fidConcepts)
+            writer.writerow(["id:ID({0:s})".format(conceptSpace), "current", "domain", "level:int", "left:int",
+                             "right:int", ":LABEL"])
+            writer.writerows(i.fields() for i in concepts.values())
+        with open(fileTerms, 'w', newline='') as fidTerms:
+            writer = csv.writer(fidTerms)
+            writer.writerow(["id:ID({0:s})".format(termSpace), "current", "pretty", "searchable", ":LABEL"])
+            writer.writerows(i.fields() for i in terms.values())
+
+        # Write the relationships, with each type of relationship going to its own file.
+        with open(fileDescribedBy, 'w', newline='') as fidDescribedBy, \
+                open(fileContains, 'w', newline='') as fidContains, open(fileParent, 'w', newline='') as fidParent:
+            writers = {
+                "DescribedBy": csv.writer(fidDescribedBy), "Contains": csv.writer(fidContains),
+                "Parent": csv.writer(fidParent)
+            }
+            writers["DescribedBy"].writerow([
+                ":START_ID({0:s})".format(conceptSpace), ":END_ID({0:s})".format(termSpace), "type", ":TYPE"
+            ])
+            writers["Contains"].writerow([":START_ID({0:s})".format(termSpace), ":END_ID(Word)", "type", ":TYPE"])
+            writers["Parent"].writerow([
+                ":START_ID({0:s})".format(conceptSpace), ":END_ID({0:s})".format(conceptSpace), "type", ":TYPE"
+            ])
+            for i in relationships.values():
+                writers[i.label].writerow([i.source, i.target, i.type, i.label])
+
+        nodeFiles.extend([fileConcepts, fileTerms])
+        relationshipFiles.extend([fileDescribedBy, fileContains, fileParent])
+
+    # Write the nodes shared by the code formats.
+    fileWords = os.path.join(dirImportData, "Words.csv")
+    fileReleases = os.path.join(dirImportData, "Releases.csv")
+    with open(fileWords, 'w', newline='') as fidWords:
+        writer = csv.writer(fidWords)
+        writer.writerow(["word:ID(Word)", ":LABEL"])
+        writer.writerows([i, "Word"] for i in words)
+    with open(fileReleases, 'w', newline='') as fidReleases:
+        writer = csv.writer(fidReleases)
+        writer.writerow(["format:ID(Release)", "id", ":LABEL"])
+        writer.writerows([i, releaseIDs[i], "Release"] for i in releaseIDs)
+
+    return nodeFiles + [fileWords, fileReleases], relationshipFiles
+
+
+def parse_ReadV2(fileReadV2Data, processes=1, dirSnapshots=None):
     """Identify the concepts, terms, words and relationships in a version of the Read V2 ontology.
 
+    When a snapshot directory is given, the hierarchy is loaded from the snapshot of the version if there is one.
+    Otherwise the version is parsed and a snapshot of it saved, so that it never needs parsing again.
+
     :param fileReadV2Data:  The location where the Read V2 ontology data can be found.
     :type fileReadV2Data:   str
-    :return:                The concepts, terms, words and relationships needed to model the Read V2 hierarchy.
-    :rtype:                 set, set, set, list
+    :param processes:       The number of processes to parse the data with. See _generate_ReadV2_records.
+    :type processes:        int
+    :param dirSnapshots:    The directory containing the snapshots of the parsed versions.
+    :type dirSnapshots:     str
+    :return:                The concepts, terms, words and relationships needed to model the Read V2 hierarchy. The
+                                concepts, terms and relationships are records from ontology_records, keyed by their
+                                IDs (or the IDs of the source and target nodes for relationships).
+    :rtype:                 dict, dict, set, dict
 
     """
 
-    # Create the collection of concepts (and their domains), terms, words and relationships.
-    concepts = dict()
-    domains = dict()
-    terms = dict()
-    words = []
-    relationships = dict()
-
-    # Compile the regular expression needed.
-    wordFinder = re.compile("\s+")  # Expression to split words based on arbitrary whitespace between them.
-    bracketFinder = re.compile("(\[.*?\])\s*")  # Used to remove bracketed contents in a description.
-
-    # Parse the Read V2 data.
-    with gzip.open(fileReadV2Data, 'r') as fidReadV2Data:
-        for line in fidReadV2Data:
-            # Lines are delimited by commas, with each entry on the line enclosed in quotes. For example:
-            # "MELLITUS","02","Type 1 diabetes mellitus","","","00","EN","C10E.","0"
-            line = str(line.strip(), "utf-8")  # Convert bytes string to UTF-8.
-            chunks = line.split('","')
-            chunks[0] = chunks[0][1:]  # Strip the " at the stat of the first entry.
-            chunks[-1] = chunks[-1][:-1]  # Strip the " at the end of the last entry.
-
-            # Get the elements of the entry that are of interest. These would be the concept ID, term ID and the
-            # longest recorded term description. The term IDs are problematic, as they are specific to a given concept
-            # and not unique across the whole hierarchy. For example, the primary term for every concept has ID 00.
-            # To get around this we append the concept ID to the front of each term ID.
-            conceptID = chunks[7].replace('.', '')  # Remove trailing full stops from the concept ID.
-            termIDRoot = chunks[5]
-            termID = "{0:s}_{1:s}".format(conceptID, termIDRoot)
-            description = chunks[4] if chunks[4] else (chunks[3] if chunks[3] else chunks[2])
-            descriptionLower = description.lower()
-
-            # Determine the words the term contains.
-            # First, alter descriptions that start with something like [V]XXX by removing the [V] so that the XXX can
-            # be matched as a real word.
-            # Second, split the description into words using whitespace as a delimiter.
-            # Third, clean the set of words.
-            splittableDescription = descriptionLower
-            isBracketedStart = bracketFinder.match(splittableDescription)
-            if isBracketedStart:
-                splittableDescription = splittableDescription[isBracketedStart.span()[1]:]
-            termWords = cleaners.input_word_cleaner(wordFinder.split(splittableDescription))
-            words.extend(termWords)
-
-            # Record the term's attributes. Read V2 has no concept of non-current terms, so all are current.
-            terms[termID] = "{0:s}\ttrue\t{1:s}\t{2:s}\tReadV2_Term".format(termID, description, descriptionLower)
-
-            # Record the concept's attributes. Read V2 has no concept of non-current concepts, so all are current.
-            # The domain of a concept is the primary description of the top level singe character concept for the given
-            # concept (e.g. C for C10E). This will not always be known at the time a concept is being recorded, so will
-            # be gathered after the file is processed.
-            concepts[conceptID] = "{0:s}\ttrue\t{1:s}\t{2:d}\tReadV2_Concept".format(conceptID, "{0:s}", len(conceptID))
-
-            # Add the relationships between the term and the words it contains.
-            for i in termWords:
-                key = tuple(sorted([termID, i]))
-                relationships[key] = "{0:s}\tReadV2_Term\t{1:s}\tWord\t\tContains".format(termID, i)
-
-            # Add the relationship between the concept and the term. For every concept, term ID 00 indicates the
-            # primary term, and all other terms are secondary.
-            key = tuple(sorted([conceptID, termID]))
-            relationships[key] = "{0:s}\tReadV2_Concept\t{1:s}\tReadV2_Term\t{2:s}\tDescribedBy".format(
-                conceptID, termID, "true" if termIDRoot == "00" else 'false')
-
-            # Add the relationship between the code and its parent. Read V2 parent relationships do not have a 'type',
-            # so each parent relationship is given the default type parent.
-            if len(conceptID) > 1:
-                # If the concept consists of at least 2 characters, then it has a parent and is therefore the child of
-                # that parent.
-                key = tuple(sorted([conceptID, conceptID[:-1]]))
-                relationships[key] = "{0:s}\tReadV2_Concept\t{1:s}\tReadV2_Concept\tparent\tParent".format(
-                    conceptID, conceptID[:-1])
-            elif termIDRoot == "00":
-                # The code is only one character long, and therefore is the domain for all codes below it.
-                domains[conceptID] = description
-
-    # Add the domain information to the concepts.
-    for i in concepts:
-        concepts[i] = concepts[i].format(domains["{0:s}".format(i[0])])
-
-    # Remove duplicate words.
-    words = set(words)
-
-    return concepts, terms, words, relationships
-
-
-def SNOMED_CT():
-    pass
+    return _gather_hierarchy("ReadV2", fileReadV2Data, _generate_ReadV2_records(fileReadV2Data, processes),
+                             dirSnapshots)
+
+
+def _generate_ReadV2_records(fileReadV2Data, processes=1, chunkSize=1 << 22):
+    """Generate the records of the concepts, terms, words and relationships in a version of the Read V2 ontology.
+
+    Records are generated as the file is read, so a record may be generated again when its key is found again. The
+    later record should be taken to supersede the earlier one. The concepts, terms and relationships are records from
+    ontology_records, and each word is generated as a string. The IDs held by the records are interned, so that the
+    many records referring to the same concept or word share one copy of its ID.
+
+    The domain of a concept is the primary description of the top level single character concept for the given concept
+    (e.g. C for C10E). This will not always be known at the time a concept is found, so concepts are generated without
+    a domain. The domains are generated as records of their own, keyed by the top level concept ID.
+
+    The file is decompressed and split into chunks of whole lines, so that the descriptions of each chunk can be split
+    into words in one batch. When parsing with multiple processes, the file is decompressed once (by this process) and
+    the lines of each chunk are split and cleaned by a worker process, with the records built from the chunks in the
+    order that they occur in the file. The same records are generated however many processes are used.
+
+    :param fileReadV2Data:  The location where the Read V2 ontology data can be found.
+    :type fileReadV2Data:   str
+    :param processes:       The number of processes to parse the data with. If this is 1, the data is parsed by this
+                                process. If it is None, the number of CPUs is used.
+    :type processes:        int
+    :param chunkSize:       The approximate number of (decompressed) bytes of the file in each chunk.
+    :type chunkSize:        int
+    :return:                The records as (collection, key, value) tuples, where the collection is one of "concepts",
+                                "domains", "terms", "words" and "relationships".
+    :rtype:                 generator
+
+    """
+
+    if processes == 1:
+        entries = (_split_ReadV2_chunk(i) for i in _read_line_chunks(fileReadV2Data, chunkSize))
+        yield from _build_ReadV2_records(itertools.chain.from_iterable(entries))
+        return
+
+    # The worker processes do the decoding, splitting and cleaning of the lines, and send back the entries needed to
+    # build the records. The records themselves are built by this process, as unpickling them would cost more than
+    # building them.
+    with multiprocessing.Pool(processes) as pool:
+        entries = _imap_bounded(pool, _split_ReadV2_chunk, _read_line_chunks(fileReadV2Data, chunkSize),
+                                _CHUNKS_PER_PROCESS * (processes or os.cpu_count() or 1))
+        yield from _build_ReadV2_records(itertools.chain.from_iterable(entries))
+
+
+def _build_ReadV2_records(entries):
+    """Generate the records of the concepts, terms, words and relationships described by entries of a Read V2 file.
+
+    :param entries:     The (concept ID, term ID, description, words) of each entry (line) of the file, as generated
+                            by _split_ReadV2_lines.
+    :type entries:      iterable
+    :return:            The records as (collection, key, value) tuples. See _generate_ReadV2_records.
+    :rtype:             generator
+
+    """
+
+    previousConceptID = None
+    for conceptID, termIDRoot, description, termWords in entries:
+        # The term IDs are specific to a given concept and not unique across the whole hierarchy. For example, the
+        # primary term for every concept has ID 00. To get around this we append the concept ID to the front of each
+        # term ID.
+        conceptID = intern(conceptID)
+        termID = "{0:s}_{1:s}".format(conceptID, termIDRoot)
+        termWords = [intern(i) for i in termWords]
+        for i in termWords:
+            yield "words", i, i
+
+        # Record the term's attributes. Read V2 has no concept of non-current terms, so all are current.
+        yield "terms", termID, Term(termID, True, description, "ReadV2_Term")
+
+        # Record the concept's attributes. Read V2 has no concept of non-current concepts, so all are current. The
+        # terms of a concept are normally on consecutive lines, so the concept is only recorded on the first. The
+        # concept is numbered so that it and all its descendants can be found as a range of numbers.
+        if conceptID != previousConceptID:
+            left, right = hierarchy_numbering.number_ReadV2_code(conceptID) or (None, None)
+            yield "concepts", conceptID, Concept(conceptID, True, None, len(conceptID), left, right, "ReadV2_Concept")
+            previousConceptID = conceptID
+
+        # Add the relationships between the term and the words it contains. Relationships are keyed by the IDs of
+        # the source and target nodes they join.
+        for i in termWords:
+            yield "relationships", termID + '\t' + i, Relationship(termID, i, '', _READV2_CONTAINS)
+
+        # Add the relationship between the concept and the term. For every concept, term ID 00 indicates the
+        # primary term, and all other terms are secondary.
+        yield "relationships", conceptID + '\t' + termID, \
+            Relationship(conceptID, termID, "true" if termIDRoot == "00" else "false", _READV2_DESCRIBED_BY)
+
+        # Add the relationship between the code and its parent. Read V2 parent relationships do not have a 'type',
+        # so each parent relationship is given the default type parent.
+        if len(conceptID) > 1:
+            # If the concept consists of at least 2 characters, then it has a parent and is therefore the child of
+            # that parent.
+            parentID = intern(conceptID[:-1])
+            yield "relationships", conceptID + '\t' + parentID, \
+                Relationship(conceptID, parentID, "parent", _READV2_PARENT)
+        elif termIDRoot == "00":
+            # The code is only one character long, and therefore is the domain for all codes below it.
+            yield "domains", conceptID, description
+
+
+def _split_ReadV2_chunk(chunk):
+    """Split the lines in a chunk of a Read V2 data file into the entries needed to build its records.
+
+    This is the part of the parsing performed by the worker processes when parsing in parallel.
+
+    :param chunk:   The lines to split.
+    :type chunk:    bytes
+    :return:        The (concept ID, term ID, description, words) of each line. See _split_ReadV2_lines.
+    :rtype:         list
+
+    """
+
+    return _split_ReadV2_lines(chunk.splitlines())
+
+
+def _split_ReadV2_lines(lines):
+    """Split lines of a Read V2 data file into the entries needed to build its records.
+
+    :param lines:   The lines of the file.
+    :type lines:    iterable
+    :return:        The concept ID, term ID (unique only within the concept), description and cleaned description
+                        words of each line.
+    :rtype:         list
+
+    """
+
+    entries = []
+    for line in lines:
+        # Lines are delimited by commas, with each entry on the line enclosed in quotes. For example:
+        # "MELLITUS","02","Type 1 diabetes mellitus","","","00","EN","C10E.","0"
+        line = str(line.strip(), "utf-8")  # Convert bytes string to UTF-8.
+        chunks = line.split('","')
+        chunks[0] = chunks[0][1:]  # Strip the " at the stat of the first entry.
+        chunks[-1] = chunks[-1][:-1]  # Strip the " at the end of the last entry.
+
+        # Get the elements of the entry that are of interest. These would be the concept ID, term ID and the
+        # longest recorded term description.
+        conceptID = chunks[7].replace('.', '')  # Remove trailing full stops from the concept ID.
+        description = chunks[4] if chunks[4] else (chunks[3] if chunks[3] else chunks[2])
+
+        entries.append((conceptID, chunks[5], description))
+
+    # Split the descriptions into their words in one batch.
+    return [i + (j,) for i, j in zip(entries, cleaners.tokenise_descriptions([i[2] for i in entries]))]
+
+
+def _imap_bounded(pool, function, items, maxInFlight):
+    """Apply a function to items across a pool of processes, generating the results in the order of the items.
+
+    Unlike Pool.imap, which reads the whole iterable of items into its task queue as fast as it can, only a bounded
+    number of items are read ahead of the results being consumed.
+
+    :param pool:        The pool of worker processes.
+    :type pool:         multiprocessing.Pool
+    :param function:    The function to apply to each item.
+    :type function:     function
+    :param items:       The items to apply the function to.
+    :type items:        iterable
+    :param maxInFlight: The maximum number of items that are being (or waiting to be) processed at once.
+    :type maxInFlight:  int
+    :return:            The result of applying the function to each item.
+    :rtype:             generator
+
+    """
+
+    pending = deque()
+    for i in items:
+        pending.append(pool.apply_async(function, (i,)))
+        if len(pending) >= maxInFlight:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+@contextmanager
+def _paused_gc():
+    """Pause the cyclic garbage collector while a large number of records are created.
+
+    The records hold no reference cycles, but are still tracked by the collector. Leaving it running while parsing
+    means that it repeatedly traverses the growing collection of records, which takes up much of the time spent
+    parsing.
+
+    :return:    A context manager that pauses the collector while it is active.
+    :rtype:     contextlib.contextmanager
+
+    """
+
+    isGCEnabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if isGCEnabled:
+            gc.enable()
+
+
+def _read_line_chunks(fileData, chunkSize):
+    """Decompress a gzipped file and split it into chunks of whole lines.
+
+    :param fileData:    The location of the file.
+    :type fileData:     str
+    :param chunkSize:   The number of decompressed bytes to read for each chunk. Each chunk is extended or shortened to
+                            end at the end of a line.
+    :type chunkSize:    int
+    :return:            The chunks of the file.
+    :rtype:             generator
+
+    """
+
+    with gzip.open(fileData, 'rb') as fidData:
+        remainder = b''
+        for block in iter(lambda: fidData.read(chunkSize), b''):
+            block = remainder + block
+            chunkEnd = block.rfind(b'\n') + 1  # The chunk is empty if the block has no line break.
+            remainder = block[chunkEnd:]
+            if chunkEnd:
+                yield block[:chunkEnd]
+        if remainder:
+            yield remainder
+
+
+def _read_latest_RF2_rows(fileData):
+    """Read the latest row of each component in an RF2 data file.
+
+    A Delta file can hold several rows for the same component (one for each release that changed it). The file is read
+    twice, once to find the effective time of the latest row of each component and once to generate those rows, so
+    that only the IDs and effective times of the components are held in memory.
+
+    :param fileData:    The location of the (tab separated) RF2 file.
+    :type fileData:     str
+    :return:            The fields of the latest row of each component, in the order they occur in the file.
+    :rtype:             generator
+
+    """
+
+    latestTimes = {}
+    with open(fileData, 'r', encoding="utf-8", newline='') as fidData:
+        fidData.readline()  # Strip off the header.
+        for line in fidData:
+            componentID, effectiveTime = line.split('\t', 2)[:2]
+            if effectiveTime > latestTimes.get(componentID, ''):
+                latestTimes[componentID] = effectiveTime
+
+    with open(fileData, 'r', encoding="utf-8", newline='') as fidData:
+        fidData.readline()
+        for line in fidData:
+            fields = line.rstrip("\r\n").split('\t')
+            if latestTimes.get(fields[0]) == fields[1]:
+                del latestTimes[fields[0]]  # Only the first of any duplicated latest rows is used.
+                yield fields
+
+
+def _find_RF2_file(dirRF2Data, fileType):
+    """Find the RF2 data file of a given type to load from a release.
+
+    The Delta file is used if the release has one, and the Snapshot file otherwise.
+
+    :param dirRF2Data:  The directory of the release. See _find_RF2_files.
+    :type dirRF2Data:   str
+    :param fileType:    The type of file to find (e.g. Concept).
+    :type fileType:     str
+    :return:            The location of the file.
+    :rtype:             str
+
+    """
+
+    dataFiles = _find_RF2_files(dirRF2Data, fileType)
+    for i in ("Delta", "Snapshot"):
+        if i in dataFiles:
+            return dataFiles[i]
+    raise ValueError("Expected a {0:s} file in {1:s}, but found none.".format(fileType, dirRF2Data))
+
+
+def _find_RF2_files(dirRF2Data, fileType):
+    """Find the Delta and Snapshot RF2 data files of a given type in a release.
+
+    :param dirRF2Data:  The directory of the release. This is searched recursively, so can be the top level directory
+                            of the release (holding both the Delta and Snapshot directories), its Delta or Snapshot
+                            directory or the Terminology directory within one of those.
+    :type dirRF2Data:   str
+    :param fileType:    The type of file to find (e.g. Concept).
+    :type fileType:     str
+    :return:            The locations of the files found, keyed by their release type (Delta or Snapshot).
+    :rtype:             dict
+
+    """
+
+    fileFinder = re.compile("sct2_{0:s}_(Delta|Snapshot)[-_].*\\.txt$".format(fileType))
+    dataFiles = defaultdict(list)
+    for i in os.walk(dirRF2Data):
+        for j in i[2]:
+            match = fileFinder.match(j)
+            if match:
+                dataFiles[match.group(1)].append(os.path.join(i[0], j))
+    for i in dataFiles:
+        if len(dataFiles[i]) != 1:
+            raise ValueError("Expected one {0:s} {1:s} file in {2:s}, but found {3:d}.".format(
+                fileType, i, dirRF2Data, len(dataFiles[i])))
+    return {i: dataFiles[i][0] for i in dataFiles}
+
+
+def _write_SNOMED_CT_changes(dirRF2Data, fidAddTerms, fidRemoveTerms, fidUpdateConcepts, fidRemoveConcepts,
+                             fidAddWords, fidAddRelationships, fidUpdateRelationships, fidRemoveRelationships):
+    """Write the additions, updates and removals recorded by a SNOMED CT RF2 release.
+
+    The rows of the Delta files of a release (sct2_Concept_Delta, sct2_Description_Delta and sct2_Relationship_Delta)
+    are the components changed by the release, so they can be written straight out as changes without comparing the
+    release to the previous one. The latest row of each component is used, with active rows becoming additions and
+    updates and inactive rows becoming removals. Only English fully specified names and synonyms, and IS-A
+    relationships, are loaded. A Snapshot release has the same layout, with a row for every component, and can be
+    loaded the same way to populate the database.
+
+    As the rows don't say whether a component is already in the database, the changes are written so that they can be
+    applied either way:
+        - concepts are written as updates (which create missing concepts). Each concept's domain is the semantic tag of
+          its fully specified name when that's in the release. Any attribute left empty (such as the level, which
+          depends on the whole hierarchy) keeps the value already in the database.
+        - terms are removed and added again, which also clears out the relationships to the words of any description
+          that has changed. The terms of removed concepts are removed with them. The descriptions of a concept usually
+          stay active when it is removed, and so are not in a Delta file, so they are found from the release's
+          Snapshot description file when it has one.
+        - words are added (the database merges those that already exist).
+        - IS-A relationships are written as updates.
+
+    Only the IDs and effective times of the components in each file, the IDs of the removed concepts, the domains found
+    and the words written are held in memory, so memory use is bounded by the size of the release's changes.
+
+    :param dirRF2Data:              The directory of the release. See _find_RF2_files.
+    :type dirRF2Data:               str
+    :param fidAddTerms:             The file to write the added terms to.
+    :type fidAddTerms:              file
+    :param fidRemoveTerms:          The file to write the removed terms to.
+    :type fidRemoveTerms:           file
+    :param fidUpdateConcepts:       The file to write the added and updated concepts to.
+    :type fidUpdateConcepts:        file
+    :param fidRemoveConcepts:       The file to write the removed concepts to.
+    :type fidRemoveConcepts:        file
+    :param fidAddWords:             The file to write the added words to.
+    :type fidAddWords:              file
+    :param fidAddRelationships:     The file to write the relationships of the added terms to.
+    :type fidAddRelationships:      file
+    :param fidUpdateRelationships:  The file to write the added and updated IS-A relationships to.
+    :type fidUpdateRelationships:   file
+    :param fidRemoveRelationships:  The file to write the removed IS-A relationships to.
+    :type fidRemoveRelationships:   file
+
+    """
+
+    # Find the concepts removed by the release. Concept lines have the form:
+    # id, effectiveTime, active, moduleId, definitionStatusId
+    fileConcepts = _find_RF2_file(dirRF2Data, "Concept")
+    removedConcepts = {i[0] for i in _read_latest_RF2_rows(fileConcepts) if i[2] != '1'}
+
+    # Write the terms, removing those of the removed concepts. Description lines have the form:
+    # id, effectiveTime, active, moduleId, conceptId, languageCode, typeId, term, caseSignificanceId
+    domains = {}
+    wordsAdded = set()
+    fileDescriptions = _find_RF2_file(dirRF2Data, "Description")
+    for i in _read_latest_RF2_rows(fileDescriptions):
+        termID, conceptID, typeID, description = i[0], i[4], i[6], i[7]
+        if i[5] != "en" or typeID not in (_SNOMED_CT_FSN_TYPE, _SNOMED_CT_SYNONYM_TYPE):
+            continue
+        fidRemoveTerms.write("{0:s}\t\t\t\t\t\t\tSNOMED_CT_Term\n".format(termID))
+        if i[2] != '1' or conceptID in removedConcepts:
+            continue
+
+        # Record the term, the words it contains and the concept it describes.
+        isPrimary = typeID == _SNOMED_CT_FSN_TYPE
+        termWords = cleaners.tokenise_description(description)
+        fidAddTerms.write("{0!s}\n".format(Term(termID, True, description, "SNOMED_CT_Term")))
+        for j in termWords:
+            if j not in wordsAdded:
+                fidAddWords.write("{0:s}\tWord\n".format(j))
+                wordsAdded.add(j)
+            fidAddRelationships.write("{0!s}\n".format(Relationship(termID, j, '', _SNOMED_CT_CONTAINS)))
+        fidAddRelationships.write("{0!s}\n".format(
+            Relationship(conceptID, termID, "true" if isPrimary else "false", _SNOMED_CT_DESCRIBED_BY)))
+        semanticTag = _SEMANTIC_TAG_FINDER.search(description) if isPrimary else None
+        if semanticTag:
+            domains[conceptID] = semanticTag.group(1)
+
+    # Remove the terms of the removed concepts whose descriptions are unchanged, and so only in the Snapshot file.
+    fileSnapshotDescriptions = _find_RF2_files(dirRF2Data, "Description").get("Snapshot")
+    if removedConcepts and fileSnapshotDescriptions not in (None, fileDescriptions):
+        for i in _read_latest_RF2_rows(fileSnapshotDescriptions):
+            if i[4] in removedConcepts and i[5] == "en" and i[6] in (_SNOMED_CT_FSN_TYPE, _SNOMED_CT_SYNONYM_TYPE):
+                fidRemoveTerms.write("{0:s}\t\t\t\t\t\t\tSNOMED_CT_Term\n".format(i[0]))
+
+    # Write the concepts.
+    for i in _read_latest_RF2_rows(fileConcepts):
+        domain = domains.pop(i[0], None)
+        if i[2] == '1':
+            fidUpdateConcepts.write("{0!s}\n".format(
+                Concept(i[0], True, domain, None, None, None, "SNOMED_CT_Concept")))
+        else:
+            fidRemoveConcepts.write("{0:s}\t\t\t\t\t\t\tSNOMED_CT_Concept\n".format(i[0]))
+
+    # Update the domains of the concepts whose fully specified names have changed while the concepts have not.
+    for i in sorted(domains):
+        fidUpdateConcepts.write("{0!s}\n".format(Concept(i, None, domains[i], None, None, None, "SNOMED_CT_Concept")))
+
+    # Write the IS-A relationships. Relationship lines have the form:
+    # id, effectiveTime, active, moduleId, sourceId, destinationId, relationshipGroup, typeId, characteristicTypeId,
+    # modifierId
+    for i in _read_latest_RF2_rows(_find_RF2_file(dirRF2Data, "Relationship")):
+        if i[7] == _SNOMED_CT_IS_A_TYPE:
+            fidRelationships = fidUpdateRelationships if i[2] == '1' else fidRemoveRelationships
+            fidRelationships.write("{0!s}\n".format(Relationship(i[4], i[5], "parent", _SNOMED_CT_PARENT)))
+
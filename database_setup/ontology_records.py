@@ -0,0 +1,204 @@
+"""Compact records of the concepts, terms and relationships parsed from the ontology data files.
+
+Each record only holds its attribute values (in __slots__ rather than a per-record dict), and is only converted to the
+line of a Neo4j data file (using str) when it is written out.
+
+"""
+
+# Python imports.
+from collections import namedtuple
+
+
+class _Record(object):
+    """Base class of the records, defining the comparison and serialisation shared by them all.
+
+    The arguments of each record's constructor must be in the same order as its slots, as records are rebuilt from
+    the values of their slots when loaded from a snapshot.
+
+    """
+
+    __slots__ = ()
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(getattr(self, i) == getattr(other, i) for i in self.__slots__)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "{0:s}({1:s})".format(
+            type(self).__name__, ", ".join("{0:s}={1!r}".format(i, getattr(self, i)) for i in self.__slots__))
+
+    def __str__(self):
+        return '\t'.join(self.fields())
+
+    def fields(self):
+        """Get the values of the record's attributes, formatted in the way that they're written to the data files.
+
+        :return:    The formatted values, in the order of the columns of the data files.
+        :rtype:     list
+
+        """
+
+        return [_format_value(getattr(self, i)) for i in self.__slots__]
+
+
+class Concept(_Record):
+    """A concept in a hierarchy."""
+
+    __slots__ = ("id", "current", "domain", "level", "left", "right", "label")
+
+    def __init__(self, conceptID, current, domain, level, left, right, label):
+        """Initialise a concept.
+
+        :param conceptID:   The ID of the concept.
+        :type conceptID:    str
+        :param current:     Whether the concept is current.
+        :type current:      bool
+        :param domain:      The description of the top level concept that the concept falls under. None if this is not
+                                yet known.
+        :type domain:       str
+        :param level:       The depth of the concept in the hierarchy.
+        :type level:        int
+        :param left:        The number of the concept in the nested set numbering of the hierarchy (see
+                                webapp.utilities.hierarchy_numbering). None if the hierarchy isn't numbered.
+        :type left:         int
+        :param right:       The end of the interval of numbers holding the concept and its descendants. None if the
+                                hierarchy isn't numbered.
+        :type right:        int
+        :param label:       The label of the concept's node (e.g. ReadV2_Concept).
+        :type label:        str
+
+        """
+
+        self.id = conceptID
+        self.current = current
+        self.domain = domain
+        self.level = level
+        self.left = left
+        self.right = right
+        self.label = label
+
+
+class Relationship(_Record):
+    """A relationship between two nodes in a hierarchy.
+
+    The labels of the relationship and the nodes it joins are shared by every relationship of the same kind, and so
+    are held in one RelationshipLabels tuple rather than by each relationship.
+
+    """
+
+    __slots__ = ("source", "target", "type", "labels")
+
+    def __init__(self, source, target, relType, labels):
+        """Initialise a relationship.
+
+        :param source:  The ID of the node the relationship starts at.
+        :type source:   str
+        :param target:  The ID of the node the relationship ends at.
+        :type target:   str
+        :param relType: The type of the relationship (e.g. whether a DescribedBy relationship is to a primary term).
+        :type relType:  str
+        :param labels:  The labels of the source node, target node and relationship.
+        :type labels:   RelationshipLabels
+
+        """
+
+        self.source = source
+        self.target = target
+        self.type = relType
+        self.labels = labels
+
+    @property
+    def label(self):
+        """The label of the relationship (e.g. Parent)."""
+        return self.labels.relationship
+
+    @property
+    def sourceLabel(self):
+        """The label of the node the relationship starts at."""
+        return self.labels.source
+
+    @property
+    def targetLabel(self):
+        """The label of the node the relationship ends at."""
+        return self.labels.target
+
+    def fields(self):
+        """Get the values of the record's attributes, formatted in the way that they're written to the data files.
+
+        :return:    The formatted values, in the order of the columns of the data files.
+        :rtype:     list
+
+        """
+
+        return [self.source, self.labels.source, self.target, self.labels.target, self.type, self.labels.relationship]
+
+
+class Term(_Record):
+    """A term used to describe a concept in a hierarchy.
+
+    The searchable form of a term's description is its lowercase form, and is only created when it is needed.
+
+    """
+
+    __slots__ = ("id", "current", "pretty", "label")
+
+    def __init__(self, termID, current, pretty, label):
+        """Initialise a term.
+
+        :param termID:  The ID of the term.
+        :type termID:   str
+        :param current: Whether the term is current.
+        :type current:  bool
+        :param pretty:  The description of the term, as it is displayed.
+        :type pretty:   str
+        :param label:   The label of the term's node (e.g. ReadV2_Term).
+        :type label:    str
+
+        """
+
+        self.id = termID
+        self.current = current
+        self.pretty = pretty
+        self.label = label
+
+    @property
+    def searchable(self):
+        """The description of the term, as it is searched."""
+        return self.pretty.lower()
+
+    def fields(self):
+        """Get the values of the record's attributes, formatted in the way that they're written to the data files.
+
+        :return:    The formatted values, in the order of the columns of the data files.
+        :rtype:     list
+
+        """
+
+        return [self.id, _format_value(self.current), self.pretty, self.searchable, self.label]
+
+
+# The labels of a kind of relationship, and of the nodes that it joins.
+RelationshipLabels = namedtuple("RelationshipLabels", ["source", "target", "relationship"])
+
+
+def _format_value(value):
+    """Format an attribute value in the way that it's written to the data files.
+
+    :param value:   The value to format.
+    :type value:    bool, int or str
+    :return:        The formatted value.
+    :rtype:         str
+
+    """
+
+    if value is True:
+        return "true"
+    elif value is False:
+        return "false"
+    elif value is None:
+        return ''
+    return str(value)
@@ -0,0 +1,204 @@
+"""Functions to save and load snapshots of the parsed hierarchies of ontology releases.
+
+A release only needs parsing the first time it's seen. The parsed hierarchy is saved as a snapshot keyed by the hash
+of the release's data file, and the snapshot is loaded in place of parsing the data file whenever the same release is
+needed again (e.g. when the current release of one update becomes the previous release of the next).
+
+"""
+
+# Python imports.
+from collections import namedtuple
+import hashlib
+import operator
+import os
+import pickle
+
+# The layout of a snapshot file. The file starts with a magic string and the version of the snapshot format, followed
+# by the pickled hierarchy. The version must be changed whenever the parsed hierarchies change, so that snapshots saved
+# by older code are parsed again rather than loaded. Each collection of records in the hierarchy is pickled as columns
+# (the class of the records, their keys and the values of their slots) rather than as the records themselves, as this
+# is much faster to save and load than pickling each record as an object.
+_FILE_MAGIC = b"CCWSNAPSHOT"
+_FILE_VERSION = 3
+
+
+def file_hash(fileData, blockSize=1 << 20):
+    """Calculate the SHA-1 hash of a file's contents.
+
+    A release with several data files (e.g. CTV3) is given as the directory containing them, in which case the paths
+    and contents of all the files within the directory are hashed together.
+
+    :param fileData:    The location of the file (or directory of files) to hash.
+    :type fileData:     str
+    :param blockSize:   The number of bytes of the file to read at a time.
+    :type blockSize:    int
+    :return:            The hexadecimal digest of the file's contents.
+    :rtype:             str
+
+    """
+
+    fileHash = hashlib.sha1()
+    if not os.path.isdir(fileData):
+        _hash_contents(fileHash, fileData, blockSize)
+        return fileHash.hexdigest()
+
+    dataFiles = sorted(os.path.relpath(os.path.join(i[0], j), fileData) for i in os.walk(fileData) for j in i[2])
+    for i in dataFiles:
+        fileHash.update(i.encode("utf-8"))
+        _hash_contents(fileHash, os.path.join(fileData, i), blockSize)
+    return fileHash.hexdigest()
+
+
+def load(dirSnapshots, codeFormat, fileData):
+    """Load the snapshot of the parsed hierarchy of a release.
+
+    :param dirSnapshots:    The directory containing the snapshots.
+    :type dirSnapshots:     str
+    :param codeFormat:      The code format of the release (e.g. ReadV2).
+    :type codeFormat:       str
+    :param fileData:        The location of the release's data file (or directory of data files).
+    :type fileData:         str
+    :return:                The parsed hierarchy, or None if there is no usable snapshot of the release.
+    :rtype:                 tuple
+
+    """
+
+    fileSnapshot = snapshot_location(dirSnapshots, codeFormat, file_hash(fileData))
+    if not os.path.isfile(fileSnapshot):
+        return None
+
+    with open(fileSnapshot, "rb") as fidSnapshot:
+        magic = fidSnapshot.read(len(_FILE_MAGIC))
+        version = int.from_bytes(fidSnapshot.read(4), "little")
+        if magic != _FILE_MAGIC or version != _FILE_VERSION:
+            # The snapshot was saved by a different version of the parser.
+            return None
+        try:
+            return tuple(_from_columns(i) for i in pickle.load(fidSnapshot))
+        except (EOFError, pickle.UnpicklingError):
+            # The snapshot is incomplete (e.g. it was being saved when the process was killed).
+            return None
+
+
+def prune(dirSnapshots, filesToKeep):
+    """Delete the snapshots of all releases except those of a given set of data files.
+
+    :param dirSnapshots:    The directory containing the snapshots.
+    :type dirSnapshots:     str
+    :param filesToKeep:     The locations of the data files of the releases to keep the snapshots of, keyed by their
+                                code format. Data files that don't exist are ignored.
+    :type filesToKeep:      dict
+
+    """
+
+    if not os.path.isdir(dirSnapshots):
+        return
+    snapshotsToKeep = {
+        snapshot_location(dirSnapshots, i, file_hash(j)) for i in filesToKeep for j in filesToKeep[i]
+        if os.path.exists(j)
+    }
+    for i in os.listdir(dirSnapshots):
+        fileSnapshot = os.path.join(dirSnapshots, i)
+        if i.endswith(".snapshot") and fileSnapshot not in snapshotsToKeep:
+            os.remove(fileSnapshot)
+
+
+def save(dirSnapshots, codeFormat, fileData, hierarchy):
+    """Save a snapshot of the parsed hierarchy of a release.
+
+    The snapshot is written to a temporary location and then moved into place, so that a partially written snapshot
+    is never loaded.
+
+    :param dirSnapshots:    The directory to save the snapshot in.
+    :type dirSnapshots:     str
+    :param codeFormat:      The code format of the release (e.g. ReadV2).
+    :type codeFormat:       str
+    :param fileData:        The location of the release's data file (or directory of data files).
+    :type fileData:         str
+    :param hierarchy:       The parsed hierarchy. Each element should be a dict of records of one class from
+                                ontology_records keyed by their IDs, or some other picklable collection (e.g. a set of
+                                words).
+    :type hierarchy:        tuple
+
+    """
+
+    os.makedirs(dirSnapshots, exist_ok=True)
+    fileSnapshot = snapshot_location(dirSnapshots, codeFormat, file_hash(fileData))
+    fileTemporary = "{0:s}.tmp{1:d}".format(fileSnapshot, os.getpid())
+    with open(fileTemporary, "wb") as fidSnapshot:
+        fidSnapshot.write(_FILE_MAGIC)
+        fidSnapshot.write(_FILE_VERSION.to_bytes(4, "little"))
+        pickle.dump(tuple(_to_columns(i) for i in hierarchy), fidSnapshot, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(fileTemporary, fileSnapshot)
+
+
+def snapshot_location(dirSnapshots, codeFormat, releaseID):
+    """Determine the location of the snapshot of a release.
+
+    :param dirSnapshots:    The directory containing the snapshots.
+    :type dirSnapshots:     str
+    :param codeFormat:      The code format of the release (e.g. ReadV2).
+    :type codeFormat:       str
+    :param releaseID:       The hash of the release's data file.
+    :type releaseID:        str
+    :return:                The location of the snapshot.
+    :rtype:                 str
+
+    """
+
+    return os.path.join(dirSnapshots, "{0:s}_{1:s}.snapshot".format(codeFormat, releaseID))
+
+
+def _from_columns(collection):
+    """Rebuild a collection of records from its columns.
+
+    :param collection:  The columns of the collection, as created by _to_columns, or a collection that was not split
+                            into columns.
+    :type collection:   tuple or object
+    :return:            The collection.
+    :rtype:             dict or object
+
+    """
+
+    if not isinstance(collection, _Columns):
+        return collection
+    recordClass = collection.recordClass
+    return dict(zip(collection.keys, [recordClass(*i) for i in collection.values]))
+
+
+def _hash_contents(fileHash, fileData, blockSize):
+    """Add the contents of a file to a hash.
+
+    :param fileHash:    The hash to update.
+    :type fileHash:     hashlib hash object
+    :param fileData:    The location of the file.
+    :type fileData:     str
+    :param blockSize:   The number of bytes of the file to read at a time.
+    :type blockSize:    int
+
+    """
+
+    with open(fileData, "rb") as fidData:
+        for block in iter(lambda: fidData.read(blockSize), b""):
+            fileHash.update(block)
+
+
+def _to_columns(collection):
+    """Split a collection of records into columns.
+
+    :param collection:  The records keyed by their IDs. Collections that are not dicts of records are left unchanged.
+    :type collection:   dict or object
+    :return:            The columns of the collection.
+    :rtype:             _Columns or object
+
+    """
+
+    if not isinstance(collection, dict) or not collection:
+        return collection
+    recordClass = type(next(iter(collection.values())))
+    getValues = operator.attrgetter(*recordClass.__slots__)
+    return _Columns(recordClass, list(collection), [getValues(i) for i in collection.values()])
+
+
+# The columns of a collection of records of the same class.
+_Columns = namedtuple("_Columns", ["recordClass", "keys", "values"])
@@ -5,10 +5,16 @@ import os
 
 # User imports.
 from . import ontology_parsing
+from . import snapshots
 from . import update_database
+from webapp.mod_concept_discovery.InvertedIndex import InvertedIndex
 
 
-def main(databaseURI, databaseUsername, databasePassword):
+# The suffix of the name an index file is written under until the database has been updated to the same release.
+_PENDING_SUFFIX = ".pending"
+
+
+def main(databaseURI, databaseUsername, databasePassword, initial=False, external=False, processes=1):
     """
 
     :param databaseURI:         The location of the database.
@@ -17,16 +23,111 @@ def main(databaseURI, databaseUsername, databasePassword):
     :type databaseUsername:     str
     :param databasePassword:    The password used to access the database.
     :type databasePassword:     str
+    :param initial:             Whether this is the first load of an empty database. If so, the files for the Neo4j
+                                    offline importer are generated rather than updating the database through Cypher.
+    :type initial:              bool
+    :param external:            Whether to find the changes between releases by sorting their records on disk, which
+                                    bounds the memory needed by the parsing regardless of the size of the releases.
+                                    As the search indices hold a whole release in memory while they are built, they
+                                    are not written in this mode, and the index backend keeps serving the releases it
+                                    was last built for until an update is run without it.
+    :type external:             bool
+    :param processes:           The number of processes to parse each ontology data file with.
+    :type processes:            int
 
     """
 
-    # Run the parsing.
+    # Determine the locations of the data.
     dirCurrent = os.path.dirname(os.path.join(os.getcwd(), __file__))  # Directory containing this file.
     dirData = os.path.abspath(os.path.join(dirCurrent, "Data"))
+    readV2Files = [os.path.join(dirData, "Current", "ReadV2Data.gz"), os.path.join(dirData, "Previous", "ReadV2Data.gz")]
+    ctv3Files = [os.path.join(dirData, "Current", "CTV3"), os.path.join(dirData, "Previous", "CTV3")]
+    dirSNOMEDCTData = os.path.join(dirData, "Current", "SNOMED_CT")
+
+    # CTV3 is only loaded when its data is present. An initial load only needs the current release, while an update
+    # needs both releases.
+    releaseFiles = {"ReadV2": readV2Files}
+    if all(os.path.isdir(i) for i in (ctv3Files[:1] if initial else ctv3Files)):
+        releaseFiles["CTV3"] = ctv3Files
+
+    # Each release is identified by the hash of its data file, so that results cached from a previous release can be
+    # told apart from those of the newly loaded one.
+    releaseIDs = {i: snapshots.file_hash(releaseFiles[i][0]) for i in releaseFiles}
+
+    # SNOMED CT is loaded from the changes recorded in its RF2 release (see ontology_parsing._write_SNOMED_CT_changes),
+    # so is only loaded by updates and only needs the current release.
+    if initial or not os.path.isdir(dirSNOMEDCTData):
+        dirSNOMEDCTData = None
+    else:
+        releaseIDs["SNOMED_CT"] = snapshots.file_hash(dirSNOMEDCTData)
+
+    # The parsed hierarchy of each release is saved as a snapshot the first time the release is parsed. As the current
+    # release of one update is the previous release of the next, only the newly added release normally needs parsing.
+    dirSnapshots = os.path.join(dirData, "Snapshots")
+
+    # Write the search indices for the current releases. These are memory mapped by the processes serving searches, so
+    # are written under temporary names and only moved into place once the database holds the same releases. Building
+    # an index needs the whole of a release in memory, so the indices are skipped when the memory used is bounded.
+    dirIndices = os.path.join(dirData, "Indices")
+    os.makedirs(dirIndices, exist_ok=True)
+    indexFiles = {}
+    if not external:
+        concepts, terms, words, relationships = ontology_parsing.parse_ReadV2(readV2Files[0], processes, dirSnapshots)
+        index = InvertedIndex.from_hierarchy(concepts, terms, relationships, releaseIDs["ReadV2"])
+        indexFiles["ReadV2"] = os.path.join(dirIndices, "ReadV2.idx")
+        index.write(indexFiles["ReadV2"] + _PENDING_SUFFIX)
+        if "CTV3" in releaseFiles:
+            concepts, terms, words, relationships = ontology_parsing.parse_CTV3(ctv3Files[0], dirSnapshots)
+            index = InvertedIndex.from_hierarchy(concepts, terms, relationships, releaseIDs["CTV3"])
+            indexFiles["CTV3"] = os.path.join(dirIndices, "CTV3.idx")
+            index.write(indexFiles["CTV3"] + _PENDING_SUFFIX)
+        del concepts, terms, words, relationships, index
+
+    if initial:
+        # Generate the files for the offline importer. The import itself has to be run by hand, as the database must
+        # be stopped while it runs.
+        dirNeo4jImport = os.path.join(dirData, "Neo4jImport")
+        os.makedirs(dirNeo4jImport, exist_ok=True)
+        nodeFiles, relationshipFiles = ontology_parsing.main(dirNeo4jImport, readV2Files, initial=True,
+                                                             releaseIDs=releaseIDs, processes=processes,
+                                                             dirSnapshots=dirSnapshots,
+                                                             ctv3Files=releaseFiles.get("CTV3"))
+        _install_indices(indexFiles)
+        snapshots.prune(dirSnapshots, releaseFiles)
+        print("Stop the database and load the generated files into it by running:")
+        print("    neo4j-admin import --mode=csv --database=graph.db {0:s} {1:s}".format(
+            ' '.join("--nodes={0:s}".format(i) for i in nodeFiles),
+            ' '.join("--relationships={0:s}".format(i) for i in relationshipFiles)))
+        print("Then start the database and create its constraints by running:")
+        for i in update_database.constraint_statements(list(releaseFiles)):
+            print("    {0:s};".format(i))
+        return
+
+    # Run the parsing.
     dirNeo4jData = os.path.join(dirData, "Neo4jData")
     os.makedirs(dirNeo4jData, exist_ok=True)  # Create the directory to hold the data needed for the Neo4j database.
-    readV2Files = [os.path.join(dirData, "Current", "ReadV2Data.gz"), os.path.join(dirData, "Previous", "ReadV2Data.gz")]
-    ontology_parsing.main(dirNeo4jData, readV2Files)
+    ontology_parsing.main(dirNeo4jData, readV2Files, external=external, processes=processes, dirSnapshots=dirSnapshots,
+                          ctv3Files=releaseFiles.get("CTV3"), dirSNOMEDCTData=dirSNOMEDCTData)
 
     # Update the database.
-    update_database.main(dirNeo4jData, databaseURI, databaseUsername, databasePassword)
+    update_database.main(dirNeo4jData, databaseURI, databaseUsername, databasePassword,
+                         formatsSupported=list(releaseIDs), releaseIDs=releaseIDs)
+
+    # Now that the database holds the current releases, let the index backend serve them too.
+    _install_indices(indexFiles)
+
+    # Remove the snapshots of releases that are no longer in use.
+    snapshots.prune(dirSnapshots, releaseFiles)
+
+
+def _install_indices(indexFiles):
+    """Move the newly written index files into place, replacing those of the previous releases.
+
+    :param indexFiles:  The locations of the index files, keyed by concept format. Each file is waiting to be moved
+                            into place at its location with _PENDING_SUFFIX appended.
+    :type indexFiles:   dict
+
+    """
+
+    for i in indexFiles.values():
+        os.replace(i + _PENDING_SUFFIX, i)
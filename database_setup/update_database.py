@@ -1,14 +1,22 @@
 """Update a Neo4j database of concepts."""
 
 # Python imports.
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import json
 import os
+import time
 
 # 3rd party imports.
 import neo4j.v1 as neo
 
+# User imports.
+from . import snapshots
+from webapp.utilities import hierarchy_numbering
+
 
 def main(dirNeo4jData, databaseURI, databaseUsername, databasePassword, formatsSupported=("ReadV2",),
-         transactionSize=500, delimiter='\t'):
+         chunkSize=5000, delimiter='\t', releaseIDs=None, concurrency=3):
     """
 
     :param dirNeo4jData:        The directory containing the files of the formatted data to be loaded into Neo4j.
@@ -21,10 +29,19 @@ def main(dirNeo4jData, databaseURI, databaseUsername, databasePassword, formatsS
     :type databasePassword:     str
     :param formatsSupported:    The concept formats (e.g. Read V2) supported by the database.
     :type formatsSupported:     list
-    :param transactionSize:     The number of lines from the files to read before committing a transaction.
-    :type transactionSize:      int
+    :param chunkSize:           The number of lines from the files to send to the database in each transaction.
+    :type chunkSize:            int
     :param delimiter:           The delimiter used to split up the fields on each line of the file.
     :type delimiter:            str
+    :param releaseIDs:          The identifiers of the ontology releases being loaded, keyed by concept format.
+    :type releaseIDs:           dict
+    :param concurrency:         The maximum number of files to load at the same time.
+    :type concurrency:          int
+
+    The progress of the load is checkpointed in the database (as LoadCheckpoint nodes) in the same transaction as each
+    chunk of data, so if the load is interrupted, rerunning it for the same releases carries on from where it stopped.
+    The data files must not change between the interrupted load and the rerun, which is checked using the hash of
+    their contents.
 
     """
 
@@ -34,313 +51,395 @@ def main(dirNeo4jData, databaseURI, databaseUsername, databasePassword, formatsS
     # Create constraints and indices as a single transaction.
     session = driver.session()
     constraintTransaction = session.begin_transaction()
+    for i in constraint_statements(formatsSupported):
+        constraintTransaction.run(i)
+    constraintTransaction.commit()
+    session.close()
+
+    # Find where any interrupted load of the same releases got to. Checkpoints left by the load of different releases
+    # can't be resumed from.
+    releaseKey = json.dumps(releaseIDs or {}, sort_keys=True)
+    session = driver.session()
+    checkpoints = {}
+    for i in session.run(_CHECKPOINT_READ_QUERY):
+        if i["release"] == releaseKey:
+            checkpoints[i["file"]] = {j: i[j] for j in ["chunk", "complete", "hash", "offset"]}
+        else:
+            print("Discarding the checkpoint of an interrupted load of {0:s} for different releases.".format(i["file"]))
+    session.close()
+
+    # Update the words, terms, concepts and relationships in the database. The removals for each type of entity are
+    # performed before the updates and additions, and the relationships are updated once all the nodes are in place.
+    phases = {i[0]: i for i in _PHASES}
+    run_phases(
+        {i: phases[i][3] for i in phases},
+        lambda fileName: load_file(driver, os.path.join(dirNeo4jData, fileName), phases[fileName][1],
+                                   phases[fileName][2], chunkSize, delimiter, releaseKey, checkpoints.get(fileName)),
+        concurrency)
+
+    # Number the concepts of numbered hierarchies that were loaded before the hierarchies were numbered. A load only
+    # touches the concepts that changed between the releases, so the unchanged concepts would otherwise stay unnumbered.
+    for i in formatsSupported:
+        if i in hierarchy_numbering.NUMBERED_CODE_FORMATS:
+            number_concepts(driver, i, chunkSize)
+
+    #-------------------------------------#
+    # Record the Releases in the Database #
+    #-------------------------------------#
+    # Record the release loaded for each concept format, so that search results cached for a previous release are no
+    # longer used. The load is now complete, so the checkpoints are removed at the same time.
+    session = driver.session()
+    releaseTransaction = session.begin_transaction()
+    for i in (releaseIDs or {}):
+        releaseTransaction.run("MERGE (r:Release {format: {format}}) SET r.id = {id}",
+                               {"format": i, "id": releaseIDs[i]})
+    releaseTransaction.run("MATCH (c:LoadCheckpoint) DELETE c")
+    releaseTransaction.commit()
+    session.close()
+
+
+def constraint_statements(formatsSupported=("ReadV2",)):
+    """Get the statements that create the constraints (and thereby the indices) needed by the database.
+
+    :param formatsSupported:    The concept formats (e.g. Read V2) supported by the database.
+    :type formatsSupported:     list
+    :return:                    The Cypher statements creating the constraints.
+    :rtype:                     list
+
+    """
 
     # Ensure each word is unique (and set up the index as a side effect).
-    constraintTransaction.run("CREATE CONSTRAINT ON (word:Word) ASSERT word.word IS UNIQUE")
+    statements = ["CREATE CONSTRAINT ON (word:Word) ASSERT word.word IS UNIQUE"]
 
-    # For each concept hierarchy, ensure that all concepts and terms within it are unique (thereby indexing them).
-    # Also add an index on the stale attribute
+    # For each concept hierarchy, ensure that all concepts and terms within it are unique (thereby indexing them). The
+    # concepts of numbered hierarchies are also indexed by their numbers, so that the descendants of a concept can be
+    # found with a range lookup.
     for i in formatsSupported:
-        constraintTransaction.run("CREATE CONSTRAINT ON (concept:{0:s}_Concept) ASSERT concept.id IS UNIQUE".format(i))
-        constraintTransaction.run("CREATE CONSTRAINT ON (concept:{0:s}_Term) ASSERT concept.id IS UNIQUE".format(i))
-    constraintTransaction.commit()
+        statements.append("CREATE CONSTRAINT ON (concept:{0:s}_Concept) ASSERT concept.id IS UNIQUE".format(i))
+        statements.append("CREATE CONSTRAINT ON (concept:{0:s}_Term) ASSERT concept.id IS UNIQUE".format(i))
+        if i in hierarchy_numbering.NUMBERED_CODE_FORMATS:
+            statements.append("CREATE INDEX ON :{0:s}_Concept(left)".format(i))
+    return statements
+
+
+def load_file(driver, fileData, rowParser, query, chunkSize=5000, delimiter='\t', releaseKey=None, checkpoint=None):
+    """Stream a file of formatted data into the database in chunks.
+
+    Each chunk of lines is sent as a single transaction, with all the rows in the chunk that share the same labels
+    being sent as one list parameter to a single UNWIND statement. When a release key is supplied, a checkpoint of
+    the position reached in the file is written in the same transaction as each chunk.
+
+    :param driver:      The driver for the database.
+    :type driver:       neo4j.v1.Driver
+    :param fileData:    The location of the file to load. The first line of the file is expected to be a header.
+    :type fileData:     str
+    :param rowParser:   Function that converts the fields on a line into a tuple of the labels to format into the query
+                            and a dictionary of the parameters for the row.
+    :type rowParser:    function
+    :param query:       The query to run on each group of rows. The rows are supplied in a parameter called rows, and
+                            the labels returned by rowParser are formatted into the query.
+    :type query:        str
+    :param chunkSize:   The number of lines to send to the database in each transaction.
+    :type chunkSize:    int
+    :param delimiter:   The delimiter used to split up the fields on each line of the file.
+    :type delimiter:    str
+    :param releaseKey:  The key identifying the releases being loaded. Checkpoints are only written when this is given.
+    :type releaseKey:   str
+    :param checkpoint:  The checkpoint to resume the load of the file from. This records the byte offset and number of
+                            the chunk that the load had reached, the hash of the file's contents and whether the file
+                            is complete.
+    :type checkpoint:   dict
+    :return:            The number of rows loaded.
+    :rtype:             int
+
+    """
+
+    fileName = os.path.basename(fileData)
+    fileHash = snapshots.file_hash(fileData) if releaseKey or checkpoint else None
+    offset = 0  # The byte offset in the file of the end of the last chunk written.
+    chunkNumber = 0  # The number of chunks written.
+    if checkpoint:
+        if checkpoint["hash"] != fileHash:
+            raise ValueError("{0:s} has changed since the interrupted load was checkpointed.".format(fileName))
+        elif checkpoint["complete"]:
+            print("{0:s}: already loaded".format(fileName))
+            return 0
+        offset = checkpoint["offset"]
+        chunkNumber = checkpoint["chunk"]
+        print("{0:s}: resuming from chunk {1:d}".format(fileName, chunkNumber))
+
+    startTime = time.time()
+    numRows = 0
+    with open(fileData, 'rb') as fidData:
+        # Strip off the header, or skip to the end of the last chunk written.
+        header = fidData.readline()
+        if offset:
+            fidData.seek(offset)
+        else:
+            offset = len(header)
+
+        chunk = defaultdict(list)  # The rows of the current chunk grouped by their labels.
+        chunkRows = 0  # The number of rows in the current chunk.
+        for line in fidData:
+            offset += len(line)
+            line = line.decode("utf-8").rstrip('\n')
+            if not line:
+                continue
+            labels, row = rowParser(line.split(delimiter))
+            chunk[labels].append(row)
+            chunkRows += 1
+
+            # Determine if the chunk needs sending.
+            if chunkRows == chunkSize:
+                chunkNumber += 1
+                _write_chunk(driver, chunk, query, releaseKey and {
+                    "chunk": chunkNumber, "complete": False, "file": fileName, "hash": fileHash, "offset": offset,
+                    "release": releaseKey})
+                numRows += chunkRows
+                chunk = defaultdict(list)
+                chunkRows = 0
+
+        # Send the final chunk (possibly empty), marking the file as complete.
+        chunkNumber += 1
+        _write_chunk(driver, chunk, query, releaseKey and {
+            "chunk": chunkNumber, "complete": True, "file": fileName, "hash": fileHash, "offset": offset,
+            "release": releaseKey})
+        numRows += chunkRows
+
+    # Report the throughput.
+    timeTaken = time.time() - startTime
+    print("{0:s}: {1:d} rows loaded in {2:.1f}s ({3:.0f} rows/s)".format(
+        fileName, numRows, timeTaken, numRows / timeTaken if timeTaken else 0))
+    return numRows
+
+
+def number_concepts(driver, codeFormat, chunkSize=5000):
+    """Give the concepts of a numbered hierarchy that have no numbers in the database their numbers.
+
+    :param driver:      The driver for the database.
+    :type driver:       neo4j.v1.Driver
+    :param codeFormat:  The code format of the hierarchy. This must be one of hierarchy_numbering.NUMBERED_CODE_FORMATS.
+    :type codeFormat:   str
+    :param chunkSize:   The number of concepts to number in each transaction.
+    :type chunkSize:    int
+    :return:            The number of concepts numbered.
+    :rtype:             int
+
+    """
+
+    # Find the concepts without numbers.
+    label = "{0:s}_Concept".format(codeFormat)
+    session = driver.session()
+    conceptIDs = [i["id"] for i in session.run("MATCH (c:{0:s}) WHERE NOT exists(c.left) RETURN c.id AS id"
+                                                .format(label))]
     session.close()
 
-    #----------------------------------#
-    # Update the Words in the Database #
-    #----------------------------------#
-    # Remove words that are no longer needed.
-    transactionLines = 0  # Record of the number of lines used to construct the current transaction.
-    with open(os.path.join(dirNeo4jData, "Words_Remove.tsv"), 'r') as fidWordsRemove:
-        _ = fidWordsRemove.readline()  # Strip off the header.
-        session = driver.session()
-        wordTransaction = session.begin_transaction()  # Start the first transaction.
-        for line in fidWordsRemove:
-            word, label = (line.strip()).split(delimiter)
-            wordTransaction.run("MATCH (w:Word {word: {word}}) DETACH DELETE w", {"word": word})
-            transactionLines += 1
-
-            # Determine if a new transaction needs creating.
-            if transactionLines == transactionSize:
-                wordTransaction.commit()
-                # Transactions only execute when closing the session, so close and open a new one to prevent a loooong
-                # hang at the end of the word adding.
-                session.close()
-                session = driver.session()
-                wordTransaction = session.begin_transaction()  # Start the next transaction.
-                transactionLines = 0
-        wordTransaction.commit()  # Commit the final transaction.
-        session.close()
-
-    # Add new words.
-    transactionLines = 0  # Record of the number of lines used to construct the current transaction.
-    with open(os.path.join(dirNeo4jData, "Words_Add.tsv"), 'r') as fidWordsAdd:
-        _ = fidWordsAdd.readline()  # Strip off the header.
-        session = driver.session()
-        wordTransaction = session.begin_transaction()  # Start the first transaction.
-        for line in fidWordsAdd:
-            word, label = (line.strip()).split(delimiter)
-            wordTransaction.run("CREATE (w:Word {word: {word}})", {"word": word})
-            transactionLines += 1
-
-            # Determine if a new transaction needs creating.
-            if transactionLines == transactionSize:
-                wordTransaction.commit()
-                # Transactions only execute when closing the session, so close and open a new one to prevent a loooong
-                # hang at the end of the word adding.
-                session.close()
-                session = driver.session()
-                wordTransaction = session.begin_transaction()  # Start the next transaction.
-                transactionLines = 0
-        wordTransaction.commit()  # Commit the final transaction.
-        session.close()
-
-    #----------------------------------#
-    # Update the Terms in the Database #
-    #----------------------------------#
-    # Remove terms that are no longer needed.
-    transactionLines = 0  # Record of the number of lines used to construct the current transaction.
-    with open(os.path.join(dirNeo4jData, "Terms_Remove.tsv"), 'r') as fidTermsRemove:
-        _ = fidTermsRemove.readline()  # Strip off the header.
-        session = driver.session()
-        termTransaction = session.begin_transaction()  # Start the first transaction.
-        for line in fidTermsRemove:
-            term, current, prettyDescription, searchableDescription, label = (line.strip()).split(delimiter)
-            query = ("MATCH (t:{0:s} {{id: {{id}}}}) DETACH DELETE t".format(label))
-            termTransaction.run(query, {"id": term})
-            transactionLines += 1
-
-            # Determine if a new transaction needs creating.
-            if transactionLines == transactionSize:
-                termTransaction.commit()
-                # Transactions only execute when closing the session, so close and open a new one to prevent a loooong
-                # hang at the end of the word adding.
-                session.close()
-                session = driver.session()
-                termTransaction = session.begin_transaction()  # Start the next transaction.
-                transactionLines = 0
-        termTransaction.commit()  # Commit the final transaction.
-        session.close()
-
-    # Update existing terms.
-    transactionLines = 0  # Record of the number of lines used to construct the current transaction.
-    with open(os.path.join(dirNeo4jData, "Terms_Update.tsv"), 'r') as fidTermsUpdate:
-        _ = fidTermsUpdate.readline()  # Strip off the header.
-        session = driver.session()
-        termTransaction = session.begin_transaction()  # Start the first transaction.
-        for line in fidTermsUpdate:
-            term, current, prettyDescription, searchableDescription, label = (line.strip()).split(delimiter)
-            query = ("MERGE (t:{0:s} {{id: {{id}}}}) "
-                     "SET t = {{current: {{current}}, pretty: {{pretty}}, searchable: {{searchable}}}})"
-                     .format(label))
-            termTransaction.run(
-                query,
-                {"current": current, "id": term, "pretty": prettyDescription, "searchable": searchableDescription})
-            transactionLines += 1
-
-            # Determine if a new transaction needs creating.
-            if transactionLines == transactionSize:
-                termTransaction.commit()
-                # Transactions only execute when closing the session, so close and open a new one to prevent a loooong
-                # hang at the end of the word adding.
-                session.close()
-                session = driver.session()
-                termTransaction = session.begin_transaction()  # Start the next transaction.
-                transactionLines = 0
-        termTransaction.commit()  # Commit the final transaction.
-        session.close()
-
-    # Add new terms.
-    transactionLines = 0  # Record of the number of lines used to construct the current transaction.
-    with open(os.path.join(dirNeo4jData, "Terms_Add.tsv"), 'r') as fidTermsAdd:
-        _ = fidTermsAdd.readline()  # Strip off the header.
-        session = driver.session()
-        termTransaction = session.begin_transaction()  # Start the first transaction.
-        for line in fidTermsAdd:
-            term, current, prettyDescription, searchableDescription, label = (line.strip()).split(delimiter)
-            query = ("CREATE (t:{0:s} {{current: {{current}}, id: {{id}}, pretty: {{pretty}}, "
-                     "searchable: {{searchable}}}})"
-                     .format(label))
-            termTransaction.run(
-                query,
-                {"current": current, "id": term, "pretty": prettyDescription, "searchable": searchableDescription})
-            transactionLines += 1
-
-            # Determine if a new transaction needs creating.
-            if transactionLines == transactionSize:
-                termTransaction.commit()
-                # Transactions only execute when closing the session, so close and open a new one to prevent a loooong
-                # hang at the end of the word adding.
-                session.close()
-                session = driver.session()
-                termTransaction = session.begin_transaction()  # Start the next transaction.
-                transactionLines = 0
-        termTransaction.commit()  # Commit the final transaction.
-        session.close()
+    # Number them in chunks.
+    rows = []
+    for i in conceptIDs:
+        numbers = hierarchy_numbering.number_code(codeFormat, i)
+        if numbers:
+            rows.append({"id": i, "left": numbers[0], "right": numbers[1]})
+    for i in range(0, len(rows), chunkSize):
+        _write_chunk(driver, {(label,): rows[i:i + chunkSize]},
+                     "UNWIND {{rows}} AS row MATCH (c:{0:s} {{id: row.id}}) SET c.left = row.left, c.right = row.right")
+    if rows:
+        print("{0:s}: {1:d} concepts numbered".format(label, len(rows)))
+    return len(rows)
+
+
+def run_phases(dependencies, runPhase, concurrency=3):
+    """Run a set of phases across a pool of workers, only starting each phase once the phases it depends on are done.
+
+    :param dependencies:    The phases that must be completed before each phase can start, keyed by phase.
+    :type dependencies:     dict
+    :param runPhase:        Function that takes a phase and runs it.
+    :type runPhase:         function
+    :param concurrency:     The maximum number of phases to run at the same time.
+    :type concurrency:      int
 
-    #-------------------------------------#
-    # Update the Concepts in the Database #
-    #-------------------------------------#
-    # Remove concepts that are no longer needed.
-    transactionLines = 0  # Record of the number of lines used to construct the current transaction.
-    with open(os.path.join(dirNeo4jData, "Concepts_Remove.tsv"), 'r') as fidConceptsRemove:
-        _ = fidConceptsRemove.readline()  # Strip off the header.
-        session = driver.session()
-        conceptTransaction = session.begin_transaction()  # Start the first transaction.
-        for line in fidConceptsRemove:
-            concept, current, domain, level, label = (line.strip()).split(delimiter)
-            query = ("MATCH (c:{0:s} {{id: {{id}}}}) DETACH DELETE c".format(label))
-            conceptTransaction.run(query, {"id": concept})
-            transactionLines += 1
-
-            # Determine if a new transaction needs creating.
-            if transactionLines == transactionSize:
-                conceptTransaction.commit()
-                # Transactions only execute when closing the session, so close and open a new one to prevent a loooong
-                # hang at the end of the word adding.
-                session.close()
-                session = driver.session()
-                conceptTransaction = session.begin_transaction()  # Start the next transaction.
-                transactionLines = 0
-        conceptTransaction.commit()  # Commit the final transaction.
-        session.close()
-
-    # Update existing concepts.
-    transactionLines = 0  # Record of the number of lines used to construct the current transaction.
-    with open(os.path.join(dirNeo4jData, "Concepts_Update.tsv"), 'r') as fidConceptsUpdate:
-        _ = fidConceptsUpdate.readline()  # Strip off the header.
-        session = driver.session()
-        conceptTransaction = session.begin_transaction()  # Start the first transaction.
-        for line in fidConceptsUpdate:
-            concept, current, domain, level, label = (line.strip()).split(delimiter)
-            query = ("MERGE (c:{0:s} {{id: {{id}}}}) "
-                     "SET t = {{current: {{current}}, domain: {{domain}}, level: toInt({{level}})}})"
-                     .format(label))
-            conceptTransaction.run(
-                query,
-                {"current": current, "domain": domain, "id": concept, "level": level})
-            transactionLines += 1
-
-            # Determine if a new transaction needs creating.
-            if transactionLines == transactionSize:
-                conceptTransaction.commit()
-                # Transactions only execute when closing the session, so close and open a new one to prevent a loooong
-                # hang at the end of the word adding.
-                session.close()
-                session = driver.session()
-                conceptTransaction = session.begin_transaction()  # Start the next transaction.
-                transactionLines = 0
-        conceptTransaction.commit()  # Commit the final transaction.
-        session.close()
-
-    # Add new concepts.
-    transactionLines = 0  # Record of the number of lines used to construct the current transaction.
-    with open(os.path.join(dirNeo4jData, "Concepts_Add.tsv"), 'r') as fidConceptsAdd:
-        _ = fidConceptsAdd.readline()  # Strip off the header.
-        session = driver.session()
-        conceptTransaction = session.begin_transaction()  # Start the first transaction.
-        for line in fidConceptsAdd:
-            concept, current, domain, level, label = (line.strip()).split(delimiter)
-            query = ("CREATE (c:{0:s} {{current: {{current}}, domain: {{domain}}, id: {{id}}, level: {{level}}}})"
-                     .format(label))
-            conceptTransaction.run(
-                query,
-                {"current": current, "domain": domain, "id": concept, "level": level})
-            transactionLines += 1
-
-            # Determine if a new transaction needs creating.
-            if transactionLines == transactionSize:
-                conceptTransaction.commit()
-                # Transactions only execute when closing the session, so close and open a new one to prevent a loooong
-                # hang at the end of the word adding.
-                session.close()
-                session = driver.session()
-                conceptTransaction = session.begin_transaction()  # Start the next transaction.
-                transactionLines = 0
-        conceptTransaction.commit()  # Commit the final transaction.
-        session.close()
-
-
-
-
-
-    #------------------------------------------#
-    # Update the Relationships in the Database #
-    #------------------------------------------#
-    # Remove relationships that are no longer needed.
-    transactionLines = 0  # Record of the number of lines used to construct the current transaction.
-    with open(os.path.join(dirNeo4jData, "Relationships_Remove.tsv"), 'r') as fidRelationshipsRemove:
-        _ = fidRelationshipsRemove.readline()  # Strip off the header.
-        session = driver.session()
-        relationshipTransaction = session.begin_transaction()  # Start the first transaction.
-        for line in fidRelationshipsRemove:
-            source, sourceLabel, target, targetLabel, relType, isPrimary, relLabels = (line.strip()).split(delimiter)
-            query = "MATCH (s:{0:s} {{id: {{source}}}}) -[r:{1:s}]-> (t:{2:s} {{id: {{target}}}}) DELETE r".format(
-                sourceLabel, relLabels, targetLabel)
-            relationshipTransaction.run(query, {"source": source, "target": target})
-            transactionLines += 1
-
-            # Determine if a new transaction needs creating.
-            if transactionLines == transactionSize:
-                relationshipTransaction.commit()
-                # Transactions only execute when closing the session, so close and open a new one to prevent a loooong
-                # hang at the end of the word adding.
-                session.close()
-                session = driver.session()
-                relationshipTransaction = session.begin_transaction()  # Start the next transaction.
-                transactionLines = 0
-        relationshipTransaction.commit()  # Commit the final transaction.
-        session.close()
-
-    # Update existing relationships.
-    transactionLines = 0  # Record of the number of lines used to construct the current transaction.
-    with open(os.path.join(dirNeo4jData, "Relationships_Update.tsv"), 'r') as fidRelationshipsUpdate:
-        _ = fidRelationshipsUpdate.readline()  # Strip off the header.
-        session = driver.session()
-        relationshipTransaction = session.begin_transaction()  # Start the first transaction.
-        for line in fidRelationshipsUpdate:
-            source, sourceLabel, target, targetLabel, relType, relLabels = (line.strip()).split(delimiter)
-            query = ("MERGE (s:{0:s} {{id: {{source}}}}) -[r:{1:s}]-> (t:{2:s} {{id: {{target}}}} "
-                     "SET r = {{type: {{type}}}}"
-                     .format(sourceLabel, relLabels, targetLabel))
-            relationshipTransaction.run(query, {"source": source, "target": target, "type": relType})
-            transactionLines += 1
-
-            # Determine if a new transaction needs creating.
-            if transactionLines == transactionSize:
-                relationshipTransaction.commit()
-                # Transactions only execute when closing the session, so close and open a new one to prevent a loooong
-                # hang at the end of the word adding.
-                session.close()
-                session = driver.session()
-                relationshipTransaction = session.begin_transaction()  # Start the next transaction.
-                transactionLines = 0
-        relationshipTransaction.commit()  # Commit the final transaction.
-        session.close()
-
-    # Add new relationships.
-    transactionLines = 0  # Record of the number of lines used to construct the current transaction.
-    with open(os.path.join(dirNeo4jData, "Relationships_Add.tsv"), 'r') as fidRelationshipsAdd:
-        _ = fidRelationshipsAdd.readline()  # Strip off the header.
-        session = driver.session()
-        relationshipTransaction = session.begin_transaction()  # Start the first transaction.
-        for line in fidRelationshipsAdd:
-            source, sourceLabel, target, targetLabel, relType, relLabels = (line.strip()).split(delimiter)
-            query = ("MATCH (s:{0:s} {{id: {{source}}}}) "
-                     "MATCH (t:{1:s} {{{2:s}: {{target}}}}) "
-                     "CREATE (s) -[r:{3:s} {{type: {{type}}}}]-> (t)"
-                     .format(sourceLabel, targetLabel, "word" if targetLabel == "Word" else "id", relLabels))
-            relationshipTransaction.run(query, {"source": source, "target": target, "type": relType})
-            transactionLines += 1
-
-            # Determine if a new transaction needs creating.
-            if transactionLines == transactionSize:
-                relationshipTransaction.commit()
-                # Transactions only execute when closing the session, so close and open a new one to prevent a loooong
-                # hang at the end of the word adding.
-                session.close()
-                session = driver.session()
-                relationshipTransaction = session.begin_transaction()  # Start the next transaction.
-                transactionLines = 0
-        relationshipTransaction.commit()  # Commit the final transaction.
-        session.close()
+    """
+
+    pending = {i: set(dependencies[i]) for i in dependencies}  # The phases yet to be started.
+    completed = set()  # The phases that have finished.
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        running = {}  # The phases that have been started, keyed by their future.
+        while pending or running:
+            # Start every phase whose dependencies are complete.
+            for i in [j for j in pending if pending[j] <= completed]:
+                running[executor.submit(runPhase, i)] = i
+                del pending[i]
+            if not running:
+                raise ValueError("The dependencies of phases {0:s} can not be satisfied.".format(", ".join(pending)))
+
+            # Wait for a phase to finish. Any error it raised is re-raised here, which stops any more phases starting.
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for i in finished:
+                i.result()
+                completed.add(running.pop(i))
+
+
+def _write_chunk(driver, chunk, query, checkpoint=None):
+    """Write a chunk of rows to the database as a single transaction.
+
+    :param driver:      The driver for the database.
+    :type driver:       neo4j.v1.Driver
+    :param chunk:       The rows to write, grouped by the labels to format into the query.
+    :type chunk:        dict
+    :param query:       The query to run on each group of rows.
+    :type query:        str
+    :param checkpoint:  The checkpoint to record in the same transaction as the rows, if any.
+    :type checkpoint:   dict
+
+    """
+
+    if not chunk and not checkpoint:
+        return
+    session = driver.session()
+    transaction = session.begin_transaction()
+    for labels, rows in chunk.items():
+        transaction.run(query.format(*labels), {"rows": rows})
+    if checkpoint:
+        transaction.run(_CHECKPOINT_WRITE_QUERY, checkpoint)
+    transaction.commit()
+    # Transactions only execute when closing the session, so close it now to prevent a loooong hang at the end.
+    session.close()
+
+
+def _parse_concept(fields):
+    """Extract the parameters of a concept from the fields of a line of a Concepts file.
+
+    Empty fields are passed as nulls, so that updating a concept leaves the values of its unknown attributes (e.g. the
+    levels of SNOMED CT concepts loaded from a Delta release) as they are.
+
+    :param fields:  The fields of the line (ID, Current, Domain, Level, Left, Right and Labels).
+    :type fields:   list
+    :return:        The labels of the concept and its parameters.
+    :rtype:         tuple, dict
+
+    """
+
+    return (fields[-1],), {
+        "current": fields[1] or None, "domain": fields[2] or None, "id": fields[0], "level": fields[3] or None,
+        "left": fields[4] or None, "right": fields[5] or None
+    }
+
+
+def _parse_relationship(fields):
+    """Extract the parameters of a relationship from the fields of a line of a Relationships file.
+
+    :param fields:  The fields of the line (Node_1, Node_1_Label, Node_2, Node_2_Label, Type and Relationship_Labels).
+    :type fields:   list
+    :return:        The labels of the source node, relationship and target node, along with the property used to
+                        identify the target node, and the parameters of the relationship.
+    :rtype:         tuple, dict
+
+    """
+
+    source, sourceLabel, target, targetLabel, relType, relLabel = fields
+    labels = (sourceLabel, relLabel, targetLabel, "word" if targetLabel == "Word" else "id")
+    return labels, {"source": source, "target": target, "type": relType}
+
+
+def _parse_term(fields):
+    """Extract the parameters of a term from the fields of a line of a Terms file.
+
+    :param fields:  The fields of the line (ID, Current, Pretty, Searchable and Labels).
+    :type fields:   list
+    :return:        The labels of the term and its parameters.
+    :rtype:         tuple, dict
+
+    """
+
+    return (fields[-1],), {"current": fields[1], "id": fields[0], "pretty": fields[2], "searchable": fields[3]}
+
+
+def _parse_word(fields):
+    """Extract the parameters of a word from the fields of a line of a Words file.
+
+    :param fields:  The fields of the line (Word and Labels).
+    :type fields:   list
+    :return:        The labels of the word (none are needed, as all words share the Word label) and its parameters.
+    :rtype:         tuple, dict
+
+    """
+
+    return (), {"word": fields[0]}
+
+
+# Queries to read and write the checkpoints of the progress made loading each file.
+_CHECKPOINT_READ_QUERY = ("MATCH (c:LoadCheckpoint) "
+                          "RETURN c.file AS file, c.release AS release, c.chunk AS chunk, c.complete AS complete, "
+                          "c.hash AS hash, c.offset AS offset")
+_CHECKPOINT_WRITE_QUERY = ("MERGE (c:LoadCheckpoint {file: {file}}) "
+                           "SET c.release = {release}, c.chunk = {chunk}, c.complete = {complete}, "
+                           "c.hash = {hash}, c.offset = {offset}")
+
+# The files holding the node removals, in the order they are loaded. Deleting a node deletes its relationships too, and
+# the nodes of different types share relationships (concepts to terms and terms to words), so concurrent removals would
+# lock the same relationships and nodes in different orders and could deadlock.
+_REMOVAL_PHASES = ("Concepts_Remove.tsv", "Terms_Remove.tsv", "Words_Remove.tsv")
+
+# The files holding the node updates. All of these must be loaded before the relationships can be updated.
+_NODE_PHASES = ("Words_Remove.tsv", "Words_Add.tsv", "Terms_Remove.tsv", "Terms_Update.tsv", "Terms_Add.tsv",
+                "Concepts_Remove.tsv", "Concepts_Update.tsv", "Concepts_Add.tsv")
+
+# The files to load, along with the function used to parse each line, the query used to write the rows to the database
+# and the files that must be loaded before the file can be. The removals are loaded one after another (see
+# _REMOVAL_PHASES). The additions and updates of nodes don't touch any relationships, so once all the removals are done
+# the files for each type of node can be loaded at the same time as those of the other types. The relationship files
+# are loaded one after another, as concurrent transactions creating relationships on the same nodes can deadlock.
+_PHASES = [
+    # Words. Added words are merged, as the words of SNOMED CT changes may already be in the database.
+    ("Words_Remove.tsv", _parse_word,
+     "UNWIND {{rows}} AS row MATCH (w:Word {{word: row.word}}) DETACH DELETE w",
+     ("Concepts_Remove.tsv", "Terms_Remove.tsv")),
+    ("Words_Add.tsv", _parse_word,
+     "UNWIND {{rows}} AS row MERGE (w:Word {{word: row.word}})",
+     _REMOVAL_PHASES),
+
+    # Terms.
+    ("Terms_Remove.tsv", _parse_term,
+     "UNWIND {{rows}} AS row MATCH (t:{0:s} {{id: row.id}}) DETACH DELETE t",
+     ("Concepts_Remove.tsv",)),
+    ("Terms_Update.tsv", _parse_term,
+     "UNWIND {{rows}} AS row MERGE (t:{0:s} {{id: row.id}}) "
+     "SET t.current = row.current, t.pretty = row.pretty, t.searchable = row.searchable",
+     _REMOVAL_PHASES),
+    ("Terms_Add.tsv", _parse_term,
+     "UNWIND {{rows}} AS row "
+     "CREATE (t:{0:s} {{current: row.current, id: row.id, pretty: row.pretty, searchable: row.searchable}})",
+     _REMOVAL_PHASES),
+
+    # Concepts.
+    ("Concepts_Remove.tsv", _parse_concept,
+     "UNWIND {{rows}} AS row MATCH (c:{0:s} {{id: row.id}}) DETACH DELETE c",
+     ()),
+    ("Concepts_Update.tsv", _parse_concept,
+     "UNWIND {{rows}} AS row MERGE (c:{0:s} {{id: row.id}}) "
+     "SET c.current = coalesce(row.current, c.current), c.domain = coalesce(row.domain, c.domain), "
+     "c.level = coalesce(toInt(row.level), c.level), c.left = coalesce(toInt(row.left), c.left), "
+     "c.right = coalesce(toInt(row.right), c.right)",
+     _REMOVAL_PHASES),
+    ("Concepts_Add.tsv", _parse_concept,
+     "UNWIND {{rows}} AS row "
+     "CREATE (c:{0:s} {{current: row.current, domain: row.domain, id: row.id, level: toInt(row.level), "
+     "left: toInt(row.left), right: toInt(row.right)}})",
+     _REMOVAL_PHASES),
+
+    # Relationships.
+    ("Relationships_Remove.tsv", _parse_relationship,
+     "UNWIND {{rows}} AS row "
+     "MATCH (s:{0:s} {{id: row.source}}) -[r:{1:s}]-> (t:{2:s} {{{3:s}: row.target}}) DELETE r",
+     _NODE_PHASES),
+    ("Relationships_Update.tsv", _parse_relationship,
+     "UNWIND {{rows}} AS row "
+     "MATCH (s:{0:s} {{id: row.source}}) MATCH (t:{2:s} {{{3:s}: row.target}}) "
+     "MERGE (s) -[r:{1:s}]-> (t) SET r.type = row.type",
+     _NODE_PHASES + ("Relationships_Remove.tsv",)),
+    ("Relationships_Add.tsv", _parse_relationship,
+     "UNWIND {{rows}} AS row "
+     "MATCH (s:{0:s} {{id: row.source}}) MATCH (t:{2:s} {{{3:s}: row.target}}) "
+     "CREATE (s) -[r:{1:s} {{type: row.type}}]-> (t)",
+     _NODE_PHASES + ("Relationships_Remove.tsv", "Relationships_Update.tsv"))
+]
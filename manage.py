@@ -6,6 +6,7 @@ from flask_script import Manager
 # User imports.
 import database_setup.update_controller
 from webapp import app
+from webapp.utilities import result_cache
 
 
 # Setup the manager.
@@ -19,8 +20,14 @@ def run_dev():
 
 
 @manager.command
-def setup_database():
-    """Update the contents of the Neo4j database backing the app."""
+def setup_database(initial=False, external=False, processes=1):
+    """Update the contents of the Neo4j database backing the app.
+
+    Pass --initial when loading an empty database to generate the files for the Neo4j offline importer instead, and
+    --external to find the changes between large releases by sorting them on disk rather than in memory (the search
+    indices are not rebuilt with --external). The data files are parsed by the number of processes given by --processes.
+
+    """
 
     # Determine the information needed to access the database.
     databaseURI = app.config["DATABASE_URI"]
@@ -28,7 +35,13 @@ def setup_database():
     databaseUsername = app.config["DATABASE_USERNAME"]
 
     # Perform the update.
-    database_setup.update_controller.main(databaseURI, databaseUsername, databasePassword)
+    database_setup.update_controller.main(databaseURI, databaseUsername, databasePassword, initial=initial,
+                                          external=external, processes=int(processes))
+
+    # Discard the cached search results. Results are keyed by the release they came from (and aren't cached for
+    # formats without a recorded release), so a process-local cache will stop using its stale results anyway, but a
+    # shared cache can be emptied straight away.
+    result_cache.get_cache().clear()
 
 if __name__ == "__main__":
     manager.run()
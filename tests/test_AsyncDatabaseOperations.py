@@ -0,0 +1,184 @@
+"""Tests for running the queries of DatabaseOperations concurrently."""
+
+# Python imports.
+import asyncio
+from contextlib import contextmanager
+import threading
+import time
+
+# 3rd party imports.
+import pytest
+
+# User imports.
+from webapp.mod_concept_discovery.AsyncDatabaseOperations import AsyncDatabaseOperations
+from webapp.mod_concept_discovery import DatabaseOperations as DatabaseOperations_module
+from webapp.mod_concept_discovery.DatabaseOperations import DatabaseOperations
+from webapp.utilities import connection_pool
+from webapp.utilities import result_cache
+
+
+def _recording_searches(numberOfSearches, started, firstSearch=None):
+    """Create searches that record that they have started.
+
+    :param numberOfSearches:    The number of searches to create.
+    :type numberOfSearches:     int
+    :param started:             The list that the index of each search is appended to when it starts.
+    :type started:              list
+    :param firstSearch:         Function run by the first search once it has started.
+    :type firstSearch:          function
+    :return:                    The searches.
+    :rtype:                     list
+
+    """
+
+    def search(index):
+        started.append(index)
+        if index == 0 and firstSearch:
+            firstSearch()
+        return index
+
+    return [lambda index=i: search(index) for i in range(numberOfSearches)]
+
+
+def test_worker_threads_are_sized_from_the_pool_size(monkeypatch):
+    """The worker threads are created once per process, with one thread per pooled session."""
+
+    monkeypatch.setattr(connection_pool, "_executor", None)
+    monkeypatch.setattr(connection_pool, "_poolSize", connection_pool._poolSize)
+    connection_pool.configure(3)
+    executor = connection_pool.get_executor()
+    try:
+        assert executor._max_workers == 3
+        assert connection_pool.get_executor() is executor
+    finally:
+        executor.shutdown()
+
+
+def test_closing_the_drivers_closes_their_pooled_connections(monkeypatch):
+    """The connections of the sessions pooled by each driver are closed, even when some of them are already broken."""
+
+    closed = []
+
+    class Connection(object):
+        def __init__(self, isBroken):
+            self.isBroken = isBroken
+
+        def close(self):
+            closed.append(self)
+            if self.isBroken:
+                raise OSError("Bad file descriptor")
+
+    class Session(object):
+        def __init__(self, isBroken):
+            self.connection = Connection(isBroken)
+
+    monkeypatch.setattr(connection_pool, "_drivers", {})
+    driver = connection_pool.get_driver("bolt://localhost", "neo4j", "neo4j")
+    driver.session_pool.extend([Session(True), Session(False)])
+    connection_pool.close_all()
+    assert len(closed) == 2
+    assert not driver.session_pool
+    assert connection_pool._drivers == {}
+
+
+def test_descriptions_are_fetched_on_the_shared_worker_threads(monkeypatch):
+    """The chunks of descriptions are fetched by the worker threads shared with the concurrent searches."""
+
+    sharedExecutor = connection_pool.get_executor()
+    submitted = []
+
+    class Executor(object):
+        def submit(self, function):
+            submitted.append(function)
+            return sharedExecutor.submit(function)
+
+    operations = DatabaseOperations("bolt://localhost", "neo4j", "neo4j")
+    monkeypatch.setattr(connection_pool, "get_executor", Executor)
+    monkeypatch.setattr(operations, "_description_searches", lambda codes, codeFormats, chunkSize: (
+        lambda code=i: [(code, "ReadV2", code.lower())] for i in codes
+    ))
+
+    descriptions = sorted(operations.iter_descriptions(["A", "B", "C", "D"], ["ReadV2"], 1, 2))
+    assert descriptions == [("A", "ReadV2", "a"), ("B", "ReadV2", "b"), ("C", "ReadV2", "c"), ("D", "ReadV2", "d")]
+    assert len(submitted) == 4
+
+
+def test_failed_search_stops_the_waiting_searches():
+    """A failing search fails the whole set, and the searches still waiting for room to run are not started."""
+
+    started = []
+
+    def fail():
+        raise RuntimeError("Search failed.")
+
+    loop = asyncio.new_event_loop()
+    try:
+        operations = AsyncDatabaseOperations("bolt://localhost", "neo4j", "neo4j", 1, loop)
+        searches = _recording_searches(20, started, fail)
+        with pytest.raises(RuntimeError):
+            loop.run_until_complete(operations._run_concurrently(searches, list))
+
+        # Give any searches that were wrongly left waiting the chance to start.
+        loop.run_until_complete(asyncio.sleep(0.1, loop=loop))
+        assert started[0] == 0 and len(started) <= 2
+    finally:
+        loop.close()
+
+
+def test_cancelled_caller_stops_the_waiting_searches():
+    """Cancelling the caller cancels the searches still waiting for room to run."""
+
+    started = []
+    firstSearchRunning = threading.Event()
+    releaseFirstSearch = threading.Event()
+
+    def block():
+        firstSearchRunning.set()
+        releaseFirstSearch.wait(5)
+
+    loop = asyncio.new_event_loop()
+    try:
+        operations = AsyncDatabaseOperations("bolt://localhost", "neo4j", "neo4j", 1, loop)
+        caller = asyncio.ensure_future(operations._run_concurrently(_recording_searches(20, started, block), list),
+                                       loop=loop)
+        while not firstSearchRunning.is_set():
+            loop.run_until_complete(asyncio.sleep(0.01, loop=loop))
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            loop.run_until_complete(caller)
+
+        # The search already running in a worker thread can't be stopped, but none of the others are started.
+        releaseFirstSearch.set()
+        time.sleep(0.1)
+        loop.run_until_complete(asyncio.sleep(0.1, loop=loop))
+        assert started == [0]
+    finally:
+        releaseFirstSearch.set()
+        loop.close()
+
+
+def test_results_are_not_cached_without_a_recorded_release(monkeypatch):
+    """Searches of a code format with no Release node are always sent to the database rather than being cached."""
+
+    queries = []
+
+    class Session(object):
+        def run(self, query, parameters=None):
+            queries.append(query)
+            if parameters is None:
+                # The query for the releases, of which there are none recorded.
+                return []
+            return [{"index": 0, "codes": ["C10"]}]
+
+    @contextmanager
+    def session(databaseAddress, username, password):
+        yield Session()
+
+    monkeypatch.setattr(connection_pool, "session", session)
+    monkeypatch.setattr(DatabaseOperations_module, "_releaseCheckTime", None)
+    monkeypatch.setattr(result_cache, "_cache", result_cache.LocalBackend())
+    operations = DatabaseOperations("bolt://localhost", "neo4j", "neo4j")
+    for _ in range(2):
+        assert operations._run_batched_query("QUERY", "words", [["diabetes"]], "ReadV2") == [{"C10"}]
+    assert queries.count("QUERY") == 2
+    assert result_cache.get_cache().get_many([result_cache.make_key("words", ["diabetes"], "ReadV2", None)]) == {}
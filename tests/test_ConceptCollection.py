@@ -0,0 +1,94 @@
+"""Tests for the parsing and validation of concept definitions."""
+
+# Python imports.
+import io
+import json
+
+# User imports.
+from webapp.mod_concept_discovery import ConceptCollection
+
+
+def _parse_json(content):
+    """Parse concept definitions from JSON content.
+
+    :param content: The JSON content.
+    :type content:  str
+    :return:        The concepts parsed and the errors found.
+    :rtype:         list, list
+
+    """
+
+    collection = ConceptCollection.ConceptCollection(io.StringIO(content), "json")
+    concepts = list(collection)
+    return concepts, collection.errors
+
+
+def test_JSON_definitions_are_parsed():
+    """Valid concepts are parsed and cleaned, with dictionaries of codes/terms converted to lists of their keys."""
+
+    concepts, errors = _parse_json(json.dumps({
+        "A": {"Positive": {"Codes": ["C10.."], "Terms": {"Diabetes ": 1}}},
+        "B": {"Positive": {"Terms": ["asthma"]}, "Negative": {"Codes": ["H33"]}}
+    }))
+    assert errors == []
+    assert sorted(concepts) == [
+        ("A", {"Positive": {"Codes": ["C10"], "Terms": ["Diabetes"]}, "Negative": {"Codes": [], "Terms": []}}),
+        ("B", {"Positive": {"Codes": [], "Terms": ["asthma"]}, "Negative": {"Codes": ["H33"], "Terms": []}})
+    ]
+
+
+def test_truncated_and_malformed_JSON_is_reported():
+    """JSON content that is cut short or badly formatted is recorded as an error rather than raising."""
+
+    for content in ['{"A": {"Positive": {"Codes": ["C10"', '{"A": {"Positive": {"Codes": [C10]}}}', '{"A" 5}',
+                    '[]', '']:
+        concepts, errors = _parse_json(content)
+        assert concepts == []
+        assert len(errors) == 1 and errors[0].startswith("Error in uploaded file JSON content")
+
+    # The concepts before the error have already been yielded by the time it's found.
+    concepts, errors = _parse_json('{"A": {"Positive": {"Codes": ["C10"]}}} extra')
+    assert [i for i, _ in concepts] == ["A"]
+    assert errors == ["Error in uploaded file JSON content - Extra data (char 40)."]
+
+
+def test_JSON_decoding_errors_without_a_position_are_reported(monkeypatch):
+    """Decoding errors are reported when the decoder raises a plain ValueError (as it does before Python 3.5)."""
+
+    def raw_decode(self, content, position=0):
+        raise ValueError("Expecting value")
+
+    monkeypatch.setattr(json.JSONDecoder, "raw_decode", raw_decode)
+    concepts, errors = _parse_json('{"A": {"Positive": {"Codes": ["C10"]}}}')
+    assert concepts == []
+    assert errors == ["Error in uploaded file JSON content - Invalid value starting at char 1: Expecting value."]
+
+
+def test_JSON_codes_and_terms_must_be_lists():
+    """A concept whose codes or terms are a single value rather than a list is recorded as an error and skipped."""
+
+    concepts, errors = _parse_json(json.dumps({
+        "A": {"Positive": {"Codes": 5}},
+        "B": {"Positive": {"Terms": ["asthma"]}, "Negative": {"Terms": "wheeze"}},
+        "C": {"Positive": {"Codes": ["H33"]}}
+    }))
+    assert [i for i, _ in concepts] == ["C"]
+    assert sorted(errors) == ["The \"Codes\" in the \"Positive\" field of concept A are not a list.",
+                              "The \"Terms\" in the \"Negative\" field of concept B are not a list."]
+
+
+def test_repeated_concepts_are_merged_when_written():
+    """The definitions of a concept defined in more than one place are merged into one before being saved."""
+
+    collection = ConceptCollection.ConceptCollection(io.StringIO(
+        "# A\nDiabetes\n>C10\n# B\nasthma\n# A\n$negative\nblood pressure\n"), "flatfile")
+    fidOutput = io.StringIO()
+    assert ConceptCollection.ConceptCollection.write_concepts(collection, fidOutput) == 2
+    assert collection.errors == []
+
+    fidOutput.seek(0)
+    assert list(ConceptCollection.ConceptCollection(fidOutput, "jsonlines")) == [
+        ("A", {"Positive": {"Codes": ["C10"], "Terms": ["Diabetes"]},
+               "Negative": {"Codes": [], "Terms": ["blood pressure"]}}),
+        ("B", {"Positive": {"Codes": [], "Terms": ["asthma"]}, "Negative": {"Codes": [], "Terms": []}})
+    ]
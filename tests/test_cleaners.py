@@ -0,0 +1,170 @@
+"""Tests for the cleaning of words, descriptions and terms."""
+
+# Python imports.
+import gzip
+import os
+import re
+
+# User imports.
+from webapp.utilities import cleaners
+
+
+# Descriptions that exercise the cleaning of words, in addition to those in the Read V2 release used by the tests.
+_DESCRIPTIONS = [
+    '', "   ", "[V]", "[X]  ", "[V]History of diabetes", "[X] H/O: diabetes, as a child", "Sugar [D]thing",
+    "  leading and trailing whitespace\t", "A test of the stop words in this description",
+    "((nested)) [brackets] {braces}", "- + * % & : ; ? ! [ ] { } ( ) ' = \"", "it's a-b, c.d. 'quoted' \"words\"",
+    "%%% ... !!!", "Tab\tand\nnewline", "Café au lait spots", "Type 2 diabetes mellitus: with renal complications."
+]
+
+# Terms and their cleaned forms, covering quoted phrases, unbalanced quotes and unusual whitespace.
+_TERM_CASES = [
+    ('', ''),
+    ("   ", ''),
+    ("type 2 diabetes", "type 2 diabetes"),
+    ("  type   2\tdiabetes  ", "type 2 diabetes"),
+    ('  the    dog \t\t  " jumped   over   the    "     fence    ', 'the dog " jumped   over   the    " fence'),
+    ('"quoted   at   start"  then  text', '"quoted   at   start" then text'),
+    ('text  then  "quoted   at   end"', 'text then "quoted   at   end"'),
+    ('"one  "  and  "two  "', '"one  " and "two  "'),
+    ('"adjacent  ""quotes  "', '"adjacent  ""quotes  "'),
+    ('a  "b  c"d  e', 'a "b  c"d e'),
+    ('""  empty  quotes', '"" empty quotes'),
+    ('unbalanced  "quote  here', 'unbalanced "quote here'),
+    ('"balanced  "  then  "unbalanced  one', '"balanced  " then "unbalanced one'),
+    ('quote  "across\nlines  "  here', 'quote "across lines " here'),
+    ('"   "', '"   "'),
+    ('  "leading  quote"', '"leading  quote"'),
+]
+
+
+def _baseline_input_word_cleaner(words):
+    """Clean words in the way that input_word_cleaner did before its tables were precompiled.
+
+    :param words:   The collection of words to clean.
+    :type words:    list
+    :return:        The cleaned words.
+    :rtype:         list
+
+    """
+
+    endPunctuation = {'.', ',', '-', '+', '*', '%', '&', ':', ';', '?', '!', '[', ']', '{', '}', '(', ')', "'", '=',
+                      '"'}
+    wordsToRemove = {'a', "an", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of", "on", "that",
+                     "the", "this", "to", "was", "with", "the"}
+    wordsToRemove |= endPunctuation
+    cleanedWords = []
+    for i in [j for j in words if j not in wordsToRemove]:
+        while i and i[0] in endPunctuation:
+            i = i[1:]
+        while i and i[-1] in endPunctuation:
+            i = i[:-1]
+        if i:
+            cleanedWords.append(i)
+    return cleanedWords
+
+
+def _baseline_tokenise_description(description):
+    """Split a description into its cleaned words in the way that the Read V2 parser did before batch tokenising.
+
+    :param description: The description to split.
+    :type description:  str
+    :return:            The cleaned words of the description.
+    :rtype:             list
+
+    """
+
+    splittableDescription = description.lower()
+    isBracketedStart = re.match(r"(\[.*?\])\s*", splittableDescription)
+    if isBracketedStart:
+        splittableDescription = splittableDescription[isBracketedStart.span()[1]:]
+    return _baseline_input_word_cleaner(re.split(r"\s+", splittableDescription))
+
+
+def _baseline_term_cleaner(term):
+    """Clean a term in the way that term_cleaner did before it was rewritten.
+
+    This mangled the quoted phrases in a term and didn't strip an unquoted term, so it is only correct for unquoted
+    terms without leading or trailing whitespace.
+
+    :param term:    The term to clean.
+    :type term:     str
+    :return:        The cleaned term.
+    :rtype:         str
+
+    """
+
+    currentTermIndex = 0
+    newTerm = ""
+    for i in re.finditer('(".*?")', term.strip()):
+        newTerm += re.sub(r"\s+", ' ', term[currentTermIndex:i.span()[0]]) + i.group()
+        currentTermIndex = i.span()[1] + 1
+    return newTerm + re.sub(r"\s+", ' ', term[currentTermIndex:])
+
+
+def _read_ReadV2_descriptions():
+    """Read the longest description on each line of the Read V2 release used by the tests.
+
+    :return:    The descriptions.
+    :rtype:     list
+
+    """
+
+    descriptions = []
+    fileReadV2Data = os.path.join(os.path.dirname(__file__), "data", "ReadV2", "current.gz")
+    with gzip.open(fileReadV2Data, 'rt', encoding="utf-8") as fidReadV2Data:
+        for line in fidReadV2Data:
+            chunks = line.strip()[1:-1].split('","')
+            descriptions.append(chunks[4] if chunks[4] else (chunks[3] if chunks[3] else chunks[2]))
+    return descriptions
+
+
+def test_input_word_cleaner_matches_the_baseline_cleaner():
+    """The words are cleaned in the same way as before the cleaning tables were precompiled."""
+
+    descriptions = _read_ReadV2_descriptions() + _DESCRIPTIONS
+    for i in descriptions:
+        for words in (i.split(), i.lower().split(), re.split(r"\s+", i)):
+            assert cleaners.input_word_cleaner(words) == _baseline_input_word_cleaner(words)
+
+
+def test_tokenised_descriptions_match_the_baseline_tokeniser():
+    """Descriptions are split into the same words one at a time or in a batch as by the Read V2 parser before."""
+
+    descriptions = _read_ReadV2_descriptions() + _DESCRIPTIONS
+    expectedWords = [_baseline_tokenise_description(i) for i in descriptions]
+    assert cleaners.tokenise_descriptions(descriptions) == expectedWords
+    assert [cleaners.tokenise_description(i) for i in descriptions] == expectedWords
+    assert cleaners.tokenise_descriptions([]) == []
+
+
+def test_terms_are_cleaned():
+    """Whitespace is collapsed outside of quoted phrases, one term at a time or in a batch."""
+
+    assert [cleaners.term_cleaner(i) for i, _ in _TERM_CASES] == [i for _, i in _TERM_CASES]
+    assert cleaners.terms_cleaner([i for i, _ in _TERM_CASES]) == [i for _, i in _TERM_CASES]
+    assert cleaners.terms_cleaner([]) == []
+
+
+def test_unquoted_terms_are_cleaned_as_by_the_baseline_cleaner():
+    """Unquoted terms, for which the previous cleaner was correct, are cleaned in the same way as before."""
+
+    terms = [i.strip() for i in _read_ReadV2_descriptions() + _DESCRIPTIONS if '"' not in i]
+    terms += ["type  2\t diabetes", "a\n\nb  c", "word" + "   word" * 100]
+    assert cleaners.terms_cleaner(terms) == [_baseline_term_cleaner(i) for i in terms]
+
+
+def test_terms_with_unbalanced_quotes_are_cleaned():
+    """Long terms with many quotes, or ending in an unbalanced one, are cleaned leaving unmatched quotes as text."""
+
+    assert cleaners.term_cleaner('"' + "word   " * 20000) == '"' + ' '.join(["word"] * 20000)
+    assert cleaners.term_cleaner('" ' * 20000 + "word") == '" ' * 20000 + "word"
+    assert cleaners.term_cleaner('"a  b"  ' * 1000 + '"c  d') == '"a  b" ' * 1000 + '"c d'
+
+
+def test_terms_containing_the_section_separator_are_cleaned():
+    """A batch containing the character used to separate the sections of the terms is still cleaned correctly."""
+
+    terms = ["a  \0  b", '"x  y"  z', "p\0\0q  r"]
+    assert cleaners.terms_cleaner(terms) == [cleaners.term_cleaner(i) for i in terms] == \
+        ["a \0 b", '"x  y" z', "p\0\0q r"]
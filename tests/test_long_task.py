@@ -0,0 +1,102 @@
+"""Tests for the Celery tasks that discover the codes of a file of concepts."""
+
+# Python imports.
+import io
+
+# User imports.
+from webapp import app, celeryInstance
+from webapp.mod_concept_discovery import long_task
+from webapp.mod_concept_discovery.ConceptCollection import ConceptCollection
+
+
+class _SearchBackend(object):
+    """Search backend with a fixed set of codes, each described by a single word."""
+
+    _descriptions = {"C10": "diabetes", "C11": "diabetes", "H33": "asthma"}
+
+    def get_concept_codes(self, definition, codeFormats):
+        codes = set()
+        for sign in ("Positive", "Negative"):
+            matches = {i for i, j in self._descriptions.items()
+                       if i in definition[sign]["Codes"] or j in definition[sign]["Terms"]}
+            codes = codes | matches if sign == "Positive" else codes - matches
+        return {i: codes for i in codeFormats}
+
+    def iter_descriptions(self, codes, codeFormats):
+        for i in codes:
+            if i in self._descriptions:
+                yield i, codeFormats[0], self._descriptions[i]
+
+
+class _PolledGroup(object):
+    """Group of sub-tasks that are run locally, and only once their result has been polled for."""
+
+    pending = []  # The results of the groups that have been started and not fetched.
+    mostPending = 0  # The largest number of results pending at once.
+    blockingGets = 0  # The number of results fetched before they were ready.
+
+    def __init__(self, signatures):
+        self._signatures = list(signatures)
+        self._value = None
+
+    def apply_async(self):
+        _PolledGroup.pending.append(self)
+        _PolledGroup.mostPending = max(_PolledGroup.mostPending, len(_PolledGroup.pending))
+        return self
+
+    def get(self):
+        if self._value is None:
+            _PolledGroup.blockingGets += 1
+            self.ready()
+        _PolledGroup.pending.remove(self)
+        return self._value
+
+    def ready(self):
+        # The sub-tasks aren't done the first time they're polled.
+        if self._value is None:
+            self._value = [i() for i in self._signatures]
+            return False
+        return True
+
+
+def test_sub_tasks_are_routed_away_from_the_main_task():
+    """The sub-tasks go to a queue of their own, so workers running main tasks can't be starved of slots for them."""
+
+    router = celeryInstance.amqp.router
+    mainQueue = router.route({}, long_task.main.name)["queue"].name
+    for i in (long_task.find_codes, long_task.describe_codes):
+        subTaskQueue = router.route({}, i.name)["queue"].name
+        assert subTaskQueue == "discovery_subtasks" and subTaskQueue != mainQueue
+
+
+def test_main_task_polls_for_the_sub_tasks_of_a_bounded_number_of_concepts(tmpdir, monkeypatch):
+    """The main task only fetches the results of sub-tasks that are ready, and evaluates few concepts at once."""
+
+    monkeypatch.setattr(_PolledGroup, "pending", [])
+    monkeypatch.setattr(_PolledGroup, "mostPending", 0)
+    monkeypatch.setattr(_PolledGroup, "blockingGets", 0)
+    monkeypatch.setattr(long_task, "group", _PolledGroup)
+    monkeypatch.setattr(long_task, "get_search_backend", lambda config: _SearchBackend())
+    monkeypatch.setattr(long_task, "_POLL_INTERVAL", 0)
+    monkeypatch.setattr(long_task.main, "update_state", lambda **kwargs: None)
+    monkeypatch.setitem(app.config, "DISCOVERY_CODES_PER_TASK", 1)
+    monkeypatch.setitem(app.config, "DISCOVERY_CONCEPTS_IN_FLIGHT", 2)
+    monkeypatch.setitem(app.config, "DISCOVERY_TERMS_PER_TASK", 1)
+
+    flatFile = "#A\ndiabetes\nasthma\n#B\nasthma\n#C\n>C10\n#D\ndiabetes\n$negative\n>C11\n#E\nkidney\n"
+    fileConcepts = tmpdir.join("concepts.jsonl")
+    with fileConcepts.open('w', encoding="utf-8") as fidConcepts:
+        numberOfConcepts = ConceptCollection.write_concepts(ConceptCollection(io.StringIO(flatFile)), fidConcepts)
+    result = long_task.main(str(fileConcepts), ["ReadV2"], numberOfConcepts)
+
+    assert result["current"] == result["total"] == 5
+    assert result["result"] == [
+        {"concept": "A", "codes": {"ReadV2": [["C10", "diabetes"], ["C11", "diabetes"], ["H33", "asthma"]]}},
+        {"concept": "B", "codes": {"ReadV2": [["H33", "asthma"]]}},
+        {"concept": "C", "codes": {"ReadV2": [["C10", "diabetes"]]}},
+        {"concept": "D", "codes": {"ReadV2": [["C10", "diabetes"]]}},
+        {"concept": "E", "codes": {"ReadV2": []}}
+    ]
+    assert _PolledGroup.blockingGets == 0 and _PolledGroup.pending == []
+    assert _PolledGroup.mostPending == 2
+    assert not fileConcepts.check()
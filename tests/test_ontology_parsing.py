@@ -0,0 +1,204 @@
+"""Tests for the parsing of the ontology data files."""
+
+# Python imports.
+import io
+import multiprocessing
+import os
+
+# 3rd party imports.
+import pytest
+
+# User imports.
+from database_setup import ontology_parsing
+from database_setup.ontology_records import Concept, Term
+
+
+# The directory containing the ontology releases (and the files expected to be generated from them) used by the tests.
+_DIR_TEST_DATA = os.path.join(os.path.dirname(__file__), "data")
+
+
+def _read_data_files(dirNeo4jData):
+    """Read the files generated for the Neo4j data loader, ignoring the order of their lines.
+
+    The Left and Right columns of the concept files are dropped, as the files expected from the Read V2 parser were
+    generated before the concepts were numbered (see hierarchy_numbering).
+
+    :param dirNeo4jData:    The directory containing the generated files.
+    :type dirNeo4jData:     str
+    :return:                The sorted lines of each file, keyed by file name.
+    :rtype:                 dict
+
+    """
+
+    dataFiles = {}
+    for i in os.listdir(dirNeo4jData):
+        with open(os.path.join(dirNeo4jData, i), 'r', encoding="utf-8") as fidData:
+            lines = [j.rstrip('\n').split('\t') for j in fidData]
+        if i.startswith("Concepts_"):
+            lines = [j[:4] + j[6:] if len(j) == 7 else j for j in lines]
+        dataFiles[i] = sorted('\t'.join(j) for j in lines)
+    return dataFiles
+
+
+def test_imap_bounded_reads_ahead_a_bounded_number_of_items():
+    """The items are processed in order, and only a bounded number are read ahead of the results consumed."""
+
+    itemsRead = []
+
+    def items():
+        for i in range(-50, 50):
+            itemsRead.append(i)
+            yield i
+
+    with multiprocessing.Pool(2) as pool:
+        results = ontology_parsing._imap_bounded(pool, abs, items(), 4)
+        firstResults = [next(results) for _ in range(3)]
+        assert len(itemsRead) <= 3 + 4
+        assert firstResults + list(results) == [abs(i) for i in range(-50, 50)]
+
+
+@pytest.mark.parametrize("options", [{}, {"external": True, "runSize": 7}, {"processes": 2}])
+def test_ReadV2_changes_match_the_baseline_parser(tmpdir, options):
+    """The files generated from two Read V2 releases are the same as those generated by the string based parser."""
+
+    dirReadV2Data = os.path.join(_DIR_TEST_DATA, "ReadV2")
+    readV2Files = [os.path.join(dirReadV2Data, "current.gz"), os.path.join(dirReadV2Data, "previous.gz")]
+    ontology_parsing.main(str(tmpdir), readV2Files, **options)
+    assert _read_data_files(str(tmpdir)) == _read_data_files(os.path.join(dirReadV2Data, "expected"))
+
+
+def test_CTV3_release_is_parsed_from_the_documented_files():
+    """The CTV3 files are joined into concepts, terms, words and relationships, with redundant codes replaced."""
+
+    concepts, terms, words, relationships = ontology_parsing.parse_CTV3(os.path.join(_DIR_TEST_DATA, "CTV3", "current"))
+
+    # R1 has been replaced by X2, so its term is a secondary term of X2. X3 is a child of X1 and X2, and its level is
+    # the length of the shorter path to the root. T8 is missing from Terms.v3, and T9 describes no concept.
+    assert concepts == {
+        ".....": Concept(".....", True, "Root", 0, None, None, "CTV3_Concept"),
+        "X1": Concept("X1", True, "Disorders of things", 1, None, None, "CTV3_Concept"),
+        "X2": Concept("X2", True, "Disorders of things", 2, None, None, "CTV3_Concept"),
+        "X3": Concept("X3", True, "Disorders of things", 2, None, None, "CTV3_Concept")
+    }
+    assert terms == {
+        "T0": Term("T0", True, "Root", "CTV3_Term"),
+        "T1": Term("T1", True, "Disorders of things", "CTV3_Term"),
+        "T2": Term("T2", True, "Diabetes", "CTV3_Term"),
+        "T3": Term("T3", False, "Sugar [D]thing", "CTV3_Term"),
+        "T4": Term("T4", True, "Old diab", "CTV3_Term"),
+        "T5": Term("T5", True, "Asthma", "CTV3_Term")
+    }
+    assert words == {"root", "disorders", "things", "diabetes", "sugar", "d]thing", "old", "diab", "asthma"}
+    assert sorted(str(i) for i in relationships.values()) == sorted(
+        ["X1\tCTV3_Concept\t.....\tCTV3_Concept\tparent\tParent",
+         "X2\tCTV3_Concept\tX1\tCTV3_Concept\tparent\tParent",
+         "X3\tCTV3_Concept\tX1\tCTV3_Concept\tparent\tParent",
+         "X3\tCTV3_Concept\tX2\tCTV3_Concept\tparent\tParent",
+         ".....\tCTV3_Concept\tT0\tCTV3_Term\ttrue\tDescribedBy",
+         "X1\tCTV3_Concept\tT1\tCTV3_Term\ttrue\tDescribedBy",
+         "X2\tCTV3_Concept\tT2\tCTV3_Term\ttrue\tDescribedBy",
+         "X2\tCTV3_Concept\tT3\tCTV3_Term\tfalse\tDescribedBy",
+         "X2\tCTV3_Concept\tT4\tCTV3_Term\tfalse\tDescribedBy",
+         "X3\tCTV3_Concept\tT5\tCTV3_Term\ttrue\tDescribedBy"] +
+        ["{0:s}\tCTV3_Term\t{1:s}\tWord\t\tContains".format(i, j) for i, j in [
+            ("T0", "root"), ("T1", "disorders"), ("T1", "things"), ("T2", "diabetes"), ("T3", "sugar"),
+            ("T3", "d]thing"), ("T4", "old"), ("T4", "diab"), ("T5", "asthma")]]
+    )
+
+
+def test_CTV3_changes_are_the_same_however_the_releases_are_joined(tmpdir):
+    """The files generated from two CTV3 releases are the same in memory, in external mode and from snapshots."""
+
+    readV2Files = [os.path.join(_DIR_TEST_DATA, "ReadV2", i) for i in ("current.gz", "previous.gz")]
+    ctv3Files = [os.path.join(_DIR_TEST_DATA, "CTV3", i) for i in ("current", "previous")]
+    dirSnapshots = str(tmpdir.mkdir("snapshots"))
+    dataFiles = []
+    for options in [{}, {"external": True, "runSize": 3}, {"dirSnapshots": dirSnapshots},
+                    {"dirSnapshots": dirSnapshots}]:
+        dirNeo4jData = str(tmpdir.mkdir("data{0:d}".format(len(dataFiles))))
+        ontology_parsing.main(dirNeo4jData, readV2Files, ctv3Files=ctv3Files, **options)
+        dataFiles.append(_read_data_files(dirNeo4jData))
+    assert all(i == dataFiles[0] for i in dataFiles)
+
+    # X4 (and its term T6) are only in the previous release, and X3 and its terms only in the current one.
+    assert "X4\t\t\t\t\t\t\tCTV3_Concept" in dataFiles[0]["Concepts_Remove.tsv"]
+    assert "T6\t\t\t\t\t\t\tCTV3_Term" in dataFiles[0]["Terms_Remove.tsv"]
+    assert "X3\ttrue\tDisorders of things\t2\tCTV3_Concept" in dataFiles[0]["Concepts_Add.tsv"]
+    assert {"T3", "T5"} <= {i.split('\t')[0] for i in dataFiles[0]["Terms_Add.tsv"]}
+    assert "T1\ttrue\tDisorders of things\tdisorders of things\tCTV3_Term" in dataFiles[0]["Terms_Update.tsv"]
+
+
+def test_CTV3_descriptions_of_missing_terms_are_skipped(tmpdir):
+    """No DescribedBy relationship is generated for a term that is missing from Terms.v3."""
+
+    tmpdir.join("Redun.map").write("")
+    tmpdir.join("V3hier.v3").write("X1|.....|00\n")
+    tmpdir.join("Descrip.v3").write(".....|T0|P\nX1|T1|P\nX1|T7|S\nX9|T8|P\n")
+    tmpdir.join("Terms.v3").write("T0|C|Root||\nT1|C|Disorders||\n")
+    concepts, terms, words, relationships = ontology_parsing.parse_CTV3(str(tmpdir))
+
+    describedBy = sorted((i.source, i.target) for i in relationships.values() if i.label == "DescribedBy")
+    assert describedBy == [(".....", "T0"), ("X1", "T1")]
+    assert sorted(concepts) == [".....", "X1"]
+    assert sorted(terms) == ["T0", "T1"]
+
+
+def _write_RF2_release(dirRelease, releaseType, concepts, descriptions):
+    """Write the Concept, Description and Relationship files of a SNOMED CT RF2 release.
+
+    :param dirRelease:      The top level directory of the release.
+    :type dirRelease:       py.path.local
+    :param releaseType:     The type of the release (Delta or Snapshot).
+    :type releaseType:      str
+    :param concepts:        The (id, active) fields of the concepts.
+    :type concepts:         list
+    :param descriptions:    The (id, active, concept ID, type, term) fields of the English descriptions.
+    :type descriptions:     list
+
+    """
+
+    dirTerminology = dirRelease.mkdir(releaseType).mkdir("Terminology")
+    header = "id\teffectiveTime\tactive\tmoduleId\t"
+    dirTerminology.join("sct2_Concept_{0:s}_INT_20170131.txt".format(releaseType)).write(
+        header + "definitionStatusId\n" + ''.join(
+            "{0:s}\t20170131\t{1:s}\tm\tx\n".format(*i) for i in concepts))
+    dirTerminology.join("sct2_Description_{0:s}-en_INT_20170131.txt".format(releaseType)).write(
+        header + "conceptId\tlanguageCode\ttypeId\tterm\tcaseSignificanceId\n" + ''.join(
+            "{0:s}\t20170131\t{1:s}\tm\t{2:s}\ten\t{3:s}\t{4:s}\tc\n".format(*i) for i in descriptions))
+    dirTerminology.join("sct2_Relationship_{0:s}_INT_20170131.txt".format(releaseType)).write(
+        header + "sourceId\tdestinationId\trelationshipGroup\ttypeId\tcharacteristicTypeId\tmodifierId\n")
+
+
+def test_SNOMED_CT_changes_remove_the_terms_of_removed_concepts(tmpdir):
+    """The Delta files of a full release are loaded, and the terms of its removed concepts are removed."""
+
+    fsn = ontology_parsing._SNOMED_CT_FSN_TYPE
+    synonym = ontology_parsing._SNOMED_CT_SYNONYM_TYPE
+    _write_RF2_release(tmpdir, "Delta", [("1", "1"), ("2", "0")],
+                       [("10", "1", "1", fsn, "Diabetes (disorder)"), ("20", "1", "2", synonym, "Changed term")])
+    _write_RF2_release(tmpdir, "Snapshot", [("1", "1"), ("2", "0"), ("3", "1")],
+                       [("10", "1", "1", fsn, "Diabetes (disorder)"), ("20", "1", "2", synonym, "Changed term"),
+                        ("21", "1", "2", fsn, "Unchanged term (finding)"), ("30", "1", "3", fsn, "Other (finding)")])
+    files = {i: io.StringIO() for i in ["addTerms", "removeTerms", "updateConcepts", "removeConcepts", "addWords",
+                                        "addRelationships", "updateRelationships", "removeRelationships"]}
+    ontology_parsing._write_SNOMED_CT_changes(
+        str(tmpdir), files["addTerms"], files["removeTerms"], files["updateConcepts"], files["removeConcepts"],
+        files["addWords"], files["addRelationships"], files["updateRelationships"], files["removeRelationships"])
+    lines = {i: files[i].getvalue().splitlines() for i in files}
+
+    assert {i.split('\t')[0] for i in lines["removeTerms"]} == {"10", "20", "21"}
+    assert [i.split('\t')[0] for i in lines["addTerms"]] == ["10"]
+    assert [i.split('\t')[0] for i in lines["removeConcepts"]] == ["2"]
+    assert [i.split('\t')[0] for i in lines["updateConcepts"]] == ["1"]
+    assert all(i.split('\t')[2] == "10" for i in lines["addRelationships"] if i.endswith("DescribedBy"))
+
+
+def test_find_RF2_file_prefers_the_Delta_file(tmpdir):
+    """The Delta file of a release holding both Delta and Snapshot files is found, and the Snapshot file otherwise."""
+
+    _write_RF2_release(tmpdir.mkdir("Full"), "Delta", [], [])
+    _write_RF2_release(tmpdir.join("Full"), "Snapshot", [], [])
+    _write_RF2_release(tmpdir.mkdir("SnapshotOnly"), "Snapshot", [], [])
+
+    assert "Delta" in ontology_parsing._find_RF2_file(str(tmpdir.join("Full")), "Concept")
+    assert "Snapshot" in ontology_parsing._find_RF2_file(str(tmpdir.join("SnapshotOnly")), "Concept")
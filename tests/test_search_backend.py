@@ -0,0 +1,37 @@
+"""Tests for the selection of the backend used to search for codes."""
+
+# Python imports.
+import os
+
+# User imports.
+from webapp.mod_concept_discovery import search_backend
+
+
+def test_index_backend_reloads_replaced_files(tmpdir, monkeypatch):
+    """The indices are only rebuilt when a file they were built from is replaced or modified."""
+
+    loadedFiles = []
+
+    def from_files(cls, ontologyFiles):
+        loadedFiles.append(dict(ontologyFiles))
+        return object()
+
+    monkeypatch.setattr(search_backend.IndexOperations, "from_files", classmethod(from_files))
+    monkeypatch.setattr(search_backend, "_indexOperations", None)
+    monkeypatch.setattr(search_backend, "_indexSignature", None)
+    fileIndex = tmpdir.join("ReadV2.idx")
+    fileIndex.write_binary(b"release 1")
+    config = {"SEARCH_BACKEND": "index", "ONTOLOGY_FILES": {"ReadV2": str(fileIndex)}}
+
+    firstBackend = search_backend.get_search_backend(config)
+    assert search_backend.get_search_backend(config) is firstBackend
+    assert len(loadedFiles) == 1
+
+    # Replace the file in the same way as InvertedIndex.write.
+    fileNew = tmpdir.join("ReadV2.idx.tmp")
+    fileNew.write_binary(b"release 22")
+    os.replace(str(fileNew), str(fileIndex))
+    secondBackend = search_backend.get_search_backend(config)
+    assert secondBackend is not firstBackend
+    assert search_backend.get_search_backend(config) is secondBackend
+    assert len(loadedFiles) == 2
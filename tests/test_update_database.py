@@ -0,0 +1,49 @@
+"""Tests for the loading of ontology update files into the database."""
+
+# Python imports.
+import threading
+import time
+
+# 3rd party imports.
+import pytest
+
+# User imports.
+from database_setup import snapshots
+from database_setup import update_database
+
+
+def test_removals_are_loaded_one_at_a_time():
+    """No removal runs alongside another removal, and the other node files wait for every removal."""
+
+    phases = {i[0]: i[3] for i in update_database._PHASES}
+    removals = set(update_database._REMOVAL_PHASES)
+    running = set()
+    overlaps = []
+    finished = []
+    lock = threading.Lock()
+
+    def run_phase(phase):
+        with lock:
+            overlaps.extend((phase, i) for i in running if {phase, i} <= removals)
+            running.add(phase)
+        time.sleep(0.01)
+        with lock:
+            running.remove(phase)
+            finished.append(phase)
+
+    update_database.run_phases(phases, run_phase, concurrency=8)
+    assert overlaps == []
+    assert finished[:3] == ["Concepts_Remove.tsv", "Terms_Remove.tsv", "Words_Remove.tsv"]
+    assert sorted(finished) == sorted(phases)
+
+
+def test_resuming_from_a_checkpoint_of_a_different_file_is_refused(tmpdir):
+    """A file whose contents changed since its load was checkpointed isn't resumed, even if its size is the same."""
+
+    fileData = tmpdir.join("Words_Add.tsv")
+    fileData.write("Word\tLabels\ndiabetes\t\n")
+    checkpoint = {"chunk": 1, "complete": False, "hash": snapshots.file_hash(str(fileData)), "offset": 12}
+    fileData.write("Word\tLabels\ndiabetic\t\n")
+    with pytest.raises(ValueError):
+        update_database.load_file(None, str(fileData), update_database._parse_word, "", releaseKey="{}",
+                                  checkpoint=checkpoint)
@@ -6,6 +6,11 @@ from flask_wtf.csrf import CsrfProtect
 
 # 3rd party imports.
 from celery import Celery
+from celery.signals import worker_process_init, worker_process_shutdown
+
+# User imports.
+from webapp.utilities import connection_pool
+from webapp.utilities import result_cache
 
 
 # Define the WSGI application object.
@@ -23,6 +28,15 @@ celeryInstance = Celery(app.name, backend=app.config["CELERY_RESULT_BACKEND"], b
                         include=["webapp.mod_concept_discovery.long_task"])
 celeryInstance.conf.update(app.config)
 
+# Share one pooled Neo4j driver per process. Celery worker processes are forked from the parent, so they need to drop
+# any inherited drivers when they start and close their own when they stop.
+connection_pool.init_app(app)
+worker_process_init.connect(connection_pool.reset_after_fork, weak=False)
+worker_process_shutdown.connect(lambda **kwargs: connection_pool.close_all(), weak=False)
+
+# Cache the results of code searches.
+result_cache.init_app(app)
+
 # Import modules using their blueprint handler variables.
 from webapp.mod_concept_discovery import modConceptDiscovery
 from webapp.mod_core import modCore
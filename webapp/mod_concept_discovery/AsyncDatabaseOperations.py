@@ -0,0 +1,260 @@
+"""Classes for running the concept related queries of DatabaseOperations concurrently using asyncio.
+
+A search across several code formats is made up of one query per code format (or, when fetching descriptions, one
+query per chunk of codes in each format). DatabaseOperations runs these one after the other, so a search waits for each
+hierarchy in turn. AsyncDatabaseOperations starts them all at once and waits for them together, so that a search takes
+roughly as long as its slowest query.
+
+The Neo4j driver only offers a blocking API, so each query is run in one of the worker threads shared by the process, on
+a session borrowed from the shared driver (see connection_pool), and the event loop waits on the threads. A semaphore
+bounds the number of queries that each search runs at once, and so the number of sessions it holds. The coroutines are
+generator based (using asyncio.coroutine and yield from) in order to run on Python 3.4.
+
+ConcurrentDatabaseOperations wraps the coroutines in the blocking interface of DatabaseOperations, for callers (such as
+the Celery tasks) that don't run an event loop.
+
+"""
+
+# Python imports.
+import asyncio
+import itertools
+
+# User imports.
+from ..utilities import connection_pool
+from .DatabaseOperations import DatabaseOperations
+
+
+# The default maximum number of queries that a single search runs at once.
+_CONCURRENT_QUERIES = 8
+
+
+class AsyncDatabaseOperations(object):
+    """Class defining high level queries to run concurrently on a Neo4j database of clinical codes.
+
+    The queries are coroutines with the same arguments and results as the methods of DatabaseOperations.
+
+    """
+
+    def __init__(self, databaseAddress, username, password, concurrency=_CONCURRENT_QUERIES, loop=None):
+        """Initialise an object.
+
+        :param databaseAddress:     The location of the database to connect to.
+        :type databaseAddress:      str
+        :param username:            The username used to access the database.
+        :type username:             str
+        :param password:            The password associated with the username.
+        :type password:             str
+        :param concurrency:         The maximum number of queries that a single search runs at once.
+        :type concurrency:          int
+        :param loop:                The event loop that the queries are run from. A value of None uses the current
+                                        event loop.
+        :type loop:                 asyncio.AbstractEventLoop
+
+        """
+
+        if concurrency < 1:
+            raise ValueError("The number of concurrent queries must be at least 1, not {0:d}.".format(concurrency))
+        self._operations = DatabaseOperations(databaseAddress, username, password)
+        self._concurrency = concurrency
+        self._loop = loop or asyncio.get_event_loop()
+
+    @asyncio.coroutine
+    def get_codes_from_phrases(self, phrases, codeFormats):
+        """Get the codes that have a description where all the supplied quoted phrases match.
+
+        See DatabaseOperations.get_codes_from_phrases.
+
+        :param phrases:     Sets of phrases. Each entry should contain a set of phrases, all of which must be found in
+                                a code's description before the code is deemed a match.
+        :type phrases:      list
+        :param codeFormats: The code formats to look through when extracting descriptions.
+        :type codeFormats:  list
+        :return:            One dictionary per entry in phrases, mapping each code format to the codes from that
+                                format that matched the entry.
+        :rtype:             list
+
+        """
+
+        return (yield from self._run_concurrently(*self._operations._phrase_searches(phrases, codeFormats)))
+
+    @asyncio.coroutine
+    def get_codes_from_words(self, words, codeFormats):
+        """Get codes based on bags of words.
+
+        See DatabaseOperations.get_codes_from_words.
+
+        :param words:       The words to find codes for. Each entry should contain a list of words, all of which must be
+                                present in a code's description before the code is deemed a match.
+        :type words:        list
+        :param codeFormats: The code formats to look through when extracting descriptions.
+        :type codeFormats:  list
+        :return:            One dictionary per entry in words, mapping each code format to the codes from that format
+                                that matched the entry.
+        :rtype:             list
+
+        """
+
+        return (yield from self._run_concurrently(*self._operations._word_searches(words, codeFormats)))
+
+    @asyncio.coroutine
+    def get_concept_codes(self, definition, codeFormats):
+        """Get the codes matching a concept definition.
+
+        See DatabaseOperations.get_concept_codes.
+
+        :param definition:  The definition of the concept, in the form described by ConceptCollection.
+        :type definition:   dict
+        :param codeFormats: The code formats to find codes from.
+        :type codeFormats:  list
+        :return:            The codes matching the definition, keyed by code format.
+        :rtype:             dict
+
+        """
+
+        return (yield from self._run_concurrently(*self._operations._concept_searches(definition, codeFormats)))
+
+    @asyncio.coroutine
+    def get_descriptions(self, codes, codeFormats):
+        """Get the descriptions of a list of codes.
+
+        See DatabaseOperations.get_descriptions.
+
+        :param codes:       The codes to extract the descriptions for.
+        :type codes:        list
+        :param codeFormats: The code formats to look through when extracting descriptions.
+        :type codeFormats:  list
+        :return:            The descriptions of each code, as a dictionary mapping the code formats the code is in to
+                                its description in that format.
+        :rtype:             dict
+
+        """
+
+        descriptions = {i: {} for i in codes}
+        searches = list(self._operations._description_searches(descriptions, codeFormats))
+        foundDescriptions = yield from self._run_concurrently(searches, itertools.chain.from_iterable)
+        for code, codeFormat, description in foundDescriptions:
+            descriptions[code][codeFormat] = description
+        return descriptions
+
+    @asyncio.coroutine
+    def _run_concurrently(self, searches, combine):
+        """Run a set of searches at the same time, and combine their results.
+
+        :param searches:    The searches to run, each a function that takes no arguments.
+        :type searches:     list
+        :param combine:     The function that combines the list of the results of the searches (in the order of the
+                                searches) into the final result.
+        :type combine:      function
+        :return:            The combined result of the searches.
+        :rtype:             object
+
+        """
+
+        semaphore = asyncio.Semaphore(self._concurrency, loop=self._loop)
+        tasks = [asyncio.ensure_future(self._run_search(i, semaphore), loop=self._loop) for i in searches]
+        try:
+            results = yield from asyncio.gather(*tasks, loop=self._loop)
+        finally:
+            # Don't start the searches still waiting if one fails (or the caller is cancelled). Those already running
+            # in a worker thread can't be stopped, and their results are discarded.
+            unfinished = [i for i in tasks if not i.done()]
+            for i in unfinished:
+                i.cancel()
+            if unfinished:
+                yield from asyncio.wait(unfinished, loop=self._loop)
+        return combine(results)
+
+    @asyncio.coroutine
+    def _run_search(self, search, semaphore):
+        """Run a search in a worker thread once there is room for it.
+
+        :param search:      The search to run, as a function that takes no arguments.
+        :type search:       function
+        :param semaphore:   The semaphore bounding the number of searches running at once.
+        :type semaphore:    asyncio.Semaphore
+        :return:            The result of the search.
+        :rtype:             object
+
+        """
+
+        yield from semaphore.acquire()
+        try:
+            return (yield from self._loop.run_in_executor(connection_pool.get_executor(), search))
+        finally:
+            semaphore.release()
+
+
+class ConcurrentDatabaseOperations(DatabaseOperations):
+    """Class running the queries of AsyncDatabaseOperations for callers without an event loop.
+
+    Each query runs its search on an event loop of its own, and blocks until the search is done. The descriptions of
+    codes are already fetched concurrently by DatabaseOperations.iter_descriptions, so that is used unchanged.
+
+    """
+
+    def __init__(self, databaseAddress, username, password, concurrency=_CONCURRENT_QUERIES):
+        """Initialise an object.
+
+        :param databaseAddress:     The location of the database to connect to.
+        :type databaseAddress:      str
+        :param username:            The username used to access the database.
+        :type username:             str
+        :param password:            The password associated with the username.
+        :type password:             str
+        :param concurrency:         The maximum number of queries that a single search runs at once.
+        :type concurrency:          int
+
+        """
+
+        if concurrency < 1:
+            raise ValueError("The number of concurrent queries must be at least 1, not {0:d}.".format(concurrency))
+        super().__init__(databaseAddress, username, password)
+        self._concurrency = concurrency
+
+    def get_codes_from_phrases(self, phrases, codeFormats):
+        """Get the codes that have a description where all the supplied quoted phrases match.
+
+        See DatabaseOperations.get_codes_from_phrases.
+
+        """
+
+        return self._run_search(lambda operations: operations.get_codes_from_phrases(phrases, codeFormats))
+
+    def get_codes_from_words(self, words, codeFormats):
+        """Get codes based on bags of words.
+
+        See DatabaseOperations.get_codes_from_words.
+
+        """
+
+        return self._run_search(lambda operations: operations.get_codes_from_words(words, codeFormats))
+
+    def get_concept_codes(self, definition, codeFormats):
+        """Get the codes matching a concept definition.
+
+        See DatabaseOperations.get_concept_codes.
+
+        """
+
+        return self._run_search(lambda operations: operations.get_concept_codes(definition, codeFormats))
+
+    def _run_search(self, search):
+        """Run a search on a new event loop, blocking until it is done.
+
+        The event loop is only used by the search, so the current event loop of the calling thread (if it has one) is
+        left untouched.
+
+        :param search:  Function that takes an AsyncDatabaseOperations object and returns the coroutine to run.
+        :type search:   function
+        :return:        The result of the search.
+        :rtype:         object
+
+        """
+
+        loop = asyncio.new_event_loop()
+        try:
+            asyncOperations = AsyncDatabaseOperations(self._databaseAddress, self._username, self._password,
+                                                      self._concurrency, loop)
+            return loop.run_until_complete(search(asyncOperations))
+        finally:
+            loop.close()
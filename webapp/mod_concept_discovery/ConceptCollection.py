@@ -1,46 +1,66 @@
-"""Class containing function for parsing, validating and using using concept definitions."""
+"""Class containing function for parsing, validating and using using concept definitions.
+
+Concept definitions are parsed incrementally from a stream (e.g. an uploaded file), with each concept being validated
+and cleaned as it is read and then yielded on its own. Only the definition of the concept being read is held in
+memory, so a file of concepts of any size is parsed in a single pass and in constant memory (relative to the number of
+concepts). Saving the concepts with write_concepts, which merges the definitions of repeated concepts, additionally
+holds the name of every concept in memory, but still not their definitions.
+
+"""
 
 # Python imports.
-from abc import ABCMeta
-from collections import defaultdict
+from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
 import json
 import re
+import tempfile
 
 # User imports.
 from ..utilities import cleaners
 
 
+# Compile the needed regular expressions.
+_CODE_CLEANER = re.compile("\.+$")  # Used to strip trailing full stops from codes.
+_JSON_NON_WHITESPACE = re.compile("[^ \t\n\r]")  # Used to find the next token in a stream of JSON content.
+
+# The control terms that can be used in the flat file format.
+_CONTROL_TERMS = {"positive", "negative", "search", "output"}
+
+
 class ConceptCollection(metaclass=ABCMeta):
     """Class of concept definitions and associated methods.
 
-    The concept definitions are stored as a JSON object (a Python dictionary), with the form:
+    The definition of each concept is stored as a JSON object (a Python dictionary), with the form:
     {
-        "Concept1":
-            {
-                "Positive": {"Codes": ["C10", "B3%"], "Terms": ['"type 2" diabetes']},
-                "Negative": {"Codes": [], "Terms": ['blood pressure']}
-            },
-        "Concept2":
-            {
-                "Positive": {"Codes": ["XXX", "YYY"], "Terms": []},
-                "Negative": {"Codes": ["AAA..", "B...."], "Terms": ["type 1", "type 2", 'kidney disease']}
-            },
-        ...
+        "Positive": {"Codes": ["C10", "B3%"], "Terms": ['"type 2" diabetes']},
+        "Negative": {"Codes": [], "Terms": ['blood pressure']}
     }
 
+    Iterating over a collection parses the concept definitions from its stream, and yields a (name, definition) pair
+    for each concept in the order that they appear in the stream. Problems found while parsing are recorded in the
+    errors attribute, and the concepts they affect are not yielded. As a collection reads its stream as it is iterated
+    over, it can only be iterated over once.
+
+    A concept defined in more than one place (e.g. under two # lines with the same name in a flat file) is yielded
+    once for each place it's defined in, as merging the definitions would need every concept to be held until the end
+    of the stream. write_concepts merges them, so the concepts it saves each have a single, complete definition.
+
     """
 
-    def __new__(cls, fileConceptDefinitions, conceptSource="FlatFile"):
+    def __new__(cls, conceptDefinitions, conceptSource="FlatFile", isFileUploaded=True):
         """Create a set of concept definitions.
 
-        :param fileConceptDefinitions:  The location of the file containing the concept definitions.
-        :type fileConceptDefinitions:   str
-        :param conceptSource:           The type of concept definition source file. Valid values are (case insensitive):
-                                            flatfile    - for the flat file input format
-                                            json        - for the JSON input format
-        :type conceptSource:            str
-        :return:                        A ConceptCollection subclass determined by the conceptSource parameter.
-        :rtype:                         ConceptCollection subclass
+        :param conceptDefinitions:  The stream of concept definitions.
+        :type conceptDefinitions:   io.TextIOBase
+        :param conceptSource:       The type of concept definition source. Valid values are (case insensitive):
+                                        flatfile    - for the flat file input format
+                                        json        - for the JSON input format
+                                        jsonlines   - for concepts saved by write_concepts
+        :type conceptSource:        str
+        :param isFileUploaded:      Whether the concept definitions come from an uploaded file or a text area.
+        :type isFileUploaded:       bool
+        :return:                    A ConceptCollection subclass determined by the conceptSource parameter.
+        :rtype:                     ConceptCollection subclass
 
         """
 
@@ -52,21 +72,45 @@ class ConceptCollection(metaclass=ABCMeta):
             elif conceptSource.lower() == "json":
                 # Generate a _JSONDefinitions.
                 return super(ConceptCollection, cls).__new__(_JSONDefinitions)
+            elif conceptSource.lower() == "jsonlines":
+                # Generate a _JSONLinesDefinitions.
+                return super(ConceptCollection, cls).__new__(_JSONLinesDefinitions)
             else:
                 # Didn't get one of the permissible
                 raise ValueError("{0:s} is not a permissible value for conceptSource".format(str(conceptSource)))
         else:
             # An attempt is being made to create a ConceptDefinition subclass, so create the subclass.
-            return super(ConceptCollection, cls).__new__(cls, fileConceptDefinitions)
+            return super(ConceptCollection, cls).__new__(cls)
+
+    def __init__(self, conceptDefinitions, conceptSource="FlatFile", isFileUploaded=True):
+        """Initialise the stream that the concepts will be parsed from.
+
+        :param conceptDefinitions:  The stream of concept definitions.
+        :type conceptDefinitions:   io.TextIOBase
+        :param conceptSource:       The type of concept definition source.
+        :type conceptSource:        str
+        :param isFileUploaded:      Whether the concept definitions come from an uploaded file or a text area.
+        :type isFileUploaded:       bool
+
+        """
+
+        self._conceptDefinitions = conceptDefinitions
+        self._sourceName = "uploaded file" if isFileUploaded else "text area"
+        self.errors = []  # The error messages generated while parsing the concept definitions.
 
-    def __init__(self, fileConceptDefinitions):
-        """Initialise the concepts and their definitions."""
+    def __iter__(self):
+        return self._parse()
 
-        # Record the concepts in the order that they appear in the concept definition file, and initialise the
-        # dictionary of concept definitions.
-        self._concepts = []  # The concepts recorded in the order that they appear in the concept definition file.
-        self._conceptDefinitions = defaultdict(lambda: {"Positive": {"Codes": [], "Terms": []},
-                                                        "Negative": {"Codes": [], "Terms": []}})
+    @abstractmethod
+    def _parse(self):
+        """Parse the concept definitions from the stream.
+
+        :return:    The name and definition of each concept in the stream.
+        :rtype:     generator
+
+        """
+
+        pass
 
     @staticmethod
     def validate_concept_file(uploadContents, fileFormat, isFileUploaded):
@@ -83,181 +127,371 @@ class ConceptCollection(metaclass=ABCMeta):
 
         """
 
-        # Validate the uploaded concept(s). The only real constraint on the the concept file is that at least one
-        # concept is defined in the correct format.
-        errors = []
-        if fileFormat == "json":
-            # Validate the input in JSON format.
-            try:
-                jsonContent = json.loads(uploadContents.read())
-                if not jsonContent:
-                    # There are no concepts defined in the JSON file.
-                    errors.append("The file of concepts must contain terms for at least one concept.")
-                else:
-                    # There are concepts defined, so make sure their definitions have the correct fields. This
-                    # means that each concept must have some positive terms/codes defined, and that each positive and
-                    # negative field must have either terms or codes defined for it.
-                    for i in jsonContent:
-                        # Check the positive and negative entries for this concept.
-                        try:
-                            positiveFields = jsonContent[i].get("Positive", None)
-                            negativeFields = jsonContent[i].get("Negative", None)
-                            if positiveFields is None:
-                                # No positive entries found for this concept.
-                                errors.append("No field named \"Positive\" found for concept {0:s}.".format(i))
-                            elif not {"Codes", "Terms"} & set(positiveFields):
-                                # The positive portion of the concept definition has neither terms nor codes defined.
-                                errors.append("No field named \"Codes\" or \"Terms\" found in the \"Positive\" field "
-                                              "of concept {0:s}.".format(i))
-                            if negativeFields and not {"Codes", "Terms"} & set(negativeFields):
-                                # The negative portion of the concept definition is present but has neither terms
-                                # nor codes defined.
-                                errors.append("No field named \"Codes\" or \"Terms\" found in the \"Negative\" field "
-                                              "of concept {0:s}.".format(i))
-                        except AttributeError:
-                            # The concept is not associated with a dictionary.
-                            errors.append("The value for concept {0:s} is not a dictionary.".format(i))
-            except ValueError as err:
-                # The JSON is not correctly formatted.
-                errors.append("Error in {0:s} JSON content - {1:s}."
-                              .format("uploaded file" if isFileUploaded else "text area", str(err)))
-        else:
-            # Validate non-JSON input with the assumption that it is therefore in the flat file format.
-            # The only requirements on a flat file is that the first non-whitespace character of the file is a #,
-            # that there is some non-whitespace content on that line following the # and that any time a line starts
-            # with ## it is followed by positive or negative.
-            line = uploadContents.readline()
-            lineNumber = 1
-            firstCharacterFound = None  # The first character in the file found.
-            while line:
-                # Loop until you find a character. We know there is contents in the file/text area due to the form
-                # validation carried out.
-                line = line.strip()
-                if line:
-                    # The line has non-whitespace characters on it.
-
-                    if line[0] != '%' and not firstCharacterFound:
-                        # The first non-whitespace character, that is not in a comment, is on this line.
-                        firstCharacterFound = line[0]
-
-                    if line[0] == '#':
-                        # Found a line with a concept name on it.
-                        if not line[1:].strip():
-                            # There was no content on the concept name line.
-                            errors.append("Line {0:d} begins with a # but has no concept name on it."
-                                          .format(lineNumber))
-                    elif line[0] == '$':
-                        # Found a control term. Check whether it has valid values.
-                        controlTerm = line[1:].strip().split()[0]
-                        if controlTerm.lower() not in ["positive", "negative", "search", "output"]:
-                            errors.append("The control term {0:s} on line {1:d} is not valid."
-                                          .format(controlTerm, lineNumber))
-                line = uploadContents.readline()
-                lineNumber += 1
-
-            if firstCharacterFound != '#':
-                # The first character in the file was not a '#'.
-                errors.append("The first non-whitespace character of the {0:s} must be a # not a '{1:s}'."
-                              .format("uploaded file" if isFileUploaded else "text area", firstCharacterFound))
-
-        return errors
+        # Validating the concepts is done by parsing them, with the parsed concepts being discarded as they're made.
+        collection = ConceptCollection(uploadContents, "json" if fileFormat == "json" else "flatfile", isFileUploaded)
+        for _ in collection:
+            pass
+        return collection.errors
+
+    @staticmethod
+    def write_concepts(concepts, fidOutput):
+        """Write parsed concepts to a file, in a form that can be streamed back in with the jsonlines source type.
+
+        The definitions of a concept that appears more than once are merged, with the merged concept written in the
+        position that the concept first appears in. To do this without holding every definition, the definitions are
+        first spooled to a temporary file, and then read back and merged one concept at a time. Only the names of the
+        concepts and the positions of their definitions in the temporary file are held in memory.
+
+        :param concepts:    The name and definition of each concept (e.g. a ConceptCollection being iterated over).
+        :type concepts:     iterable
+        :param fidOutput:   The file to write the concepts to, with one concept written per line.
+        :type fidOutput:    io.TextIOBase
+        :return:            The number of concepts written.
+        :rtype:             int
+
+        """
+
+        with tempfile.TemporaryFile() as fidSpool:
+            # Spool the definitions, recording where each concept's definitions are.
+            definitionOffsets = OrderedDict()  # The offsets of the definitions in the spool, keyed by concept name.
+            offset = 0
+            for concept, definition in concepts:
+                definitionOffsets.setdefault(concept, []).append(offset)
+                line = (json.dumps(definition, separators=(',', ':')) + '\n').encode("utf-8")
+                fidSpool.write(line)
+                offset += len(line)
+
+            # Merge the definitions of each concept.
+            for concept, offsets in definitionOffsets.items():
+                mergedDefinition = None
+                for i in offsets:
+                    fidSpool.seek(i)
+                    definition = json.loads(fidSpool.readline().decode("utf-8"))
+                    if mergedDefinition is None:
+                        mergedDefinition = definition
+                    else:
+                        for fieldName, fields in definition.items():
+                            for valueName, values in fields.items():
+                                mergedDefinition[fieldName][valueName].extend(values)
+                fidOutput.write(json.dumps((concept, mergedDefinition), separators=(',', ':')))
+                fidOutput.write('\n')
+        return len(definitionOffsets)
 
 
 class _FlatFileDefinitions(ConceptCollection):
     """Create a set of concept definitions from a flat file input source."""
 
-    def __init__(self, fileConceptDefinitions):
-        """Initialise the set of concept definitions from a flat file input source.
+    def _parse(self):
+        """Parse the concept definitions from a flat file input source one line at a time.
 
         Terms and codes for a concept can be specified as negative or positive terms. If there is no header for a set
         of terms/codes (i.e. it is not specified whether they are negative or positive), then they are assumed to
         be positive.
 
-        :param fileConceptDefinitions:  The location of the file containing the concept definitions.
-        :type fileConceptDefinitions:   str
-
-        """
+        The only requirements on a flat file is that the first non-whitespace character of the file (outside of
+        comments) is a #, that there is some non-whitespace content on each line starting with a # and that any line
+        starting with a $ is followed by a valid control term.
 
-        # Initialise the super class.
-        super(_FlatFileDefinitions).__init__(fileConceptDefinitions)
+        :return:    The name and definition of each concept in the stream.
+        :rtype:     generator
 
-        # Compile the needed regular expressions.
-        codeCleaner = re.compile("\.+$")  # Used to strip trailing full stops from codes.
+        """
 
-        # Extract concept definitions.
         currentConcept = None  # The current concept having its terms/codes extracted.
+        currentDefinition = None  # The definition of the current concept.
         currentSection = "Positive"  # Whether the current terms/codes being extracted are positive or negative terms.
-        with open(fileConceptDefinitions, 'r') as fidConceptDefinitions:
-            for line in fidConceptDefinitions:
-                line = line.strip()
-                if not line:
-                    # The line has no content on it.
-                    pass
-                elif line[0] == '#':
-                    # Found the start of a new concept.
-                    currentConcept = line[1:].strip()  # Record the new concept.
-                    if currentConcept not in self._concepts:
-                        # If the current concept is not in the list of concepts, then add it.
-                        self._concepts.append(currentConcept)
-                    currentSection = "Positive"  # Reset the default term/code type back to positive.
-                elif line[0] == "$":
-                    # Found a control term. Check whether it indicates positive or negative aspects of a concept.
-                    cleanedLine = line[1:].strip()
-                    if cleanedLine.lower() == "positive":
-                        currentSection = "Positive"
-                    elif cleanedLine.lower() == "negative":
-                        currentSection = "Negative"
-                elif line[0] == '>':
-                    # Found a concept defining code.
-                    code = line[1:].strip()
-                    # Clean the code. Remove all trailing full stops.
-                    code = codeCleaner.sub('', code)
-                    self._conceptDefinitions[currentConcept][currentSection]["Codes"].append(code)
-                elif line[0] == '%':
-                    # Found a comment line.
-                    pass
+        firstCharacterFound = None  # The first character in the file found.
+        for lineNumber, line in enumerate(self._conceptDefinitions, 1):
+            line = line.strip()
+            if not line or line[0] == '%':
+                # The line has no content on it or is a comment.
+                continue
+
+            if firstCharacterFound is None:
+                # The first non-whitespace character, that is not in a comment, is on this line.
+                firstCharacterFound = line[0]
+                if firstCharacterFound != '#':
+                    # The first character in the file was not a '#'.
+                    self.errors.append("The first non-whitespace character of the {0:s} must be a # not a '{1:s}'."
+                                       .format(self._sourceName, firstCharacterFound))
+
+            if line[0] == '#':
+                # Found the start of a new concept, so the previous concept is complete.
+                if currentDefinition is not None:
+                    yield currentConcept, _clean_definition(currentDefinition)
+                currentConcept = line[1:].strip()
+                currentDefinition = None
+                currentSection = "Positive"  # Reset the default term/code type back to positive.
+                if currentConcept:
+                    currentDefinition = {"Positive": {"Codes": [], "Terms": []},
+                                         "Negative": {"Codes": [], "Terms": []}}
                 else:
-                    # Found a concept defining term.
-                    cleanTerm = cleaners.term_cleaner(line)  # Remove excess whitespace from the term.
-                    self._conceptDefinitions[currentConcept][currentSection]["Terms"].append(cleanTerm)
+                    # There was no content on the concept name line, so the terms/codes that follow are ignored.
+                    self.errors.append("Line {0:d} begins with a # but has no concept name on it.".format(lineNumber))
+            elif line[0] == '$':
+                # Found a control term. Check whether it has a valid value and whether it indicates positive or
+                # negative aspects of a concept.
+                controlTerm = (line[1:].split() or [''])[0]
+                if controlTerm.lower() not in _CONTROL_TERMS:
+                    self.errors.append("The control term {0:s} on line {1:d} is not valid."
+                                       .format(controlTerm, lineNumber))
+                elif controlTerm.lower() in ("positive", "negative"):
+                    currentSection = controlTerm.capitalize()
+            elif currentDefinition is None:
+                # Found a code or term outside of a (valid) concept.
+                pass
+            elif line[0] == '>':
+                # Found a concept defining code.
+                currentDefinition[currentSection]["Codes"].append(line[1:].strip())
+            else:
+                # Found a concept defining term.
+                currentDefinition[currentSection]["Terms"].append(line)
+
+        # Yield the final concept.
+        if currentDefinition is not None:
+            yield currentConcept, _clean_definition(currentDefinition)
+        elif firstCharacterFound is None:
+            # There are no concepts defined in the file.
+            self.errors.append("The file of concepts must contain terms for at least one concept.")
 
 
 class _JSONDefinitions(ConceptCollection):
     """Create a set of concept definitions from a JSON input source."""
 
-    def __init__(self, fileConceptDefinitions):
-        """Initialise the set of concept definitions from a JSON input source.
+    def _parse(self):
+        """Parse the concept definitions from a JSON input source one concept at a time.
+
+        The JSON content must be an object mapping each concept's name to its definition. Each concept must have some
+        positive terms/codes defined, and each positive and negative field must have either terms or codes defined
+        for it, given as lists. Any term/code values that are dictionaries are converted to lists of their keys.
+
+        :return:    The name and definition of each concept in the stream.
+        :rtype:     generator
 
-        :param fileConceptDefinitions:  The location of the file containing the concept definitions.
-        :type fileConceptDefinitions:   str
+        """
+
+        conceptsFound = False  # Whether any concepts have been found in the JSON content.
+        try:
+            for concept, definition in _iterate_json_object(self._conceptDefinitions):
+                conceptsFound = True
+                if not isinstance(definition, dict):
+                    # The concept is not associated with a dictionary.
+                    self.errors.append("The value for concept {0:s} is not a dictionary.".format(concept))
+                    continue
+
+                # Check the positive and negative entries for this concept.
+                positiveFields = definition.get("Positive", None)
+                negativeFields = definition.get("Negative", None)
+                isValid = True
+                if positiveFields is None:
+                    # No positive entries found for this concept.
+                    self.errors.append("No field named \"Positive\" found for concept {0:s}.".format(concept))
+                    isValid = False
+                elif not isinstance(positiveFields, dict) or not {"Codes", "Terms"} & set(positiveFields):
+                    # The positive portion of the concept definition has neither terms nor codes defined.
+                    self.errors.append("No field named \"Codes\" or \"Terms\" found in the \"Positive\" field of "
+                                       "concept {0:s}.".format(concept))
+                    isValid = False
+                if negativeFields and (not isinstance(negativeFields, dict) or
+                                       not {"Codes", "Terms"} & set(negativeFields)):
+                    # The negative portion of the concept definition is present but has neither terms nor codes
+                    # defined.
+                    self.errors.append("No field named \"Codes\" or \"Terms\" found in the \"Negative\" field of "
+                                       "concept {0:s}.".format(concept))
+                    isValid = False
+                for fieldName, fields in (("Positive", positiveFields), ("Negative", negativeFields)):
+                    if isinstance(fields, dict):
+                        for valueName in ("Codes", "Terms"):
+                            if not isinstance(fields.get(valueName, []), (list, dict)):
+                                # The terms/codes are neither a list nor a dictionary.
+                                self.errors.append("The \"{0:s}\" in the \"{1:s}\" field of concept {2:s} are not a "
+                                                   "list.".format(valueName, fieldName, concept))
+                                isValid = False
+
+                if isValid:
+                    # Remove unnecessary fields.
+                    yield concept, _clean_definition({
+                        "Positive": {"Codes": list(positiveFields.get("Codes", [])),
+                                     "Terms": list(positiveFields.get("Terms", []))},
+                        "Negative": {"Codes": list((negativeFields or {}).get("Codes", [])),
+                                     "Terms": list((negativeFields or {}).get("Terms", []))}
+                    })
+        except ValueError as err:
+            # The JSON is not correctly formatted.
+            self.errors.append("Error in {0:s} JSON content - {1:s}.".format(self._sourceName, str(err)))
+        else:
+            if not conceptsFound:
+                # There are no concepts defined in the JSON content.
+                self.errors.append("The file of concepts must contain terms for at least one concept.")
+
+
+class _JSONLinesDefinitions(ConceptCollection):
+    """Create a set of concept definitions from concepts that were parsed, validated and saved by write_concepts."""
+
+    def _parse(self):
+        """Parse the concept definitions one line at a time.
+
+        :return:    The name and definition of each concept in the stream.
+        :rtype:     generator
 
         """
 
-        # Initialise the super class.
-        super(_JSONDefinitions).__init__(fileConceptDefinitions)
-
-        # Compile the needed regular expressions.
-        codeCleaner = re.compile("\.+$")  # Used to strip trailing full stops from codes.
-
-        # Load the definitions.
-        fidConceptDefinitions = open(fileConceptDefinitions, 'r')
-        jsonContent = json.load(fidConceptDefinitions)
-        fidConceptDefinitions.close()
-
-        # Remove unnecessary fields and convert any term/code values that are dictionaries to lists. The conversion
-        # just keeps the keys from the dictionary, but will result in an arbitrary ordering.
-        for concept in jsonContent:
-            # Iterate through concepts.
-            for field in jsonContent[concept]:
-                # Iterate through the level where positive and negative fields should be.
-                if field in ["Positive", "Negative"]:
-                    for definition in jsonContent[concept][field]:
-                        # Iterate through the level where term and code fields should be.
-                        if definition == "Codes":
-                            # Clean the codes to remove training spaces.
-                            self._conceptDefinitions[concept][field][definition] = \
-                                [codeCleaner.sub('', i) for i in jsonContent[concept][field][definition]]
-                        elif definition == "Terms":
-                            # Clean the terms to remove excess whitespace.
-                            self._conceptDefinitions[concept][field][definition] = \
-                                [cleaners.term_cleaner(i) for i in jsonContent[concept][field][definition]]
+        for line in self._conceptDefinitions:
+            if line.strip():
+                concept, definition = json.loads(line)
+                yield concept, definition
+
+
+class _JSONReader(object):
+    """Reader of the tokens and values of JSON content from a stream, holding only part of the stream in memory."""
+
+    def __init__(self, stream, chunkSize):
+        """Initialise the reader.
+
+        :param stream:      The stream of JSON content.
+        :type stream:       io.TextIOBase
+        :param chunkSize:   The minimum number of characters to read from the stream at a time.
+        :type chunkSize:    int
+
+        """
+
+        self._buffer = ''  # The part of the stream that has been read but not consumed.
+        self._chunkSize = chunkSize
+        self._decoder = json.JSONDecoder()
+        self._isExhausted = False  # Whether the end of the stream has been reached.
+        self._offset = 0  # The position in the stream of the start of the buffer.
+        self._position = 0  # The position in the buffer of the next character to consume.
+        self._stream = stream
+
+    @property
+    def location(self):
+        """The position in the stream of the next character to consume."""
+        return self._offset + self._position
+
+    def decode(self):
+        """Consume the next value.
+
+        :return:    The value.
+        :rtype:     object
+
+        """
+
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._position)
+            except ValueError as err:
+                # The value may be incomplete because it runs past the end of the buffer.
+                if not self._read_more():
+                    raise ValueError("Invalid value starting at char {0:d}: {1:s}".format(self.location, str(err)))
+            else:
+                # A number or literal ending at the end of the buffer may continue in the rest of the stream.
+                if end < len(self._buffer) or not self._read_more():
+                    self._position = end
+                    return value
+
+    def expect(self, character):
+        """Consume the next character, which must be a given one.
+
+        :param character:   The character to consume.
+        :type character:    str
+
+        """
+
+        if self.peek() != character:
+            raise ValueError("Expecting '{0:s}' (char {1:d})".format(character, self.location))
+        self._position += 1
+
+    def peek(self):
+        """Find the next character that is not whitespace, without consuming it.
+
+        :return:    The character, or an empty string at the end of the stream.
+        :rtype:     str
+
+        """
+
+        while True:
+            nextToken = _JSON_NON_WHITESPACE.search(self._buffer, self._position)
+            if nextToken:
+                self._position = nextToken.start()
+                return self._buffer[self._position]
+            self._position = len(self._buffer)
+            if not self._read_more():
+                return ''
+
+    def _read_more(self):
+        """Add the next chunk of the stream to the buffer, and discard the consumed part of the buffer.
+
+        The chunk read is at least as large as the unconsumed part of the buffer, so that a value spanning many chunks
+        is only decoded a logarithmic number of times.
+
+        :return:    Whether there was any more of the stream to read.
+        :rtype:     bool
+
+        """
+
+        if self._isExhausted:
+            return False
+        chunk = self._stream.read(max(self._chunkSize, len(self._buffer) - self._position))
+        if not chunk:
+            self._isExhausted = True
+            return False
+        self._offset += self._position
+        self._buffer = self._buffer[self._position:] + chunk
+        self._position = 0
+        return True
+
+
+def _clean_definition(definition):
+    """Clean the codes and terms of a concept definition.
+
+    Trailing full stops are removed from the codes, and excess whitespace is removed from the terms.
+
+    :param definition:  The concept definition to clean. This will be modified in place.
+    :type definition:   dict
+    :return:            The cleaned concept definition.
+    :rtype:             dict
+
+    """
+
+    for i in definition.values():
+        i["Codes"] = [_CODE_CLEANER.sub('', str(j)) for j in i["Codes"]]
+        i["Terms"] = cleaners.terms_cleaner([str(j) for j in i["Terms"]])
+    return definition
+
+
+def _iterate_json_object(stream, chunkSize=1 << 16):
+    """Generate the members of a JSON object, reading the object from a stream as the members are needed.
+
+    Only the member being decoded (and one chunk of the stream) is held in memory at once.
+
+    :param stream:      The stream containing the JSON object.
+    :type stream:       io.TextIOBase
+    :param chunkSize:   The minimum number of characters to read from the stream at a time.
+    :type chunkSize:    int
+    :return:            The (name, value) pair of each member of the object.
+    :rtype:             generator
+
+    """
+
+    reader = _JSONReader(stream, chunkSize)
+    reader.expect('{')
+    if reader.peek() == '}':
+        reader.expect('}')
+    else:
+        while True:
+            if reader.peek() != '"':
+                raise ValueError("Expecting property name enclosed in double quotes (char {0:d})"
+                                 .format(reader.location))
+            name = reader.decode()
+            reader.expect(':')
+            yield name, reader.decode()
+            if reader.peek() == ',':
+                reader.expect(',')
+            else:
+                reader.expect('}')
+                break
+
+    if reader.peek():
+        # There is more content after the object.
+        raise ValueError("Extra data (char {0:d})".format(reader.location))
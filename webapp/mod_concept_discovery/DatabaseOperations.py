@@ -1,7 +1,130 @@
 """Class for running concept related queries on a Neo4j database of clinical codes."""
 
-# 3rd party imports.
-import neo4j.v1 as neo
+# Python imports.
+from concurrent.futures import FIRST_COMPLETED, wait
+import functools
+import itertools
+import threading
+import time
+
+# User imports.
+from ..utilities import cleaners
+from ..utilities import connection_pool
+from ..utilities import hierarchy_numbering
+from ..utilities import result_cache
+from .InvertedIndex import phrase_pattern, tokenise
+
+
+# The code formats that can be queried. Node labels can't be supplied to Neo4j as query parameters, so these are the
+# only values that are ever written into the text of a query. All other values are passed as parameters, which keeps
+# the text of each query fixed and lets the database reuse its compiled plan.
+SUPPORTED_CODE_FORMATS = ("ReadV2", "CTV3", "SNOMED_CT")
+
+# Queries to find the codes with a description containing all of a set of phrases, keyed by code format. The candidate
+# descriptions of a set of phrases are found from the index of words (starting from the longest word of the phrases),
+# and only then checked for the phrases. Sets of phrases made up of nothing but stop words need a scan of the terms.
+_PHRASE_QUERIES = {
+    i: ("UNWIND {{bags}} AS bag "
+        "WITH bag WHERE bag.anchor IS NOT NULL "
+        "MATCH (:Word {{word: bag.anchor}}) <-[:Contains]- (t:{0:s}_Term) <-[:DescribedBy]- (c:{0:s}_Concept) "
+        "WHERE ALL(word IN bag.words WHERE word IN [path IN (t) -[:Contains]-> (:Word) | last(nodes(path)).word]) "
+        "AND ALL(pattern IN bag.patterns WHERE t.searchable =~ pattern) "
+        "RETURN bag.index AS index, COLLECT(DISTINCT c.id) AS codes "
+        "UNION ALL "
+        "UNWIND {{bags}} AS bag "
+        "WITH bag WHERE bag.anchor IS NULL "
+        "MATCH (c:{0:s}_Concept) -[:DescribedBy]-> (t:{0:s}_Term) "
+        "WHERE ALL(pattern IN bag.patterns WHERE t.searchable =~ pattern) "
+        "RETURN bag.index AS index, COLLECT(DISTINCT c.id) AS codes").format(i)
+    for i in SUPPORTED_CODE_FORMATS
+}
+
+# Queries to find the codes with a description containing all of a bag of words, keyed by code format.
+_WORD_QUERIES = {
+    i: ("UNWIND {{bags}} AS bag "
+        "MATCH (c:{0:s}_Concept) -[:DescribedBy]-> (t:{0:s}_Term) -[:Contains]-> (w:Word) "
+        "WHERE w.word IN bag.terms "
+        "WITH bag, c, t, COUNT(DISTINCT w) AS wordsFound "
+        "WHERE wordsFound = size(bag.terms) "
+        "RETURN bag.index AS index, COLLECT(DISTINCT c.id) AS codes").format(i)
+    for i in SUPPORTED_CODE_FORMATS
+}
+
+# Queries to find the descriptions of a list of codes, keyed by code format. Only one description is returned for each
+# code, which is its primary description (or any description of the code if it has no primary one).
+_DESCRIPTION_QUERIES = {
+    i: ("MATCH (c:{0:s}_Concept) -[r:DescribedBy]-> (t:{0:s}_Term) "
+        "WHERE c.id IN {{codes}} "
+        "WITH c, t ORDER BY r.type DESC "
+        "RETURN c.id AS code, head(COLLECT(t.pretty)) AS description").format(i)
+    for i in SUPPORTED_CODE_FORMATS
+}
+
+# The number of codes whose descriptions are fetched by each query, and the maximum number of those queries run at once
+# (each with its own session).
+_DESCRIPTION_CHUNK_SIZE = 1000
+_DESCRIPTION_CONCURRENCY = 4
+
+# The parts of the query that evaluates a concept definition, keyed by the part of the definition they evaluate. Each
+# part of the positive definition adds the concepts it matches to the list of matches, and is only included in the
+# query when the definition has something for it to match. The matches are then filtered by the negative definition,
+# so only the final codes are returned. Each part takes the code format as its first format argument. The descendants of
+# a prefix are found from the concepts' numbers in numbered code formats, and from the concepts' codes otherwise.
+_CONCEPT_QUERY_PARTS = {
+    "start": "WITH [] AS matches ",
+    "codes": ("OPTIONAL MATCH (c:{0:s}_Concept) "
+              "WHERE c.id IN {{positiveCodes}} "
+              "WITH matches, COLLECT(c) AS found "
+              "WITH matches + found AS matches "),
+    "prefixes": ("UNWIND {{positivePrefixes}} AS prefix "
+                 "OPTIONAL MATCH (c:{0:s}_Concept) "
+                 "WHERE c.id STARTS WITH prefix "
+                 "WITH matches, COLLECT(c) AS found "
+                 "WITH matches + found AS matches "),
+    "descendants": ("UNWIND {{positiveIntervals}} AS interval "
+                    "OPTIONAL MATCH (c:{0:s}_Concept) "
+                    "WHERE c.left >= interval.left AND c.left <= interval.right "
+                    "WITH matches, COLLECT(c) AS found "
+                    "WITH matches + found AS matches "),
+    "wordTerms": ("UNWIND {{positiveWordTerms}} AS term "
+                  "OPTIONAL MATCH (:Word {{word: term.anchor}}) <-[:Contains]- (t:{0:s}_Term) <-[:DescribedBy]- "
+                  "(c:{0:s}_Concept) "
+                  "WHERE ALL(word IN term.words WHERE word IN [path IN (t) -[:Contains]-> (:Word) | "
+                  "last(nodes(path)).word]) "
+                  "AND ALL(pattern IN term.patterns WHERE t.searchable =~ pattern) "
+                  "WITH matches, COLLECT(c) AS found "
+                  "WITH matches + found AS matches "),
+    "phraseTerms": ("UNWIND {{positivePhraseTerms}} AS term "
+                    "OPTIONAL MATCH (c:{0:s}_Concept) -[:DescribedBy]-> (t:{0:s}_Term) "
+                    "WHERE ALL(pattern IN term.patterns WHERE t.searchable =~ pattern) "
+                    "WITH matches, COLLECT(c) AS found "
+                    "WITH matches + found AS matches "),
+    "negativeCodes": ("UNWIND matches AS c "
+                      "WITH DISTINCT c "
+                      "WHERE NOT c.id IN {{negativeCodes}} "
+                      "AND NONE(prefix IN {{negativePrefixes}} WHERE c.id STARTS WITH prefix) "),
+    "negativeDescendants": ("UNWIND matches AS c "
+                            "WITH DISTINCT c "
+                            "WHERE NOT c.id IN {{negativeCodes}} "
+                            "AND NONE(interval IN {{negativeIntervals}} "
+                            "WHERE c.left >= interval.left AND c.left <= interval.right) "),
+    "negativeTerms": ("OPTIONAL MATCH (c) -[:DescribedBy]-> (t:{0:s}_Term) "
+                      "WITH c, t, [path IN (t) -[:Contains]-> (:Word) | last(nodes(path)).word] AS words "
+                      "WITH c, COLLECT(ANY(term IN {{negativeTerms}} WHERE ALL(word IN term.words WHERE word IN words) "
+                      "AND ALL(pattern IN term.patterns WHERE t.searchable =~ pattern))) AS excluded "
+                      "WHERE NOT true IN excluded "),
+    "end": "RETURN c.id AS code"
+}
+
+# Query to find the identifier of the ontology release loaded for each code format.
+_RELEASE_QUERY = "MATCH (r:Release) RETURN r.format AS format, r.id AS id"
+
+# The release identifiers last retrieved from the database. These are only refreshed every _RELEASE_CHECK_INTERVAL
+# seconds, so that a search doesn't cost an extra round trip to the database every time it is made.
+_RELEASE_CHECK_INTERVAL = 60
+_releaseIDs = {}
+_releaseCheckTime = None
+_releaseLock = threading.Lock()
 
 
 class DatabaseOperations(object):
@@ -10,6 +133,9 @@ class DatabaseOperations(object):
     def __init__(self, databaseAddress, username, password):
         """Initialise an object.
 
+        No connection is made here. Sessions are borrowed from the driver shared by the whole process each time a
+        query is run.
+
         :param databaseAddress:     The location of the database to connect to.
         :type databaseAddress:      str
         :param username:            The username used to access the database.
@@ -29,7 +155,7 @@ class DatabaseOperations(object):
         Each entry in quoted should contain a set of phrase strings, all of which must be found in a given
         code's description before the code will be returned for that entry.
 
-        The search is case insensitive.
+        The search is case insensitive, and phrases must match whole words (e.g. "type 2" does not match "type 20").
 
         :param phrases:     Sets of phrases. Each entry should contain a set of phrases, all of which must be found in
                                 a code's description before the code is deemed a match.
@@ -58,30 +184,7 @@ class DatabaseOperations(object):
 
         """
 
-        # Get access to the database.
-        driver = neo.GraphDatabase.driver(self._databaseAddress, auth=neo.basic_auth(self._username, self._password))
-        session = driver.session()
-
-        # Go through each set of phrases and select only the codes that contain all phrases in their description.
-        returnValue = []
-        for i in phrases:
-            uniquePhrases = set([j.lower() for j in i])  # Remove any duplicate phrases and make them all lowercase.
-            queryResults = {}
-            for j in codeFormats:
-                result = session.run("MATCH (c:{0:s}) -[:DescribedBy]-> (t:{1:s}) "
-                                     "WHERE ALL(phrase IN ['{1:s}'] WHERE t.searchable CONTAINS phrase) "
-                                     "RETURN c.code AS code"
-                                     .format("{0:s}_Concept".format(j), "{0:s}_Term".format(j),
-                                             "', '".join(uniquePhrases)))
-                queryResults[j] = {k["code"] for k in result}
-
-            # Record the codes with a description that contains all the words in the current bag of words.
-            returnValue.append(queryResults)
-
-        # Close the session.
-        session.close()
-
-        return returnValue
+        return _run_serially(*self._phrase_searches(phrases, codeFormats))
 
     def get_codes_from_words(self, words, codeFormats):
         """Get codes based on bags of words.
@@ -117,34 +220,26 @@ class DatabaseOperations(object):
 
         """
 
-        # Get access to the database.
-        driver = neo.GraphDatabase.driver(self._databaseAddress, auth=neo.basic_auth(self._username, self._password))
-        session = driver.session()
-
-        # Go through each bag of words and select only the codes that contain all words in the bag in their description.
-        returnValue = []
-        for i in words:
-            # Find all codes that have a relationship with every word in the bag of words. The method used here relies
-            # on each word having a unique node.
-            wordBag = {j.lower() for j in i}  # Remove any duplicate words and convert all words to lowercase.
-            queryResults = {}
-            for j in codeFormats:
-                result = session.run("MATCH (c:{0:s}) -[:DescribedBy]-> (:{1:s}) -[:Contains]-> (w:Word) "
-                                     "WHERE w.word IN ['{2:s}'] "
-                                     "WITH c.code AS code, COLLECT(w.word) AS words "
-                                     "WHERE length(words) = {3:d} "
-                                     "RETURN code"
-                                     .format("{0:s}_Concept".format(j), "{0:s}_Term".format(j),
-                                             "', '".join(wordBag), len(wordBag)))
-                queryResults[j] = {k["code"] for k in result}
-
-            # Record the codes with a description that contains all the words in the current bag of words.
-            returnValue.append(queryResults)
-
-        # Close the session.
-        session.close()
+        return _run_serially(*self._word_searches(words, codeFormats))
 
-        return returnValue
+    def get_concept_codes(self, definition, codeFormats):
+        """Get the codes matching a concept definition.
+
+        The whole definition is evaluated by one query per code format, with the codes matching the positive codes
+        and terms being filtered by the negative codes and terms in the database. Only the final codes are returned.
+
+        :param definition:  The definition of the concept, in the form described by ConceptCollection. See
+                                compile_concept for how the codes and terms are matched.
+        :type definition:   dict
+        :param codeFormats: The code formats to find codes from. Acceptable values are "ReadV2", "CTV3" and
+                                "SNOMED_CT".
+        :type codeFormats:  list
+        :return:            The codes matching the definition, keyed by code format.
+        :rtype:             dict
+
+        """
+
+        return _run_serially(*self._concept_searches(definition, codeFormats))
 
     def get_descriptions(self, codes, codeFormats):
         """Get the descriptions of a list of codes.
@@ -169,22 +264,447 @@ class DatabaseOperations(object):
 
         """
 
-        # Get access to the database.
-        driver = neo.GraphDatabase.driver(self._databaseAddress, auth=neo.basic_auth(self._username, self._password))
-        session = driver.session()
-
-        # Get the descriptions.
         descriptions = {i: {} for i in codes}
-        for i in codeFormats:
-            result = session.run("MATCH (c:{0:s}) -[r:DescribedBy]-> (t:{1:s}) "
-                                 "WHERE c.code IN ['{2:s}'] "
-                                 "RETURN c.code AS code, t.pretty AS description"
-                                 .format("{0:s}_Concept".format(i), "{0:s}_Term".format(i), "', '".join(codes)))
-            for j in result:
-                descriptions[j["code"]][i] = j["description"]
-
-        # Close the session.
-        session.close()
-
-        # Generate the return values.
+        for code, codeFormat, description in self.iter_descriptions(descriptions, codeFormats):
+            descriptions[code][codeFormat] = description
         return descriptions
+
+    def iter_descriptions(self, codes, codeFormats, chunkSize=_DESCRIPTION_CHUNK_SIZE,
+                          concurrency=_DESCRIPTION_CONCURRENCY):
+        """Generate the descriptions of a list of codes as they are fetched from the database.
+
+        The codes are split into chunks, and the descriptions of each chunk in each code format are fetched by their
+        own query. The queries are run concurrently in the worker threads shared by the process (see connection_pool),
+        each on a session borrowed from the shared driver, and the descriptions of each chunk are generated as soon as
+        its query finishes. Only a bounded number of chunks are fetched ahead of the caller, so the descriptions of a
+        long list of codes are never all held at once.
+
+        :param codes:       The codes to extract the descriptions for.
+        :type codes:        iterable
+        :param codeFormats: The code formats to look through when extracting descriptions. Acceptable values are
+                                "ReadV2", "CTV3" and "SNOMED_CT".
+        :type codeFormats:  list
+        :param chunkSize:   The number of codes whose descriptions are fetched by each query.
+        :type chunkSize:    int
+        :param concurrency: The maximum number of queries to run at once.
+        :type concurrency:  int
+        :return:            A (code, code format, description) tuple for each code with a description in each code
+                                format. Codes without a description in a code format are skipped. The tuples are not
+                                in any particular order.
+        :rtype:             generator
+
+        """
+
+        chunks = self._description_searches(codes, codeFormats, chunkSize)
+
+        executor = connection_pool.get_executor()
+        running = set()  # The futures of the chunks being fetched.
+
+        def start_chunks():
+            # Start fetching chunks until the maximum number are being fetched (or there are no more chunks).
+            running.update(executor.submit(i) for i in itertools.islice(chunks, concurrency - len(running)))
+
+        try:
+            start_chunks()
+            while running:
+                finished, notFinished = wait(running, return_when=FIRST_COMPLETED)
+                running.intersection_update(notFinished)
+
+                # Start the next chunks before handing back the descriptions, so that the database is kept busy
+                # while the caller deals with them.
+                start_chunks()
+                for i in finished:
+                    yield from i.result()
+        finally:
+            # Don't start the chunks still waiting if the caller stops early (or a query fails).
+            for i in running:
+                i.cancel()
+
+    def _batched_searches(self, queries, searchType, bags, codeFormats, bagParameters=None):
+        """Split a search for every bag of search terms into one search per code format.
+
+        :param queries:         The query to run for each code format (see _run_batched_query).
+        :type queries:          dict
+        :param searchType:      The type of search being performed. This is used to key the cached results.
+        :type searchType:       str
+        :param bags:            The bags of search terms. Each bag should be a list of lowercase search terms.
+        :type bags:             list
+        :param codeFormats:     The code formats to run the query against.
+        :type codeFormats:      list
+        :param bagParameters:   Function that converts the terms of a bag into the dictionary of parameters sent for
+                                    the bag in place of its terms. A value of None sends the terms as they are.
+        :type bagParameters:    function
+        :return:                The searches (each a function that takes no arguments and returns the codes matching
+                                    each bag in one code format), and a function that combines the results of the
+                                    searches into one dictionary per bag, in the order of the bags, mapping each code
+                                    format to the set of codes from that format that matched the bag.
+        :rtype:                 list, function
+
+        """
+
+        check_code_formats(codeFormats)
+        if not bags:
+            # There is nothing to search for, so don't bother the database.
+            return [], lambda results: []
+
+        searches = [functools.partial(self._run_batched_query, queries[i], searchType, bags, i, bagParameters)
+                    for i in codeFormats]
+        return searches, lambda results: [{i: j[k] for i, j in zip(codeFormats, results)} for k in range(len(bags))]
+
+    def _concept_searches(self, definition, codeFormats):
+        """Split the search for the codes matching a concept definition into one search per code format.
+
+        :param definition:  The definition of the concept, in the form described by ConceptCollection.
+        :type definition:   dict
+        :param codeFormats: The code formats to find codes from.
+        :type codeFormats:  list
+        :return:            The searches (each a function that takes no arguments and returns the codes matching the
+                                definition in one code format), and a function that combines the results of the
+                                searches into the codes matching the definition keyed by code format.
+        :rtype:             list, function
+
+        """
+
+        check_code_formats(codeFormats)
+        compiledDefinition = compile_concept(definition)
+        positive = compiledDefinition["Positive"]
+        if not (positive["Codes"] or positive["Prefixes"] or positive["Terms"]):
+            # Nothing can match the definition, so don't bother the database.
+            return [], lambda results: {i: set() for i in codeFormats}
+
+        definitionKey = repr(sorted(compiledDefinition.items()))
+        searches = [functools.partial(self._find_concept_codes, compiledDefinition, definitionKey, i)
+                    for i in codeFormats]
+        return searches, lambda results: dict(zip(codeFormats, results))
+
+    def _describe_chunk(self, codeFormat, codes):
+        """Fetch the descriptions of a chunk of codes from one code format.
+
+        :param codeFormat:  The code format to fetch the descriptions from.
+        :type codeFormat:   str
+        :param codes:       The codes to fetch the descriptions of.
+        :type codes:        list
+        :return:            A (code, code format, description) tuple for each code with a description.
+        :rtype:             list
+
+        """
+
+        # Borrow a session from the shared driver.
+        with connection_pool.session(self._databaseAddress, self._username, self._password) as session:
+            return [(i["code"], codeFormat, i["description"])
+                    for i in session.run(_DESCRIPTION_QUERIES[codeFormat], {"codes": codes})]
+
+    def _description_searches(self, codes, codeFormats, chunkSize=_DESCRIPTION_CHUNK_SIZE):
+        """Split the fetching of the descriptions of a list of codes into one search per chunk of codes and code format.
+
+        :param codes:       The codes to fetch the descriptions of.
+        :type codes:        iterable
+        :param codeFormats: The code formats to fetch the descriptions from.
+        :type codeFormats:  list
+        :param chunkSize:   The number of codes whose descriptions are fetched by each search.
+        :type chunkSize:    int
+        :return:            The searches, each a function that takes no arguments and returns the result of
+                                _describe_chunk for its chunk. The searches are made as they are needed, so that they
+                                can be started a few at a time.
+        :rtype:             generator
+
+        """
+
+        check_code_formats(codeFormats)
+        codes = list(codes)
+        return (functools.partial(self._describe_chunk, i, codes[j:j + chunkSize])
+                for i in codeFormats for j in range(0, len(codes), chunkSize))
+
+    def _find_concept_codes(self, compiledDefinition, definitionKey, codeFormat):
+        """Find the codes from one code format that match a compiled concept definition.
+
+        The result is looked up in the result cache first, and the database is only queried when there is no cached
+        result for the currently loaded release of the code format. The cache is bypassed when the database has no
+        release recorded for the code format, as results from different loads of it can't then be told apart.
+
+        :param compiledDefinition:  The definition of the concept, as compiled by compile_concept.
+        :type compiledDefinition:   dict
+        :param definitionKey:       The representation of the compiled definition used to key the cached results.
+        :type definitionKey:        str
+        :param codeFormat:          The code format to find codes from.
+        :type codeFormat:           str
+        :return:                    The codes matching the definition.
+        :rtype:                     set
+
+        """
+
+        cache = result_cache.get_cache()
+
+        # Borrow a session from the shared driver.
+        with connection_pool.session(self._databaseAddress, self._username, self._password) as session:
+            # Use the cached result if there is one.
+            releaseID = _get_release_ids(session).get(codeFormat)
+            key = ("concept", definitionKey, codeFormat, releaseID)
+            cachedResult = {} if releaseID is None else cache.get_many([key])
+            if key in cachedResult:
+                return set(cachedResult[key])
+
+            query, parameters = _build_concept_query(compiledDefinition, codeFormat)
+            codes = {i["code"] for i in session.run(query, parameters)}
+            if releaseID is not None:
+                cache.set_many({key: frozenset(codes)})
+        return codes
+
+    def _phrase_searches(self, phrases, codeFormats):
+        """Split the search for the codes matching sets of phrases into one search per code format.
+
+        :param phrases:     Sets of phrases, as given to get_codes_from_phrases.
+        :type phrases:      list
+        :param codeFormats: The code formats to look through.
+        :type codeFormats:  list
+        :return:            The searches and the function that combines their results (see _batched_searches).
+        :rtype:             list, function
+
+        """
+
+        # Remove any duplicate phrases and make them all lowercase.
+        bags = [sorted({j.lower() for j in i}) for i in phrases]
+
+        # Select only the codes that contain all phrases in a set in one of their descriptions. Phrases are matched as
+        # whole tokens, so the descriptions can be narrowed down to those containing the words of the phrases first.
+        return self._batched_searches(_PHRASE_QUERIES, "phrases", bags, codeFormats,
+                                      lambda phraseBag: _term_search([], phraseBag))
+
+    def _run_batched_query(self, query, searchType, bags, codeFormat, bagParameters=None):
+        """Run a query for every bag of search terms at once, with one round trip to the database.
+
+        Results are looked up in the result cache first, and only the bags without a cached result for the currently
+        loaded release of the code format are sent to the database. The cache is bypassed when the database has no
+        release recorded for the code format, as results from different loads of it can't then be told apart.
+
+        :param query:           The query to run. It should take the bags as a parameter named bags, with each bag
+                                    being a dictionary containing its index and its terms (or the parameters given by
+                                    bagParameters), and return the index of each bag along with the codes that matched
+                                    it.
+        :type query:            str
+        :param searchType:      The type of search being performed. This is used to key the cached results.
+        :type searchType:       str
+        :param bags:            The bags of search terms. Each bag should be a list of lowercase search terms.
+        :type bags:             list
+        :param codeFormat:      The code format the query searches.
+        :type codeFormat:       str
+        :param bagParameters:   Function that converts the terms of a bag into the dictionary of parameters sent for
+                                    the bag in place of its terms. A value of None sends the terms as they are.
+        :type bagParameters:    function
+        :return:                The set of codes that matched each bag, in the order of the bags.
+        :rtype:                 list
+
+        """
+
+        cache = result_cache.get_cache()
+
+        # Borrow a session from the shared driver.
+        with connection_pool.session(self._databaseAddress, self._username, self._password) as session:
+            # Fill in the results that have already been cached.
+            releaseID = _get_release_ids(session).get(codeFormat)
+            keys = [result_cache.make_key(searchType, i, codeFormat, releaseID) for i in bags]
+            cachedResults = {} if releaseID is None else cache.get_many(keys)
+            returnValue = [set(cachedResults[i]) if i in cachedResults else set() for i in keys]
+
+            # Search for the remaining bags, only sending each distinct bag once.
+            bagsToSearch = {}
+            for i, key in enumerate(keys):
+                if key not in cachedResults and key not in bagsToSearch:
+                    bagsToSearch[key] = dict(bagParameters(bags[i]) if bagParameters else {"terms": bags[i]}, index=i)
+            if not bagsToSearch:
+                return returnValue
+            result = session.run(query, {"bags": list(bagsToSearch.values())})
+            foundResults = {i: frozenset() for i in bagsToSearch}
+            for i in result:
+                foundResults[keys[i["index"]]] = frozenset(i["codes"])
+            if releaseID is not None:
+                cache.set_many(foundResults)
+
+        # Record the results of the search for every bag that needed it.
+        for i, key in enumerate(keys):
+            if key in foundResults:
+                returnValue[i] = set(foundResults[key])
+        return returnValue
+
+    def _word_searches(self, words, codeFormats):
+        """Split the search for the codes matching bags of words into one search per code format.
+
+        :param words:       Bags of words, as given to get_codes_from_words.
+        :type words:        list
+        :param codeFormats: The code formats to look through.
+        :type codeFormats:  list
+        :return:            The searches and the function that combines their results (see _batched_searches).
+        :rtype:             list, function
+
+        """
+
+        # Remove any duplicate words and convert all words to lowercase.
+        bags = [sorted({j.lower() for j in i}) for i in words]
+
+        # Find all codes with a description that has a relationship with every word in the bag of words. The method
+        # used here relies on each word having a unique node.
+        return self._batched_searches(_WORD_QUERIES, "words", bags, codeFormats)
+
+
+def check_code_formats(codeFormats):
+    """Ensure that only supported code formats are queried.
+
+    :param codeFormats: The code formats to check.
+    :type codeFormats:  list
+
+    """
+
+    unsupportedFormats = [i for i in codeFormats if i not in SUPPORTED_CODE_FORMATS]
+    if unsupportedFormats:
+        raise ValueError("{0:s} is not a supported code format.".format(str(unsupportedFormats[0])))
+
+
+def compile_concept(definition):
+    """Prepare a concept definition for evaluation.
+
+    Codes ending in a % are treated as prefixes, and match every code starting with the rest of the code (e.g. C10%
+    matches C10, C10E and C108.). In a numbered code format (see hierarchy_numbering) these are the code and all its
+    descendants, which are found as a range of the concepts' numbers. Each term is split into the words and quoted
+    phrases that a description must contain in order to match it (see cleaners.split_term), and terms with neither are
+    dropped as they can't match anything.
+
+    :param definition:  The definition of the concept, in the form described by ConceptCollection. Missing fields are
+                            treated as empty.
+    :type definition:   dict
+    :return:            The compiled definition. For both the Positive and Negative fields, this holds the sorted
+                            Codes and Prefixes, and the sorted Terms as dictionaries of their words and phrases.
+    :rtype:             dict
+
+    """
+
+    compiledDefinition = {}
+    for i in ("Positive", "Negative"):
+        fields = definition.get(i) or {}
+        codes = fields.get("Codes", [])
+        terms = set()
+        for words, phrases in (cleaners.split_term(j) for j in fields.get("Terms", [])):
+            if words or phrases:
+                terms.add((tuple(sorted(set(words))), tuple(sorted(set(phrases)))))
+        compiledDefinition[i] = {
+            "Codes": sorted({j for j in codes if not j.endswith('%')}),
+            "Prefixes": sorted({j.rstrip('%') for j in codes if j.endswith('%')}),
+            "Terms": [{"words": list(j), "phrases": list(k)} for j, k in sorted(terms)]
+        }
+    return compiledDefinition
+
+
+def _build_concept_query(compiledDefinition, codeFormat):
+    """Build the query that evaluates a compiled concept definition in one code format.
+
+    :param compiledDefinition:  The definition to evaluate, as returned by compile_concept.
+    :type compiledDefinition:   dict
+    :param codeFormat:          The code format to find codes from.
+    :type codeFormat:           str
+    :return:                    The text of the query and its parameters.
+    :rtype:                     str, dict
+
+    """
+
+    positive = compiledDefinition["Positive"]
+    negative = compiledDefinition["Negative"]
+
+    # Terms with words (including the words of their phrases) are found from the index of words, while terms with
+    # only stop words in their phrases need a scan of the terms.
+    positiveTerms = [_term_search(i["words"], i["phrases"]) for i in positive["Terms"]]
+    wordTerms = [i for i in positiveTerms if i["anchor"] is not None]
+    phraseTerms = [i for i in positiveTerms if i["anchor"] is None]
+    parameters = {
+        "positiveCodes": positive["Codes"],
+        "positiveWordTerms": wordTerms,
+        "positivePhraseTerms": phraseTerms,
+        "negativeCodes": negative["Codes"],
+        "negativeTerms": [_term_search(i["words"], i["phrases"]) for i in negative["Terms"]]
+    }
+
+    # The prefixes of a numbered code format are converted to the intervals of numbers holding their descendants.
+    # Prefixes that no code can start with are dropped, as they can't match anything.
+    if codeFormat in hierarchy_numbering.NUMBERED_CODE_FORMATS:
+        prefixPart, negativePart = "descendants", "negativeDescendants"
+        for i, j in [("positiveIntervals", positive["Prefixes"]), ("negativeIntervals", negative["Prefixes"])]:
+            intervals = (hierarchy_numbering.number_code(codeFormat, k) for k in j)
+            parameters[i] = [{"left": k[0], "right": k[1]} for k in intervals if k]
+        positivePrefixes = parameters["positiveIntervals"]
+    else:
+        prefixPart, negativePart = "prefixes", "negativeCodes"
+        parameters["positivePrefixes"] = positivePrefixes = positive["Prefixes"]
+        parameters["negativePrefixes"] = negative["Prefixes"]
+
+    # Only include the parts of the positive definition that have something to match.
+    queryParts = ["start"]
+    queryParts.extend(i for i, j in [("codes", positive["Codes"]), (prefixPart, positivePrefixes),
+                                     ("wordTerms", wordTerms), ("phraseTerms", phraseTerms)] if j)
+    queryParts.append(negativePart)
+    if negative["Terms"]:
+        queryParts.append("negativeTerms")
+    queryParts.append("end")
+    return ''.join(_CONCEPT_QUERY_PARTS[i] for i in queryParts).format(codeFormat), parameters
+
+
+def _term_search(words, phrases):
+    """Get the parameters used to find the terms containing a set of words and phrases.
+
+    A description only contains a phrase when the phrase's tokens are consecutive tokens of the description, so every
+    token of the phrase that isn't a stop word is one of the description's words. The words of the phrases are therefore
+    searched for along with the other words, which lets the candidate terms be found from the index of words, and only
+    the candidates are checked for the phrases (using the regular expressions given by InvertedIndex.phrase_pattern).
+
+    :param words:   The words to search for. These are expected to be cleaned (see cleaners.tokenise_description).
+    :type words:    list
+    :param phrases: The phrases to search for. These are expected to be lowercase.
+    :type phrases:  list
+    :return:        The longest word to start the search from (None if there are no words), the sorted words and the
+                        regular expressions of the phrases.
+    :rtype:         dict
+
+    """
+
+    allWords = set(words)
+    patterns = []
+    for i in phrases:
+        allWords.update(cleaners.input_word_cleaner(tokenise(i)))
+        pattern = phrase_pattern(i)
+        if pattern is not None:
+            patterns.append(pattern)
+    return {"anchor": max(sorted(allWords), key=len, default=None), "words": sorted(allWords),
+            "patterns": sorted(set(patterns))}
+
+
+def _get_release_ids(session):
+    """Get the identifiers of the ontology releases loaded into the database.
+
+    :param session: The session to use to query the database if the identifiers need refreshing.
+    :type session:  neo4j.v1.Session
+    :return:        A mapping from code format to the identifier of the release loaded for it. Formats without a
+                        recorded release are not included.
+    :rtype:         dict
+
+    """
+
+    global _releaseIDs, _releaseCheckTime
+    with _releaseLock:
+        currentTime = time.time()
+        if _releaseCheckTime is None or currentTime - _releaseCheckTime > _RELEASE_CHECK_INTERVAL:
+            _releaseIDs = {i["format"]: i["id"] for i in session.run(_RELEASE_QUERY)}
+            _releaseCheckTime = currentTime
+        return _releaseIDs
+
+
+def _run_serially(searches, combine):
+    """Run a set of searches one after the other, and combine their results.
+
+    :param searches:    The searches to run, each a function that takes no arguments.
+    :type searches:     list
+    :param combine:     The function that combines the list of the results of the searches (in the order of the
+                            searches) into the final result.
+    :type combine:      function
+    :return:            The combined result of the searches.
+    :rtype:             object
+
+    """
+
+    return combine([i() for i in searches])
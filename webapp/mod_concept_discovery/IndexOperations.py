@@ -0,0 +1,169 @@
+"""Class for running concept related queries on in-memory inverted indices of clinical code hierarchies."""
+
+# User imports.
+from .DatabaseOperations import check_code_formats, compile_concept
+from .InvertedIndex import InvertedIndex
+
+
+class IndexOperations(object):
+    """Class defining the same high level queries as DatabaseOperations, answered without a round trip to Neo4j."""
+
+    def __init__(self, indices):
+        """Initialise an object.
+
+        :param indices:     The inverted index of each code format that can be searched. Code formats without an index
+                                are treated as containing no codes.
+        :type indices:      dict
+
+        """
+
+        self._indices = indices
+
+    @classmethod
+    def from_files(cls, ontologyFiles):
+        """Open (or build) the inverted indices of a set of code formats.
+
+        Index files (with a .idx extension) written by InvertedIndex.write are memory mapped, which is fast and lets
+        all processes on a machine share one copy of each index. Any other file is treated as an ontology data file,
+        and is parsed in order to build the index in memory. Read V2 data files and directories of CTV3 data files can
+        be parsed.
+
+        :param ontologyFiles:   The location of the index or data file for each code format to search.
+        :type ontologyFiles:    dict
+        :return:                An object that searches the indices.
+        :rtype:                 IndexOperations
+
+        """
+
+        indices = {}
+        for i in ontologyFiles:
+            if ontologyFiles[i].endswith(".idx"):
+                indices[i] = InvertedIndex.load(ontologyFiles[i])
+            elif i == "ReadV2":
+                # Import here, as the parsing code is only needed by processes that build indices from the data.
+                from database_setup import ontology_parsing
+                concepts, terms, words, relationships = ontology_parsing.parse_ReadV2(ontologyFiles[i])
+                indices[i] = InvertedIndex.from_hierarchy(concepts, terms, relationships)
+            elif i == "CTV3":
+                from database_setup import ontology_parsing
+                concepts, terms, words, relationships = ontology_parsing.parse_CTV3(ontologyFiles[i])
+                indices[i] = InvertedIndex.from_hierarchy(concepts, terms, relationships)
+            else:
+                raise ValueError("Indices can not be built for the {0:s} code format.".format(i))
+        return cls(indices)
+
+    def get_codes_from_phrases(self, phrases, codeFormats):
+        """Get the codes that have a description where all the supplied quoted phrases match.
+
+        See DatabaseOperations.get_codes_from_phrases for the format of the inputs and outputs.
+
+        :param phrases:     Sets of phrases. Each entry should contain a set of phrases, all of which must be found in
+                                a code's description before the code is deemed a match.
+        :type phrases:      list
+        :param codeFormats: The code formats to look through.
+        :type codeFormats:  list
+        :return:            One dictionary per entry in phrases, mapping each code format to the set of matching codes.
+        :rtype:             list
+
+        """
+
+        check_code_formats(codeFormats)
+        return [
+            {j: self._indices[j].get_codes_from_phrases(sorted({k.lower() for k in i})) if j in self._indices else set()
+             for j in codeFormats}
+            for i in phrases
+        ]
+
+    def get_codes_from_words(self, words, codeFormats):
+        """Get codes based on bags of words.
+
+        See DatabaseOperations.get_codes_from_words for the format of the inputs and outputs.
+
+        :param words:       The words to find codes for. Each entry should contain a list of words, all of which must be
+                                present in a code's description before the code is deemed to be a match.
+        :type words:        list
+        :param codeFormats: The code formats to look through.
+        :type codeFormats:  list
+        :return:            One dictionary per entry in words, mapping each code format to the set of matching codes.
+        :rtype:             list
+
+        """
+
+        check_code_formats(codeFormats)
+        return [
+            {j: self._indices[j].get_codes_from_words([k.lower() for k in i]) if j in self._indices else set()
+             for j in codeFormats}
+            for i in words
+        ]
+
+    def get_concept_codes(self, definition, codeFormats):
+        """Get the codes matching a concept definition.
+
+        See DatabaseOperations.get_concept_codes for the format of the inputs and outputs.
+
+        :param definition:  The definition of the concept, in the form described by ConceptCollection.
+        :type definition:   dict
+        :param codeFormats: The code formats to find codes from.
+        :type codeFormats:  list
+        :return:            The codes matching the definition, keyed by code format.
+        :rtype:             dict
+
+        """
+
+        check_code_formats(codeFormats)
+        compiledDefinition = compile_concept(definition)
+        return {
+            i: self._indices[i].get_codes_from_definition(compiledDefinition) if i in self._indices else set()
+            for i in codeFormats
+        }
+
+    def get_descriptions(self, codes, codeFormats):
+        """Get the descriptions of a list of codes.
+
+        See DatabaseOperations.get_descriptions for the format of the inputs and outputs. The primary description of
+        each code is returned.
+
+        :param codes:       The codes to extract the descriptions for.
+        :type codes:        list
+        :param codeFormats: The code formats to look through when extracting descriptions.
+        :type codeFormats:  list
+        :return:            The descriptions of the input codes, keyed by code and then code format.
+        :rtype:             dict
+
+        """
+
+        descriptions = {i: {} for i in codes}
+        for code, codeFormat, description in self.iter_descriptions(descriptions, codeFormats):
+            descriptions[code][codeFormat] = description
+        return descriptions
+
+    def iter_descriptions(self, codes, codeFormats, chunkSize=None, concurrency=None):
+        """Generate the descriptions of a list of codes one at a time.
+
+        See DatabaseOperations.iter_descriptions for the format of the inputs and outputs. The descriptions are looked
+        up in memory, so there are no queries to split into chunks or run concurrently, and the chunk size and
+        concurrency are ignored. The primary description of each code is generated.
+
+        :param codes:       The codes to extract the descriptions for.
+        :type codes:        iterable
+        :param codeFormats: The code formats to look through when extracting descriptions.
+        :type codeFormats:  list
+        :param chunkSize:   Ignored.
+        :type chunkSize:    int
+        :param concurrency: Ignored.
+        :type concurrency:  int
+        :return:            A (code, code format, description) tuple for each code with a description in each code
+                                format.
+        :rtype:             generator
+
+        """
+
+        check_code_formats(codeFormats)
+        codes = list(codes)
+        for i in codeFormats:
+            if i not in self._indices:
+                continue
+            for j in codes:
+                description = self._indices[i].get_description(j)
+                if description is not None:
+                    yield j, i, description
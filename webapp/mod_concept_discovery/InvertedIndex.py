@@ -0,0 +1,626 @@
+"""Class for an inverted index of the descriptions of the concepts in a code hierarchy."""
+
+# Python imports.
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+import mmap
+import os
+import re
+import struct
+import sys
+
+
+# Punctuation stripped from the ends of the tokens used for phrase matching.
+_TOKEN_PUNCTUATION = ".,-+*%&:;?!'=\"[]{}()"
+
+# Used to remove a bracketed prefix from a description (e.g. the [V] in [V]XXX) in the same way as the parser does.
+_BRACKET_FINDER = re.compile("(\[.*?\])\s*")
+
+# A regular expression character class matching the token punctuation. Every character is escaped, so that the class
+# means the same to Python and to Java (and so Neo4j).
+_PUNCTUATION_CLASS = "[{0:s}]".format(''.join('\\' + i for i in _TOKEN_PUNCTUATION))
+
+# The layout of an index file. The file starts with a header recording the format version, the byte order the arrays
+# were written in, the release of the hierarchy that was indexed and the number of sections. A directory of the
+# sections follows, giving each section's name, offset and size in bytes. Each section is either a flat array of
+# integers or the UTF-8 data of a table of strings (whose boundaries are given by an accompanying offsets section).
+# Sections are 8 byte aligned so that they can be used in place once the file is memory mapped.
+_FILE_MAGIC = b"CCWINDEX"
+_FILE_VERSION = 1
+_HEADER = struct.Struct("<8sIBxxxII")  # Magic, version, is big endian, release ID length, number of sections.
+_DIRECTORY_ENTRY = struct.Struct("<24sQQ")  # Section name, offset and size.
+_INTEGER_SECTIONS = {
+    "codes.offsets": 'q', "descriptions.offsets": 'q', "termConcepts": 'i', "primaryTerms": 'i',
+    "words.offsets": 'q', "wordOffsets": 'q', "wordTerms": 'i',
+    "tokens.offsets": 'q', "tokenOffsets": 'q', "tokenTerms": 'i', "positionOffsets": 'q', "positions": 'i'
+}
+_STRING_SECTIONS = ("codes", "descriptions", "words", "tokens")
+
+
+class InvertedIndex(object):
+    """Inverted index of the words and phrases found in the descriptions of one code hierarchy.
+
+    Terms and concepts are identified by their position in sorted lists of their IDs, so that every posting list can be
+    held as a slice of a flat array of integers. Two sets of postings are kept:
+        word postings       - mapping from each (cleaned) word to the terms that contain it, in the same way as the
+                                Contains relationships in the database
+        positional postings - mapping from each token of the lowercase descriptions (stop words included) to the terms
+                                that contain it and the positions it occurs at within each of those terms
+
+    An index can be built in memory from the output of a hierarchy parser, or written to a file and memory mapped by
+    any number of processes, which then share a single copy of it through the operating system's page cache.
+
+    """
+
+    def __init__(self, sections, releaseID=None, mappedFile=None):
+        """Initialise the index from its component arrays.
+
+        Use from_hierarchy or load to create an index rather than calling this directly.
+
+        :param sections:    The arrays making up the index, keyed by the names in _INTEGER_SECTIONS and
+                                _STRING_SECTIONS. The string sections are sorted sequences of strings (with the
+                                exception of descriptions, which is ordered by term).
+        :type sections:     dict
+        :param releaseID:   The identifier of the release of the hierarchy that was indexed.
+        :type releaseID:    str
+        :param mappedFile:  The memory map that the sections are views of, if they came from a file.
+        :type mappedFile:   mmap.mmap
+
+        """
+
+        self.releaseID = releaseID
+        self._mappedFile = mappedFile  # Hold a reference to the map so that it stays open while the index is in use.
+        self._codes = sections["codes"]
+        self._termDescriptions = sections["descriptions"]
+        self._termConcepts = sections["termConcepts"]
+        self._primaryTerms = sections["primaryTerms"]
+        self._words = sections["words"]
+        self._wordOffsets = sections["wordOffsets"]
+        self._wordTerms = sections["wordTerms"]
+        self._tokens = sections["tokens"]
+        self._tokenOffsets = sections["tokenOffsets"]
+        self._tokenTerms = sections["tokenTerms"]
+        self._positionOffsets = sections["positionOffsets"]
+        self._positions = sections["positions"]
+
+    @classmethod
+    def from_hierarchy(cls, concepts, terms, relationships, releaseID=None):
+        """Build an index in memory from the output of a hierarchy parser (e.g. ontology_parsing.parse_ReadV2).
+
+        :param concepts:        The concepts of the hierarchy, keyed by concept ID.
+        :type concepts:         dict
+        :param terms:           The terms of the hierarchy (ontology_records.Term records), keyed by term ID.
+        :type terms:            dict
+        :param relationships:   The relationships of the hierarchy (ontology_records.Relationship records).
+        :type relationships:    dict
+        :param releaseID:       The identifier of the release of the hierarchy being indexed.
+        :type releaseID:        str
+        :return:                The index.
+        :rtype:                 InvertedIndex
+
+        """
+
+        # Assign integer IDs to the concepts and terms.
+        codes = sorted(concepts)
+        conceptIndices = {j: i for i, j in enumerate(codes)}
+        termIDs = sorted(terms)
+        termIndices = {j: i for i, j in enumerate(termIDs)}
+
+        # Record the description of each term, and the concept that each term describes.
+        termDescriptions = []
+        searchableDescriptions = []
+        for i in termIDs:
+            termDescriptions.append(terms[i].pretty)
+            searchableDescriptions.append(terms[i].searchable)
+        termConcepts = array('i', [-1] * len(termIDs))
+        primaryTerms = array('i', [-1] * len(codes))
+
+        # Gather the word postings from the relationships between the terms and the words they contain.
+        wordPostings = defaultdict(set)
+        for i in relationships.values():
+            if i.label == "Contains":
+                wordPostings[i.target].add(termIndices[i.source])
+            elif i.label == "DescribedBy":
+                conceptIndex = conceptIndices[i.source]
+                termIndex = termIndices[i.target]
+                termConcepts[termIndex] = conceptIndex
+                if i.type == "true" or primaryTerms[conceptIndex] == -1:
+                    # Record the primary term of the concept (or any term until the primary one is found).
+                    primaryTerms[conceptIndex] = termIndex
+
+        # Flatten the word postings.
+        words = sorted(wordPostings)
+        wordOffsets = array('q', [0])
+        wordTerms = array('i')
+        for i in words:
+            wordTerms.extend(sorted(wordPostings[i]))
+            wordOffsets.append(len(wordTerms))
+
+        # Gather the positional postings from the searchable descriptions. As the terms are visited in order of their
+        # integer IDs, each token's list of terms ends up sorted.
+        tokenPostings = defaultdict(list)
+        for termIndex, description in enumerate(searchableDescriptions):
+            positions = defaultdict(list)
+            for position, token in enumerate(tokenise(description)):
+                positions[token].append(position)
+            for token in positions:
+                tokenPostings[token].append((termIndex, positions[token]))
+
+        # Flatten the positional postings.
+        tokens = sorted(tokenPostings)
+        tokenOffsets = array('q', [0])
+        tokenTerms = array('i')
+        positionOffsets = array('q', [0])
+        tokenPositions = array('i')
+        for i in tokens:
+            for termIndex, positions in tokenPostings[i]:
+                tokenTerms.append(termIndex)
+                tokenPositions.extend(positions)
+                positionOffsets.append(len(tokenPositions))
+            tokenOffsets.append(len(tokenTerms))
+
+        sections = {
+            "codes": codes, "descriptions": termDescriptions, "termConcepts": termConcepts,
+            "primaryTerms": primaryTerms, "words": words, "wordOffsets": wordOffsets, "wordTerms": wordTerms,
+            "tokens": tokens, "tokenOffsets": tokenOffsets, "tokenTerms": tokenTerms,
+            "positionOffsets": positionOffsets, "positions": tokenPositions
+        }
+        return cls(sections, releaseID)
+
+    @classmethod
+    def load(cls, fileIndex):
+        """Open an index file written by write.
+
+        The file is memory mapped rather than read, so opening it is fast regardless of its size. The index keeps the
+        file that was open when it was loaded, so a release written to the same location afterwards is only seen by
+        loading the file again (see search_backend.get_search_backend).
+
+        :param fileIndex:   The location of the index file.
+        :type fileIndex:    str
+        :return:            The index.
+        :rtype:             InvertedIndex
+
+        """
+
+        with open(fileIndex, "rb") as fidIndex:
+            mappedFile = mmap.mmap(fidIndex.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(mappedFile)
+
+        # Check the header.
+        magic, version, isBigEndian, releaseIDLength, numSections = _HEADER.unpack_from(buffer, 0)
+        if magic != _FILE_MAGIC:
+            raise ValueError("{0:s} is not an index file.".format(fileIndex))
+        if version != _FILE_VERSION:
+            raise ValueError("{0:s} is version {1:d} of the index format, but only version {2:d} is supported."
+                             .format(fileIndex, version, _FILE_VERSION))
+        if bool(isBigEndian) != (sys.byteorder == "big"):
+            raise ValueError("{0:s} was written on a machine with a different byte order.".format(fileIndex))
+        position = _HEADER.size
+        releaseID = bytes(buffer[position:position + releaseIDLength]).decode("utf-8") or None
+        position += releaseIDLength
+
+        # Create views of the sections.
+        rawSections = {}
+        for _ in range(numSections):
+            name, offset, size = _DIRECTORY_ENTRY.unpack_from(buffer, position)
+            position += _DIRECTORY_ENTRY.size
+            name = name.rstrip(b'\0').decode("utf-8")
+            section = buffer[offset:offset + size]
+            rawSections[name] = section.cast(_INTEGER_SECTIONS[name]) if name in _INTEGER_SECTIONS else section
+        sections = {i: rawSections[i] for i in _INTEGER_SECTIONS}
+        for i in _STRING_SECTIONS:
+            sections[i] = _StringTable(rawSections["{0:s}.offsets".format(i)], rawSections[i])
+
+        return cls(sections, releaseID, mappedFile)
+
+    def write(self, fileIndex):
+        """Write the index to a file that can be opened with load.
+
+        The file is written to a temporary location and then moved into place, so that processes with the old file
+        mapped keep a consistent view of it. Those processes carry on searching the old release until they load the
+        file again, which they must do in order to see the new one.
+
+        :param fileIndex:   The location to write the index to.
+        :type fileIndex:    str
+
+        """
+
+        # Convert the sections into the bytes to be written.
+        sectionData = []
+        for i in _STRING_SECTIONS:
+            offsets = array('q', [0])
+            data = bytearray()
+            for j in getattr(self, _STRING_ATTRIBUTES[i]):
+                data.extend(j.encode("utf-8"))
+                offsets.append(len(data))
+            sectionData.append(("{0:s}.offsets".format(i), offsets.tobytes()))
+            sectionData.append((i, bytes(data)))
+        for i in _INTEGER_SECTIONS:
+            if not i.endswith(".offsets"):
+                sectionData.append((i, array(_INTEGER_SECTIONS[i], getattr(self, _INTEGER_ATTRIBUTES[i])).tobytes()))
+
+        # Lay out the file.
+        releaseID = (self.releaseID or "").encode("utf-8")
+        position = _HEADER.size + len(releaseID) + _DIRECTORY_ENTRY.size * len(sectionData)
+        directory = []
+        for name, data in sectionData:
+            position += -position % 8  # Align the section.
+            directory.append(_DIRECTORY_ENTRY.pack(name.encode("utf-8"), position, len(data)))
+            position += len(data)
+
+        # Write the file.
+        fileTemporary = "{0:s}.tmp{1:d}".format(fileIndex, os.getpid())
+        with open(fileTemporary, "wb") as fidIndex:
+            fidIndex.write(_HEADER.pack(_FILE_MAGIC, _FILE_VERSION, sys.byteorder == "big", len(releaseID),
+                                        len(sectionData)))
+            fidIndex.write(releaseID)
+            fidIndex.write(b"".join(directory))
+            for _, data in sectionData:
+                fidIndex.write(b'\0' * (-fidIndex.tell() % 8))
+                fidIndex.write(data)
+        os.replace(fileTemporary, fileIndex)
+
+    def get_codes_from_phrases(self, phrases):
+        """Get the codes that have a description containing all of a set of phrases.
+
+        A phrase matches a description when its tokens occur consecutively in the description's tokens.
+
+        :param phrases: The phrases to search for. These are expected to be lowercase.
+        :type phrases:  list
+        :return:        The codes with a description containing all the phrases.
+        :rtype:         set
+
+        """
+
+        if not phrases:
+            # Every description contains the empty set of phrases.
+            return {self._codes[i] for i in self._termConcepts if i != -1}
+
+        return self._terms_to_codes(self._phrase_terms(phrases))
+
+    def get_codes_from_definition(self, definition):
+        """Get the codes matching a compiled concept definition.
+
+        The concepts matching the positive codes, prefixes and terms are found and the concepts matching the negative
+        ones removed before any of them are converted to codes, so only the final codes are created.
+
+        :param definition:  The compiled concept definition (see DatabaseOperations.compile_concept).
+        :type definition:   dict
+        :return:            The codes matching the definition.
+        :rtype:             set
+
+        """
+
+        conceptIndices = self._match_concepts(definition["Positive"])
+        if conceptIndices:
+            conceptIndices -= self._match_concepts(definition["Negative"])
+        return {self._codes[i] for i in conceptIndices}
+
+    def get_codes_from_words(self, words):
+        """Get the codes that have a description containing all of a bag of words.
+
+        :param words:   The words to search for. These are expected to be lowercase.
+        :type words:    list
+        :return:        The codes with a description containing all the words.
+        :rtype:         set
+
+        """
+
+        return self._terms_to_codes(self._word_terms(words))
+
+    def get_description(self, code):
+        """Get the primary description of a code.
+
+        :param code:    The code to get the description of.
+        :type code:     str
+        :return:        The description of the code, or None if the code is not in the hierarchy (or has no terms).
+        :rtype:         str
+
+        """
+
+        conceptIndex = _find(self._codes, code)
+        if conceptIndex is None or self._primaryTerms[conceptIndex] == -1:
+            return None
+        return self._termDescriptions[self._primaryTerms[conceptIndex]]
+
+    def _match_concepts(self, fields):
+        """Find the concepts matching the codes, prefixes or terms of one field of a compiled concept definition.
+
+        :param fields:  The Positive or Negative field of a compiled concept definition.
+        :type fields:   dict
+        :return:        The integer IDs of the matching concepts.
+        :rtype:         set
+
+        """
+
+        conceptIndices = set()
+
+        # Find the concepts with the codes, and those with codes starting with the prefixes. As the codes are sorted,
+        # the codes starting with a prefix are all next to each other (and, for Read V2, are the same range of concepts
+        # as the prefix's numbers cover in the database).
+        for i in fields["Codes"]:
+            conceptIndex = _find(self._codes, i)
+            if conceptIndex is not None:
+                conceptIndices.add(conceptIndex)
+        for i in fields["Prefixes"]:
+            conceptIndex = bisect_left(self._codes, i)
+            while conceptIndex < len(self._codes) and self._codes[conceptIndex].startswith(i):
+                conceptIndices.add(conceptIndex)
+                conceptIndex += 1
+
+        # Find the concepts described by terms containing the words and phrases of each term.
+        for i in fields["Terms"]:
+            termIndices = self._word_terms(i["words"]) if i["words"] else None
+            if termIndices is None or len(termIndices):
+                termIndices = self._phrase_terms(i["phrases"], termIndices)
+            conceptIndices.update(self._termConcepts[j] for j in termIndices if self._termConcepts[j] != -1)
+
+        return conceptIndices
+
+    def _match_phrase(self, tokens, candidates=None):
+        """Find the terms where a sequence of tokens occurs consecutively.
+
+        :param tokens:      The tokens of the phrase.
+        :type tokens:       list
+        :param candidates:  The sorted integer IDs of the terms to restrict the search to. A value of None searches
+                                all terms.
+        :type candidates:   array.array
+        :return:            The sorted integer IDs of the matching terms.
+        :rtype:             array.array
+
+        """
+
+        if not tokens:
+            return candidates if candidates is not None else array('i', range(len(self._termConcepts)))
+        tokenIndices = {i: _find(self._tokens, i) for i in tokens}
+        if any(i is None for i in tokenIndices.values()):
+            return array('i')
+
+        # Narrow the terms down to those containing every token, and then check the positions of the tokens.
+        postings = [self._token_terms(i) for i in set(tokenIndices.values())]
+        if candidates is not None:
+            postings.append(candidates)
+        termIndices = intersect_postings(postings)
+        if len(tokens) == 1:
+            return termIndices
+
+        matches = array('i')
+        for termIndex in termIndices:
+            tokenPositions = [set(self._token_positions(tokenIndices[i], termIndex)) for i in tokens]
+            if any(all(start + offset in tokenPositions[offset] for offset in range(1, len(tokens)))
+                   for start in tokenPositions[0]):
+                matches.append(termIndex)
+        return matches
+
+    def _rarest_token_count(self, tokens):
+        """Get the number of terms containing the least common token of a phrase.
+
+        :param tokens:  The tokens of the phrase.
+        :type tokens:   list
+        :return:        The number of terms containing the least common token.
+        :rtype:         int
+
+        """
+
+        counts = []
+        for i in tokens:
+            tokenIndex = _find(self._tokens, i)
+            counts.append(0 if tokenIndex is None else len(self._token_terms(tokenIndex)))
+        return min(counts, default=0)
+
+    def _phrase_terms(self, phrases, candidates=None):
+        """Find the terms containing all of a set of phrases.
+
+        :param phrases:     The phrases to search for. These are expected to be lowercase.
+        :type phrases:      list
+        :param candidates:  The sorted integer IDs of the terms to restrict the search to. A value of None searches
+                                all terms.
+        :type candidates:   array.array
+        :return:            The sorted integer IDs of the matching terms.
+        :rtype:             array.array
+
+        """
+
+        # Find the terms containing every phrase, checking the most selective phrases first.
+        termIndices = candidates
+        for tokens in sorted((tokenise(i) for i in phrases), key=self._rarest_token_count):
+            termIndices = self._match_phrase(tokens, termIndices)
+            if not len(termIndices):
+                break
+        return termIndices if termIndices is not None else array('i', range(len(self._termConcepts)))
+
+    def _terms_to_codes(self, termIndices):
+        """Convert the integer IDs of terms to the codes of the concepts they describe.
+
+        :param termIndices: The integer IDs of the terms.
+        :type termIndices:  array.array
+        :return:            The codes of the concepts described by the terms.
+        :rtype:             set
+
+        """
+
+        return {self._codes[self._termConcepts[i]] for i in termIndices if self._termConcepts[i] != -1}
+
+    def _token_positions(self, tokenIndex, termIndex):
+        """Get the positions at which a token occurs in a term.
+
+        :param tokenIndex:  The integer ID of the token.
+        :type tokenIndex:   int
+        :param termIndex:   The integer ID of the term. The term must contain the token.
+        :type termIndex:    int
+        :return:            The positions of the token in the term.
+        :rtype:             array.array or memoryview
+
+        """
+
+        entry = self._tokenOffsets[tokenIndex] + bisect_left(self._token_terms(tokenIndex), termIndex)
+        return self._positions[self._positionOffsets[entry]:self._positionOffsets[entry + 1]]
+
+    def _word_terms(self, words):
+        """Find the terms containing all of a bag of words.
+
+        :param words:   The words to search for. These are expected to be lowercase.
+        :type words:    list
+        :return:        The sorted integer IDs of the matching terms.
+        :rtype:         array.array
+
+        """
+
+        if not words:
+            return array('i')
+        postings = []
+        for i in set(words):
+            wordIndex = _find(self._words, i)
+            if wordIndex is None:
+                # No description contains this word, so no description can contain all of them.
+                return array('i')
+            postings.append(self._wordTerms[self._wordOffsets[wordIndex]:self._wordOffsets[wordIndex + 1]])
+        return intersect_postings(postings)
+
+    def _token_terms(self, tokenIndex):
+        """Get the sorted integer IDs of the terms containing a token.
+
+        :param tokenIndex:  The integer ID of the token.
+        :type tokenIndex:   int
+        :return:            The IDs of the terms.
+        :rtype:             array.array or memoryview
+
+        """
+
+        return self._tokenTerms[self._tokenOffsets[tokenIndex]:self._tokenOffsets[tokenIndex + 1]]
+
+
+class _StringTable(object):
+    """Read only sequence of strings stored as UTF-8 data and the offsets of the boundaries between the strings."""
+
+    def __init__(self, offsets, data):
+        """Initialise the table.
+
+        :param offsets: The offset of the start of each string, followed by the offset of the end of the data.
+        :type offsets:  memoryview
+        :param data:    The UTF-8 encoded strings.
+        :type data:     memoryview
+
+        """
+
+        self._offsets = offsets
+        self._data = data
+
+    def __getitem__(self, index):
+        if not 0 <= index < len(self):
+            raise IndexError("string table index out of range")
+        return bytes(self._data[self._offsets[index]:self._offsets[index + 1]]).decode("utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+
+# The attributes of an InvertedIndex holding each section.
+_STRING_ATTRIBUTES = {"codes": "_codes", "descriptions": "_termDescriptions", "words": "_words", "tokens": "_tokens"}
+_INTEGER_ATTRIBUTES = {
+    "termConcepts": "_termConcepts", "primaryTerms": "_primaryTerms", "wordOffsets": "_wordOffsets",
+    "wordTerms": "_wordTerms", "tokenOffsets": "_tokenOffsets", "tokenTerms": "_tokenTerms",
+    "positionOffsets": "_positionOffsets", "positions": "_positions"
+}
+
+
+def intersect_postings(postings):
+    """Intersect a collection of sorted posting arrays.
+
+    The arrays are intersected from shortest to longest, with each element of the running intersection located in the
+    next array by a binary search that starts from the position of the previous match.
+
+    :param postings:    The sorted posting arrays to intersect.
+    :type postings:     list
+    :return:            The sorted elements present in every array.
+    :rtype:             array.array
+
+    """
+
+    postings = sorted(postings, key=len)
+    result = array('i', postings[0])
+    for longer in postings[1:]:
+        intersection = array('i')
+        position = 0
+        for i in result:
+            position = bisect_left(longer, i, position)
+            if position == len(longer):
+                break
+            if longer[position] == i:
+                intersection.append(i)
+                position += 1
+        result = intersection
+        if not result:
+            break
+    return result
+
+
+def tokenise(text):
+    """Split lowercase text into the tokens used for phrase matching.
+
+    :param text:    The text to tokenise.
+    :type text:     str
+    :return:        The tokens in the order they appear in the text.
+    :rtype:         list
+
+    """
+
+    isBracketedStart = _BRACKET_FINDER.match(text)
+    if isBracketedStart:
+        text = text[isBracketedStart.span()[1]:]
+    tokens = (i.strip(_TOKEN_PUNCTUATION) for i in text.split())
+    return [i for i in tokens if i]
+
+
+def phrase_pattern(phrase):
+    """Create a regular expression that matches the descriptions containing a phrase.
+
+    The expression matches a whole lowercase description exactly when the tokens of the phrase occur consecutively in
+    the tokens of the description (see tokenise), and so lets a phrase be matched in the same way when there's no
+    index of token positions to hand (e.g. by the =~ operator of a Neo4j query). It only uses syntax that means the same
+    to Python and Java.
+
+    :param phrase:  The phrase to match. This is expected to be lowercase.
+    :type phrase:   str
+    :return:        The regular expression, or None if the phrase has no tokens (and so matches every description).
+    :rtype:         str
+
+    """
+
+    tokens = tokenise(phrase)
+    if not tokens:
+        return None
+
+    # Only the characters that aren't letters or digits are escaped, as an escaped letter can mean something else.
+    tokens = [''.join(j if j.isalnum() else '\\' + j for j in i) for i in tokens]
+
+    # Each token of the phrase must be a whole token of the description, possibly wrapped in punctuation. Tokens that
+    # are all punctuation (which tokenise drops) may come between them. A description with a bracketed prefix must have
+    # the prefix (up to the first closing bracket) skipped, so that the phrase can't match within it.
+    tokenPatterns = ["{0:s}*{1:s}{0:s}*".format(_PUNCTUATION_CLASS, i) for i in tokens]
+    separator = "\\s+(?:{0:s}+\\s+)*".format(_PUNCTUATION_CLASS)
+    prefix = "(?:\\[[^\\]\\n]*\\]\\s*|(?!\\[[^\\]\\n]*\\]))(?:.*\\s)?"
+    return prefix + separator.join(tokenPatterns) + "(?:\\s.*)?"
+
+
+def _find(sortedStrings, value):
+    """Find the position of a string in a sorted sequence of strings.
+
+    :param sortedStrings:   The sorted strings.
+    :type sortedStrings:    list or _StringTable
+    :param value:           The string to find.
+    :type value:            str
+    :return:                The position of the string, or None if it is not present.
+    :rtype:                 int
+
+    """
+
+    position = bisect_left(sortedStrings, value)
+    if position < len(sortedStrings) and sortedStrings[position] == value:
+        return position
+    return None
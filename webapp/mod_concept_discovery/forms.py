@@ -2,6 +2,8 @@
 
 # Python imports.
 import io
+import os
+import tempfile
 
 # Flask imports.
 from flask import current_app
@@ -50,18 +52,31 @@ def concept_definitions_validator(form, field):
                                   .format(fileFormat, ", ".join(allowedExtensions[:-1]), allowedExtensions[-1]))
 
         # Validate the uploaded concept(s). The only real constraint on the the concept file is that at least one
-        # concept is defined in the correct format.
-        errors = ConceptCollection.validate_concept_file(uploadContents, fileFormat, isFileUploaded)
+        # concept is defined in the correct format. The concepts are parsed and validated in a single pass, with each
+        # validated concept being saved (one per line) for the concept discovery task to stream back in, so that the
+        # upload is only read once.
+        conceptCollection = ConceptCollection(uploadContents, "json" if fileFormat == "json" else "flatfile",
+                                              isFileUploaded)
+        dirConcepts = current_app.config["CONCEPT_UPLOAD_DIR"]
+        os.makedirs(dirConcepts, exist_ok=True)
+        fdConcepts, fileConcepts = tempfile.mkstemp(suffix=".jsonl", dir=dirConcepts)
+        with open(fdConcepts, 'w', encoding="utf-8") as fidConcepts:
+            numberOfConcepts = ConceptCollection.write_concepts(conceptCollection, fidConcepts)
+        errors = conceptCollection.errors
 
         if errors:
             # Found an error in the uploaded file or text area.
+            os.remove(fileConcepts)
             if not isFileUploaded:
                 form.conceptSubmit.errors.append("Errors found while validating the pasted text.")
             else:
                 form.conceptSubmit.errors.append("Errors found while validating the uploaded file.")
             form.conceptSubmit.errors.extend(errors)
+        else:
+            # Record the location and number of the validated concepts.
+            form.fileConcepts = fileConcepts
+            form.numberOfConcepts = numberOfConcepts
 
-        uploadContents.seek(0)  # Reset the stream back to the start so that it can be properly validated.
         if isFileUploaded:
             # Only need to detach when it was a file uploaded.
             uploadContents.detach()  # Detach the buffer to prevent TextIOWrapper closing the underlying file.
@@ -79,7 +94,15 @@ class MultiCheckboxField(SelectMultipleField):
 
 
 class ConceptUploadForm(Form):
-    """Class representing the form for uploading information about the concepts to find codes for."""
+    """Class representing the form for uploading information about the concepts to find codes for.
+
+    Once validated, the fileConcepts attribute holds the location of the file that the parsed concepts were saved to,
+    and the numberOfConcepts attribute holds the number of concepts saved.
+
+    """
+
+    fileConcepts = None
+    numberOfConcepts = 0
 
     conceptText = TextAreaField()
     textAreaType = RadioField("Concept format:", choices=[("txt", "Flat File"), ("json", "JSON")], default="txt")
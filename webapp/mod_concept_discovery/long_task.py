@@ -1,25 +1,216 @@
-import random
+"""Celery tasks that discover the codes of a file of uploaded concepts.
+
+The main task streams the concepts from the file that the upload form saved them to. Each concept's positive terms
+are split into chunks that are evaluated in parallel by find_codes sub-tasks, with each chunk's codes being found and
+filtered by the concept's negative codes and terms within the searcher (so only the final codes of each chunk are
+returned). Once they're all done, the descriptions of the concept's codes are fetched in parallel by describe_codes
+sub-tasks. Several concepts are evaluated at once, so a large file of concepts keeps the whole worker pool busy, but
+the number is bounded so that the main task's memory doesn't grow with the size of the file.
+
+The sub-tasks are run as groups whose results are polled for by the main task, rather than as chords, as chords can't
+be unlocked when the results are sent back over RPC (the default result backend). The main task holds its worker slot
+while it waits, so the sub-tasks are routed to a queue of their own (see CELERY_ROUTES in the configuration) that must
+be consumed by different workers to those running the main task. Otherwise a worker pool filled with main tasks would
+have no slot left to run their sub-tasks, and the main tasks would wait forever. The main task only fetches the results
+of sub-tasks that are ready, so it never blocks on them.
+
+"""
+
+# Python imports.
+import os
 import time
 
-from .. import celeryInstance
+# 3rd party imports.
+from celery import group
+
+# User imports.
+from .. import app, celeryInstance
+from .ConceptCollection import ConceptCollection
+from .search_backend import get_search_backend
+
+
+# The number of seconds to wait between checks of whether the sub-tasks of the concepts being evaluated are done.
+_POLL_INTERVAL = 0.25
 
 
 @celeryInstance.task(bind=True)
-def main(self, x, y):
-    """Background task that runs a long function with progress reports."""
-    verb = ['Starting up', 'Booting', 'Repairing', 'Loading', 'Checking']
-    adjective = ['master', 'radiant', 'silent', 'harmonic', 'fast']
-    noun = ['solar array', 'particle reshaper', 'cosmic ray', 'orbiter', 'bit']
-    message = ''
-    total = random.randint(10, 50)
-    for i in range(total):
-        if not message or random.random() < 0.25:
-            message = '{0} {1} {2}...'.format(random.choice(verb),
-                                              random.choice(adjective),
-                                              random.choice(noun))
-        self.update_state(state='PROGRESS',
-                          meta={'current': i, 'total': total,
-                                'status': message})
-        time.sleep(1)
-    return {'current': i, 'total': total, 'status': 'Task completed!',
-            'result': x + y}
+def main(self, fileConcepts, codeFormats, numberOfConcepts):
+    """Find the codes (and their descriptions) of each concept in a file, reporting the concepts done as progress.
+
+    :param fileConcepts:        The location of the file of concepts saved by the upload form. The file is deleted
+                                    once the concepts have been evaluated.
+    :type fileConcepts:         str
+    :param codeFormats:         The code formats to find codes from.
+    :type codeFormats:          list
+    :param numberOfConcepts:    The number of concepts in the file.
+    :type numberOfConcepts:     int
+    :return:                    The final progress of the task, with the result holding the name of each concept and
+                                    the codes found for it (as [code, description] pairs keyed by code format), in the
+                                    order that the concepts appear in the file.
+    :rtype:                     dict
+
+    """
+
+    maxInFlight = app.config["DISCOVERY_CONCEPTS_IN_FLIGHT"]
+    results = {}  # The results of the concepts that have been evaluated, keyed by their position in the file.
+    inFlight = []  # The concepts being evaluated, as [position in file, evaluation, sub-tasks being waited on].
+    self.update_state(state="PROGRESS", meta={"current": 0, "total": numberOfConcepts, "status": "Starting..."})
+
+    try:
+        with open(fileConcepts, 'r', encoding="utf-8") as fidConcepts:
+            for index, (concept, definition) in enumerate(ConceptCollection(fidConcepts, "jsonlines")):
+                # Start evaluating the concept.
+                evaluation = [index, _evaluate_concept(concept, definition, codeFormats), None]
+                if not _advance_evaluation(evaluation, None, results):
+                    inFlight.append(evaluation)
+
+                # Wait for room to evaluate the next concept.
+                while len(inFlight) >= maxInFlight:
+                    inFlight = _wait_for_evaluations(self, inFlight, results, numberOfConcepts)
+
+        # Wait for the last concepts to be evaluated.
+        while inFlight:
+            inFlight = _wait_for_evaluations(self, inFlight, results, numberOfConcepts)
+    finally:
+        os.remove(fileConcepts)
+
+    return {"current": len(results), "total": numberOfConcepts, "status": "Task completed!",
+            "result": [results[i] for i in sorted(results)]}
+
+
+@celeryInstance.task
+def describe_codes(codes, codeFormat):
+    """Get the descriptions of a chunk of codes from one code format.
+
+    :param codes:       The codes to get the descriptions of.
+    :type codes:        list
+    :param codeFormat:  The code format the codes are from.
+    :type codeFormat:   str
+    :return:            A [code, description] pair for each code that is in the code format, in the order of the codes.
+    :rtype:             list
+
+    """
+
+    descriptions = {i: j for i, _, j in get_search_backend(app.config).iter_descriptions(codes, [codeFormat])}
+    return [[i, descriptions[i]] for i in codes if i in descriptions]
+
+
+@celeryInstance.task
+def find_codes(definition, codeFormats):
+    """Find the codes matching a (chunk of a) concept definition.
+
+    :param definition:  The definition to find the codes of.
+    :type definition:   dict
+    :param codeFormats: The code formats to search.
+    :type codeFormats:  list
+    :return:            The codes matching the definition, keyed by code format.
+    :rtype:             dict
+
+    """
+
+    codes = get_search_backend(app.config).get_concept_codes(definition, codeFormats)
+    return {i: sorted(codes[i]) for i in codes}
+
+
+def _advance_evaluation(evaluation, subTaskResults, results):
+    """Continue the evaluation of a concept up to the point where it next needs to wait for sub-tasks.
+
+    :param evaluation:      The concept being evaluated, as [position in file, evaluation, sub-tasks being waited on].
+                                The sub-tasks being waited on are updated in place.
+    :type evaluation:       list
+    :param subTaskResults:  The results of the sub-tasks the evaluation was waiting on (None when it is starting).
+    :type subTaskResults:   list
+    :param results:         The results of the concepts that have been evaluated, keyed by their position in the file.
+                                The concept's result is added when its evaluation finishes.
+    :type results:          dict
+    :return:                Whether the evaluation has finished.
+    :rtype:                 bool
+
+    """
+
+    try:
+        evaluation[2] = evaluation[1].send(subTaskResults)
+    except StopIteration as finished:
+        results[evaluation[0]] = finished.value
+        return True
+    return False
+
+
+def _evaluate_concept(concept, definition, codeFormats):
+    """Evaluate a concept, yielding each group of sub-tasks that the evaluation needs to wait for.
+
+    The results of each group of sub-tasks must be sent back to the generator in order for the evaluation to continue.
+
+    :param concept:     The name of the concept.
+    :type concept:      str
+    :param definition:  The definition of the concept.
+    :type definition:   dict
+    :param codeFormats: The code formats to find codes from.
+    :type codeFormats:  list
+    :return:            The result of the concept, made up of its name and the [code, description] pairs of the codes
+                            found for it keyed by code format.
+    :rtype:             generator
+
+    """
+
+    # Evaluate the concept in chunks of its positive terms. Each chunk is evaluated against the whole negative
+    # definition, so that the searcher only returns the final codes of the chunk, and the concept's codes are the
+    # union of those of the chunks. The positive codes are evaluated with the first chunk.
+    termsPerTask = app.config["DISCOVERY_TERMS_PER_TASK"]
+    positiveTerms = definition["Positive"]["Terms"]
+    positiveCodes = definition["Positive"]["Codes"]
+    definitionChunks = [
+        {"Positive": {"Codes": positiveCodes if i == 0 else [], "Terms": positiveTerms[i:i + termsPerTask]},
+         "Negative": definition["Negative"]}
+        for i in range(0, max(len(positiveTerms), 1), termsPerTask)
+    ]
+    searchResults = yield group(find_codes.s(i, codeFormats) for i in definitionChunks).apply_async()
+    conceptCodes = [(i, sorted(set().union(*[j[i] for j in searchResults]))) for i in codeFormats]
+
+    # Fetch the descriptions of the codes in chunks. Codes that are not in a code format (e.g. a positive code from a
+    # different format) have no description in it and are dropped.
+    codesPerTask = app.config["DISCOVERY_CODES_PER_TASK"]
+    codeChunks = [
+        (i, codes[j:j + codesPerTask]) for i, codes in conceptCodes for j in range(0, len(codes), codesPerTask)
+    ]
+    describeResults = []
+    if codeChunks:
+        describeResults = yield group(describe_codes.s(codes, i) for i, codes in codeChunks).apply_async()
+
+    descriptions = {i: [] for i in codeFormats}
+    for (codeFormat, _), i in zip(codeChunks, describeResults):
+        descriptions[codeFormat].extend(i)
+    return {"concept": concept, "codes": descriptions}
+
+
+def _wait_for_evaluations(task, inFlight, results, numberOfConcepts):
+    """Wait for at least one concept being evaluated to make progress, and report the concepts done.
+
+    :param task:                The main task, used to report progress.
+    :type task:                 celery.Task
+    :param inFlight:            The concepts being evaluated, as [position in file, evaluation, sub-tasks being waited
+                                    on].
+    :type inFlight:             list
+    :param results:             The results of the concepts that have been evaluated, keyed by their position in the
+                                    file.
+    :type results:              dict
+    :param numberOfConcepts:    The number of concepts in the file.
+    :type numberOfConcepts:     int
+    :return:                    The concepts still being evaluated.
+    :rtype:                     list
+
+    """
+
+    while True:
+        readyEvaluations = [i for i in inFlight if i[2].ready()]
+        if readyEvaluations:
+            break
+        time.sleep(_POLL_INTERVAL)
+
+    # Continue the evaluations whose sub-tasks are done. Sub-task failures are raised here, failing the main task.
+    finishedPositions = {i[0] for i in readyEvaluations if _advance_evaluation(i, i[2].get(), results)}
+    task.update_state(state="PROGRESS", meta={
+        "current": len(results), "total": numberOfConcepts,
+        "status": "Found the codes of {0:d} of {1:d} concepts.".format(len(results), numberOfConcepts)
+    })
+    return [i for i in inFlight if i[0] not in finishedPositions]
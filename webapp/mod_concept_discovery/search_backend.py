@@ -0,0 +1,68 @@
+"""Selection of the backend used to search for codes."""
+
+# Python imports.
+import os
+import threading
+
+# User imports.
+from .AsyncDatabaseOperations import ConcurrentDatabaseOperations
+from .IndexOperations import IndexOperations
+
+
+_indexOperations = None  # The in-memory indices, built the first time they're needed by this process.
+_indexSignature = None  # The state of the files that the indices were built from.
+_indexLock = threading.Lock()  # Ensures the indices are only built once per version of the files.
+
+
+def get_search_backend(config):
+    """Get the object used to search for codes, as chosen by the SEARCH_BACKEND configuration value.
+
+    Valid values of SEARCH_BACKEND are:
+        neo4j   - search the Neo4j database, querying the code formats concurrently
+        index   - search in-memory inverted indices built from the files given by the ONTOLOGY_FILES configuration value
+
+    The indices are kept for the lifetime of the process, so they need to be rebuilt when a new release is written to
+    the files (e.g. by update_controller). Each call checks whether the files have been replaced or modified since the
+    indices were built, and reloads them if so. Searches already running on the old indices are unaffected.
+
+    :param config:  The application's configuration.
+    :type config:   flask.Config or dict
+    :return:        An object with the query methods of DatabaseOperations.
+    :rtype:         ConcurrentDatabaseOperations or IndexOperations
+
+    """
+
+    global _indexOperations, _indexSignature
+    backend = config.get("SEARCH_BACKEND", "neo4j").lower()
+    if backend == "neo4j":
+        return ConcurrentDatabaseOperations(config["DATABASE_URI"], config["DATABASE_USERNAME"],
+                                            config["DATABASE_PASSWORD"], config["DATABASE_CONCURRENT_QUERIES"])
+    elif backend == "index":
+        signature = _file_signature(config["ONTOLOGY_FILES"])
+        with _indexLock:
+            if _indexOperations is None or signature != _indexSignature:
+                _indexOperations = IndexOperations.from_files(config["ONTOLOGY_FILES"])
+                _indexSignature = signature
+            return _indexOperations
+    else:
+        raise ValueError("{0:s} is not a permissible value for SEARCH_BACKEND".format(str(backend)))
+
+
+def _file_signature(ontologyFiles):
+    """Summarise the state of a set of ontology files, so that a new release being written to them can be detected.
+
+    Index files are replaced rather than overwritten when a new release is written, so the inode of each file is
+    included along with its modification time and size.
+
+    :param ontologyFiles:   The location of the index or data file for each code format.
+    :type ontologyFiles:    dict
+    :return:                The location, inode, modification time and size of each file, in order of code format.
+    :rtype:                 tuple
+
+    """
+
+    signature = []
+    for i in sorted(ontologyFiles):
+        fileStats = os.stat(ontologyFiles[i])
+        signature.append((ontologyFiles[i], fileStats.st_ino, fileStats.st_mtime_ns, fileStats.st_size))
+    return tuple(signature)
@@ -14,7 +14,8 @@ def upload_concepts():
 
     if uploadForm.validate_on_submit():
         # A POST request was made and the form was successfully validated, so concept discovery can begin.
-        task = long_task.main.apply_async(args=[10, 11])
+        task = long_task.main.apply_async(
+            args=[uploadForm.fileConcepts, [uploadForm.codeFormats.data], uploadForm.numberOfConcepts])
         return redirect(url_for("conceptDiscovery.view_concepts", taskID=task.id))
 
     return render_template("mod_concept_discovery/upload_concepts.html", form=uploadForm)
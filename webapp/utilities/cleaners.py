@@ -4,6 +4,30 @@
 import re
 
 
+# The punctuation that is stripped from the start and end of words.
+_END_PUNCTUATION = ".,-+*%&:;?![]{}()'=\""
+
+# The words (e.g. stop words) and hanging punctuation that are removed.
+_WORDS_TO_REMOVE = frozenset(
+    ['a', "an", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of", "on", "that", "the", "this", "to",
+     "was", "with"] + list(_END_PUNCTUATION)
+)
+
+# Used to remove a bracketed prefix (e.g. the [V] in [V]XXX) from the start of a description.
+_BRACKETED_START = re.compile("\[.*?\]\s*")
+
+# Used to find the quoted phrases in a term. The phrase can't contain a quote, so each unmatched quote is only scanned
+# past once.
+_QUOTED_PHRASE = re.compile('("[^"\n]*")')
+
+# Used to replace white space.
+_WHITESPACE = re.compile("\s+")
+
+# The separator placed between the unquoted sections of terms so that they can be cleaned together. It must not be
+# whitespace, so that the cleaning leaves it in place.
+_SECTION_SEPARATOR = '\0'
+
+
 def input_word_cleaner(words):
     """Clean a collection of words to remove stop words, undesirable punctuation, etc.
 
@@ -14,58 +38,141 @@ def input_word_cleaner(words):
 
     """
 
-    # Identify start and stop punctuation to remove.
-    endPunctuation = {'.', ',', '-', '+', '*', '%', '&', ':', ';', '?', '!', '[', ']', '{', '}', '(', ')', "'", '=',
-                      '"'}
+    # Strip words that need removing, then strip the start and end punctuation from those that are left, keeping any
+    # word that has something left.
+    return list(filter(None, [i.strip(_END_PUNCTUATION) for i in words if i not in _WORDS_TO_REMOVE]))
+
+
+def tokenise_description(description):
+    """Split a description into its cleaned, lowercase words.
 
-    # Identify the words (e.g. stop words) and hanging punctuation that should be removed.
-    wordsToRemove = {'a', "an", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of", "on", "that",
-                     "the", "this", "to", "was", "with", "the"}
-    wordsToRemove |= endPunctuation
+    :param description: The description to split.
+    :type description:  str
+    :return:            The cleaned words of the description. See tokenise_descriptions.
+    :rtype:             list
 
-    # Strip words that need removing, and convert all " to ' as " can not be in a Neo4j property value.
-    subsetWords = [i for i in words if i not in wordsToRemove]
+    """
+
+    return tokenise_descriptions([description])[0]
+
+
+def tokenise_descriptions(descriptions):
+    """Split many descriptions into their cleaned, lowercase words at once.
+
+    Each description is lowercased, any bracketed prefix (e.g. the [V] in [V]XXX) is removed so that the word after it
+    can be matched as a real word, the description is split on whitespace and the words are cleaned as by
+    input_word_cleaner.
+
+    :param descriptions:    The descriptions to split.
+    :type descriptions:     iterable
+    :return:                The cleaned words of each description.
+    :rtype:                 list
+
+    """
 
-    # Clean start and end punctuation.
-    cleanedWords = []
-    for i in subsetWords:
-        while i and i[0] in endPunctuation:
-            i = i[1:]
-        while i and i[-1] in endPunctuation:
-            i = i[:-1]
-        if i:
-            # If there is anything left of the word, then record it.
-            cleanedWords.append(i)
+    # Bind the tables (and methods) to locals, as they're looked up for every word.
+    endPunctuation = _END_PUNCTUATION
+    wordsToRemove = _WORDS_TO_REMOVE
+    findBracketedStart = _BRACKETED_START.match
 
-    return cleanedWords
+    tokenLists = []
+    addTokens = tokenLists.append
+    for i in descriptions:
+        i = i.lower()
+        if i.startswith('['):
+            isBracketedStart = findBracketedStart(i)
+            if isBracketedStart:
+                i = i[isBracketedStart.end():]
+        addTokens(list(filter(None, [j.strip(endPunctuation) for j in i.split() if j not in wordsToRemove])))
+    return tokenLists
 
 
 def term_cleaner(term):
-        """Clean a term by turning consecutive whitespace into a single space.
-
-        Whitespace within quotations is not altered. For example,
-        '  the    dog \t\t  " jumped   over   the    "     fence    '
-        becomes:
-        'the dog " jumped   over   the    " fence'
-
-        :param term:    The term to clean.
-        :type term:     str
-        :return:        The cleaned term.
-        :rtype:         str
-
-        """
-
-        findWhitespace = re.compile("\s+")  # Used to replace white space.
-
-        currentTermIndex = 0  # The current position in the string to begin the whitespace removal at.
-        newTerm = ""  # The new whitespace stripped term being constructed.
-        for i in re.finditer('(".*?")', term.strip()):
-            # Find all sections of non-overlapping quoted characters (matching starts form the left).
-            # For each match we take the characters between it and the end of the previous match and convert any
-            # whitespace into a single space.
-            subString = findWhitespace.sub(' ', term[currentTermIndex:i.span()[0]])
-            newTerm += subString + i.group()  # Added the whitespace subbed string and the match to the new term.
-            currentTermIndex = i.span()[1] + 1
-        subString = findWhitespace.sub(' ', term[currentTermIndex:])  # Substitute in the string after the final match.
-        newTerm += subString
-        return newTerm
+    """Clean a term by turning consecutive whitespace into a single space.
+
+    Whitespace within quotations is not altered. For example,
+    '  the    dog \t\t  " jumped   over   the    "     fence    '
+    becomes:
+    'the dog " jumped   over   the    " fence'
+
+    :param term:    The term to clean.
+    :type term:     str
+    :return:        The cleaned term.
+    :rtype:         str
+
+    """
+
+    term = term.strip()
+    if term.count('"') < 2:
+        # A term needs two quotes to contain a quoted phrase.
+        return _WHITESPACE.sub(' ', term)
+
+    # Splitting on the (captured) quoted phrases leaves the unquoted sections at the even indices.
+    sections = _QUOTED_PHRASE.split(term)
+    sections[::2] = [_WHITESPACE.sub(' ', i) for i in sections[::2]]
+    return ''.join(sections)
+
+
+def terms_cleaner(terms):
+    """Clean many terms at once by turning consecutive whitespace outside of quotations into a single space.
+
+    Each term containing at least two quotes is split into its quoted and unquoted sections in a single scan (the
+    quoted sections are matched from the left, and an unmatched quote is treated as unquoted text). The unquoted
+    sections of all the terms are then joined with a separator that isn't whitespace, so that their whitespace is
+    collapsed by one substitution over the whole batch, rather than by one substitution per section.
+
+    :param terms:   The terms to clean.
+    :type terms:    iterable
+    :return:        The cleaned terms. See term_cleaner.
+    :rtype:         list
+
+    """
+
+    terms = [i.strip() for i in terms]
+    if any(_SECTION_SEPARATOR in i for i in terms):
+        # The separator can't be told apart from the terms' own characters, so clean the terms one at a time.
+        return [term_cleaner(i) for i in terms]
+
+    # Split the terms into their sections. Splitting on the (captured) quoted phrases leaves the unquoted sections at
+    # the even indices. A term needs two quotes to contain a quoted phrase, so the others are a single section.
+    splitQuotedPhrases = _QUOTED_PHRASE.split
+    termSections = [splitQuotedPhrases(i) if i.count('"') > 1 else i for i in terms]
+
+    # Collapse the whitespace of the unquoted sections of every term at once.
+    unquotedSections = _WHITESPACE.sub(' ', _SECTION_SEPARATOR.join(
+        [j for i in termSections for j in (i[::2] if isinstance(i, list) else (i,))])).split(_SECTION_SEPARATOR)
+
+    # Put the cleaned unquoted sections back between the quoted ones.
+    cleanedTerms = []
+    position = 0
+    for i in termSections:
+        if isinstance(i, list):
+            numberUnquoted = (len(i) + 1) // 2
+            i[::2] = unquotedSections[position:position + numberUnquoted]
+            cleanedTerms.append(''.join(i))
+            position += numberUnquoted
+        else:
+            cleanedTerms.append(unquotedSections[position])
+            position += 1
+    return cleanedTerms
+
+
+def split_term(term):
+    """Split a term into the words and quoted phrases that a description must contain in order to match it.
+
+    For example, '"type 2" diabetes mellitus' is split into the words ["diabetes", "mellitus"] and the phrases
+    ["type 2"]. The words are cleaned in the same way as the words of descriptions (see tokenise_descriptions), while
+    the phrases are only lowercased.
+
+    :param term:    The term to split.
+    :type term:     str
+    :return:        The cleaned words and the phrases of the term.
+    :rtype:         list, list
+
+    """
+
+    # Splitting on the (captured) quoted phrases leaves the unquoted sections at the even indices.
+    sections = _QUOTED_PHRASE.split(term)
+    phrases = [i[1:-1].lower() for i in sections[1::2] if i[1:-1].strip()]
+    words = tokenise_description(' '.join(sections[::2]))
+    return words, phrases
@@ -0,0 +1,213 @@
+"""Process-wide management of the Neo4j drivers (and their pools of sessions) used by the application.
+
+Creating a driver means a new Bolt handshake and authentication for every connection it opens, so a single driver is
+kept per database and user for the lifetime of the process. Callers borrow sessions from it and hand them back to the
+driver's pool when they are finished with them.
+
+Queries that are run concurrently (see DatabaseOperations.iter_descriptions and AsyncDatabaseOperations) are run in a
+set of worker threads that is also shared by the whole process. There is one thread for each session a driver keeps in
+its pool, so the queries running at once can all reuse pooled sessions rather than opening new connections.
+
+"""
+
+# Python imports.
+import atexit
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import os
+import threading
+
+# 3rd party imports.
+import neo4j.v1 as neo
+
+
+_drivers = {}  # The drivers in use by this process, keyed by a (database address, username) tuple.
+_driverLock = threading.Lock()  # Guards the creation and removal of drivers (and the creation of the worker threads).
+_executor = None  # The worker threads that run concurrent queries for this process, created when first needed.
+_ownerPID = os.getpid()  # The process that created the drivers. Drivers must not be shared across a fork.
+_poolSize = 50  # The maximum number of idle sessions each driver keeps open.
+
+
+def configure(poolSize):
+    """Set the size of the session pool used by drivers (and of the worker threads) created after this call.
+
+    :param poolSize:    The maximum number of idle sessions a driver will keep open for reuse.
+    :type poolSize:     int
+
+    """
+
+    global _poolSize
+    if poolSize < 1:
+        raise ValueError("The session pool size must be at least 1, not {0:d}.".format(poolSize))
+    _poolSize = poolSize
+
+
+def init_app(app):
+    """Set up the driver management for a Flask application.
+
+    The pool size (and so the number of worker threads) is taken from the DATABASE_POOL_SIZE configuration value, and
+    all drivers are closed when the process exits.
+
+    :param app: The application that will be querying the database.
+    :type app:  flask.Flask
+
+    """
+
+    configure(app.config.get("DATABASE_POOL_SIZE", _poolSize))
+    atexit.register(close_all)
+
+
+def get_driver(databaseAddress, username, password):
+    """Get the driver shared by this process for a given database and user, creating it if needed.
+
+    :param databaseAddress:     The location of the database to connect to.
+    :type databaseAddress:      str
+    :param username:            The username used to access the database.
+    :type username:             str
+    :param password:            The password associated with the username.
+    :type password:             str
+    :return:                    The driver for the database.
+    :rtype:                     neo4j.v1.Driver
+
+    """
+
+    if os.getpid() != _ownerPID:
+        # The process has been forked (e.g. into a Celery worker) since the drivers were created. The parent's sockets
+        # can't be safely shared, so start afresh.
+        reset_after_fork()
+
+    key = (databaseAddress, username)
+    driver = _drivers.get(key)
+    if driver is None:
+        with _driverLock:
+            # Check again now that the lock is held, as another thread may have created the driver in the meantime.
+            driver = _drivers.get(key)
+            if driver is None:
+                driver = neo.GraphDatabase.driver(databaseAddress, auth=neo.basic_auth(username, password),
+                                                  max_pool_size=_poolSize)
+                _drivers[key] = driver
+    return driver
+
+
+def get_executor():
+    """Get the worker threads shared by this process for running queries concurrently, creating them if needed.
+
+    :return:    The executor running the worker threads.
+    :rtype:     concurrent.futures.ThreadPoolExecutor
+
+    """
+
+    global _executor
+    if os.getpid() != _ownerPID:
+        # Threads don't survive a fork (e.g. into a Celery worker), so the parent's worker threads are missing.
+        reset_after_fork()
+
+    if _executor is None:
+        with _driverLock:
+            # Check again now that the lock is held, as another thread may have created the executor in the meantime.
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=_poolSize)
+    return _executor
+
+
+@contextmanager
+def session(databaseAddress, username, password):
+    """Borrow a session from the pool of the shared driver for a database.
+
+    The session is returned to the driver's pool when the with block exits.
+
+    :param databaseAddress:     The location of the database to connect to.
+    :type databaseAddress:      str
+    :param username:            The username used to access the database.
+    :type username:             str
+    :param password:            The password associated with the username.
+    :type password:             str
+    :return:                    A session connected to the database.
+    :rtype:                     neo4j.v1.Session
+
+    """
+
+    borrowedSession = get_driver(databaseAddress, username, password).session()
+    try:
+        yield borrowedSession
+    finally:
+        borrowedSession.close()
+
+
+def check_health(databaseAddress, username, password):
+    """Determine whether the database can be reached using the shared driver.
+
+    A driver that fails the check is discarded so that the next request for it creates a fresh one.
+
+    :param databaseAddress:     The location of the database to connect to.
+    :type databaseAddress:      str
+    :param username:            The username used to access the database.
+    :type username:             str
+    :param password:            The password associated with the username.
+    :type password:             str
+    :return:                    Whether a trivial query could be run on the database.
+    :rtype:                     bool
+
+    """
+
+    try:
+        with session(databaseAddress, username, password) as healthSession:
+            result = healthSession.run("RETURN 1 AS alive")
+            return [i["alive"] for i in result] == [1]
+    except Exception:
+        # The database can't be reached (or the driver is broken), so drop the driver.
+        with _driverLock:
+            driver = _drivers.pop((databaseAddress, username), None)
+        if driver is not None:
+            _close_driver(driver)
+        return False
+
+
+def close_all():
+    """Close every driver in use by this process."""
+
+    with _driverLock:
+        drivers = list(_drivers.values())
+        _drivers.clear()
+    for i in drivers:
+        _close_driver(i)
+
+
+def reset_after_fork(**kwargs):
+    """Forget the drivers and worker threads inherited from a parent process.
+
+    The inherited drivers are not closed, as their sockets are still in use by the parent. This can be connected
+    directly to Celery's worker_process_init signal, hence the keyword arguments.
+
+    """
+
+    global _driverLock, _executor, _ownerPID
+    _drivers.clear()
+    _executor = None
+    _driverLock = threading.Lock()
+    _ownerPID = os.getpid()
+
+
+def _close_driver(driver):
+    """Close the connections of the sessions pooled by a driver.
+
+    Drivers have no close method of their own, so the sessions in the driver's pool are removed from it and their
+    connections closed. Sessions borrowed at the time are returned to the discarded driver's pool, and their connections
+    closed when it is garbage collected. Errors from connections whose sockets are already broken are ignored.
+
+    :param driver:  The driver to close.
+    :type driver:   neo4j.v1.Driver
+
+    """
+
+    while True:
+        try:
+            pooledSession = driver.session_pool.pop()
+        except IndexError:
+            # The pool has been drained.
+            break
+        try:
+            pooledSession.connection.close()
+        except OSError:
+            # The connection is being discarded regardless, so there's nothing useful to do with the error.
+            pass
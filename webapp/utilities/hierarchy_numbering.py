@@ -0,0 +1,62 @@
+"""Numbering of the concepts in a code hierarchy, so that a concept and all its descendants can be found as a range.
+
+Each concept is given an interval of numbers [left, right] that holds the left numbers of all its descendants (a nested
+set numbering), so the code and all the descendants of a concept are the concepts whose left number falls within its
+interval. With an index on the left numbers, this is a single range lookup rather than a walk down the hierarchy.
+
+Read V2 codes form a prefix tree (the parent of a code is the code without its last character), so the interval of a
+code can be worked out from the code alone. The code is read as a number in base 128 (one digit per ASCII character),
+padded with zero digits up to the maximum length of a code. Numbering from the codes rather than from a walk of the
+hierarchy means that a concept keeps the same interval from one release to the next, so loading a release never needs
+to renumber the concepts that are already in the database.
+
+"""
+
+# The code formats whose concepts are numbered.
+NUMBERED_CODE_FORMATS = ("ReadV2",)
+
+# The maximum length of a Read V2 code (once its trailing dots are removed), and the number of digits used to number
+# each of its characters.
+_READV2_CODE_LENGTH = 5
+_READV2_CODE_BASE = 128
+
+
+def number_ReadV2_code(code):
+    """Get the interval of numbers that holds a Read V2 code and all its descendants.
+
+    The code need not be in the hierarchy, so the interval of a code prefix (e.g. C10 for C10%) can be found in the
+    same way. The left number of the interval is the number of the code itself.
+
+    :param code:    The code to number, without any trailing dots.
+    :type code:     str
+    :return:        The left and right numbers of the interval, or None if no Read V2 code can start with the code (as
+                        it is too long or contains characters that can't be in a code).
+    :rtype:         tuple or None
+
+    """
+
+    if len(code) > _READV2_CODE_LENGTH or not all(0 < ord(i) < _READV2_CODE_BASE for i in code):
+        return None
+    value = 0
+    for i in code:
+        value = value * _READV2_CODE_BASE + ord(i)
+    width = _READV2_CODE_BASE ** (_READV2_CODE_LENGTH - len(code))  # The size of the interval.
+    return value * width, (value + 1) * width - 1
+
+
+def number_code(codeFormat, code):
+    """Get the interval of numbers that holds a code and all its descendants in a numbered code format.
+
+    :param codeFormat:  The code format of the code. This must be one of NUMBERED_CODE_FORMATS.
+    :type codeFormat:   str
+    :param code:        The code to number.
+    :type code:         str
+    :return:            The left and right numbers of the interval, or None if no code in the format can start with the
+                            code.
+    :rtype:             tuple or None
+
+    """
+
+    if codeFormat == "ReadV2":
+        return number_ReadV2_code(code)
+    raise ValueError("{0:s} is not a numbered code format.".format(codeFormat))
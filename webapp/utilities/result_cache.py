@@ -0,0 +1,215 @@
+"""Caching of the results of code searches, so that repeated searches for the same terms don't go to the database.
+
+Each cached result is keyed by the type of search, the normalised search terms, the code format searched and the
+release of the ontology that the result came from. Loading a new release into the database therefore invalidates the
+old results automatically, as the keys they are stored under will no longer be asked for.
+
+By default results are cached in the memory of each process. Setting the RESULT_CACHE_URL configuration value to the
+URL of a Redis server will instead share the cache between all the processes (e.g. the web server and the Celery
+workers) using that server.
+
+"""
+
+# Python imports.
+from collections import OrderedDict
+import hashlib
+import pickle
+import threading
+import time
+
+
+class LocalBackend(object):
+    """A size bounded, least recently used cache held in the memory of a single process."""
+
+    def __init__(self, maxSize=10000, timeToLive=None):
+        """Initialise an empty cache.
+
+        :param maxSize:     The maximum number of results to hold. The least recently used result is evicted when a new
+                                result would take the cache beyond this size.
+        :type maxSize:      int
+        :param timeToLive:  The number of seconds a result is kept for. A value of None keeps results until evicted.
+        :type timeToLive:   int
+
+        """
+
+        self._maxSize = maxSize
+        self._timeToLive = timeToLive
+        self._entries = OrderedDict()  # Mapping from key to (expiry time, value), ordered from least to most recent.
+        self._lock = threading.Lock()
+
+    def clear(self):
+        """Remove all results from the cache."""
+
+        with self._lock:
+            self._entries.clear()
+
+    def get_many(self, keys):
+        """Get the cached results for a collection of keys.
+
+        :param keys:    The keys to get the results for.
+        :type keys:     list
+        :return:        A mapping from each key that was found in the cache to its result.
+        :rtype:         dict
+
+        """
+
+        found = {}
+        currentTime = time.time()
+        with self._lock:
+            for i in keys:
+                entry = self._entries.get(i)
+                if entry is None:
+                    continue
+                elif entry[0] is not None and entry[0] < currentTime:
+                    # The result has expired.
+                    del self._entries[i]
+                else:
+                    self._entries.move_to_end(i)  # Mark the result as the most recently used.
+                    found[i] = entry[1]
+        return found
+
+    def set_many(self, results):
+        """Add results to the cache.
+
+        :param results: A mapping from keys to the results to cache under them.
+        :type results:  dict
+
+        """
+
+        expiryTime = None if self._timeToLive is None else time.time() + self._timeToLive
+        with self._lock:
+            for i in results:
+                self._entries[i] = (expiryTime, results[i])
+                self._entries.move_to_end(i)
+            while len(self._entries) > self._maxSize:
+                # Evict the least recently used results.
+                self._entries.popitem(last=False)
+
+
+class RedisBackend(object):
+    """A cache held on a Redis server, and therefore shared by all processes that use the server.
+
+    Redis bounds the size of the cache itself, and should be configured with an LRU eviction policy (e.g.
+    maxmemory-policy allkeys-lru) for this to behave in the same way as the LocalBackend.
+
+    """
+
+    def __init__(self, url, timeToLive=None, prefix="ClinicalCodingWebsite:results:"):
+        """Initialise the connection to the Redis server.
+
+        :param url:         The URL of the Redis server (e.g. redis://localhost:6379/0).
+        :type url:          str
+        :param timeToLive:  The number of seconds a result is kept for. A value of None keeps results until evicted.
+        :type timeToLive:   int
+        :param prefix:      The prefix added to the keys of all results, so that they can be identified on the server.
+        :type prefix:       str
+
+        """
+
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("The redis package must be installed in order to use a shared result cache.")
+
+        self._client = redis.StrictRedis.from_url(url)
+        self._timeToLive = timeToLive
+        self._prefix = prefix
+
+    def clear(self):
+        """Remove all results from the cache."""
+
+        keys = list(self._client.scan_iter(match="{0:s}*".format(self._prefix)))
+        if keys:
+            self._client.delete(*keys)
+
+    def get_many(self, keys):
+        """Get the cached results for a collection of keys.
+
+        :param keys:    The keys to get the results for.
+        :type keys:     list
+        :return:        A mapping from each key that was found in the cache to its result.
+        :rtype:         dict
+
+        """
+
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = self._client.mget([self._server_key(i) for i in keys])
+        return {i: pickle.loads(j) for i, j in zip(keys, values) if j is not None}
+
+    def set_many(self, results):
+        """Add results to the cache.
+
+        :param results: A mapping from keys to the results to cache under them.
+        :type results:  dict
+
+        """
+
+        pipeline = self._client.pipeline(transaction=False)
+        for i in results:
+            pipeline.set(self._server_key(i), pickle.dumps(results[i]), ex=self._timeToLive)
+        pipeline.execute()
+
+    def _server_key(self, key):
+        """Convert a key into the string it is stored under on the server.
+
+        :param key: The key to convert. This should be a tuple of strings (and tuples of strings).
+        :type key:  tuple
+        :return:    The key used on the server.
+        :rtype:     str
+
+        """
+
+        return "{0:s}{1:s}".format(self._prefix, hashlib.sha1(repr(key).encode("utf-8")).hexdigest())
+
+
+_cache = LocalBackend()  # The cache used by this process.
+
+
+def init_app(app):
+    """Set up the result cache for a Flask application.
+
+    The cache is configured using the RESULT_CACHE_SIZE, RESULT_CACHE_TTL and RESULT_CACHE_URL configuration values.
+
+    :param app: The application that will be searching for codes.
+    :type app:  flask.Flask
+
+    """
+
+    global _cache
+    timeToLive = app.config.get("RESULT_CACHE_TTL")
+    if app.config.get("RESULT_CACHE_URL"):
+        _cache = RedisBackend(app.config["RESULT_CACHE_URL"], timeToLive)
+    else:
+        _cache = LocalBackend(app.config.get("RESULT_CACHE_SIZE", 10000), timeToLive)
+
+
+def get_cache():
+    """Get the result cache used by this process.
+
+    :return:    The cache.
+    :rtype:     LocalBackend or RedisBackend
+
+    """
+
+    return _cache
+
+
+def make_key(searchType, terms, codeFormat, releaseID):
+    """Create the key that the result of a search is cached under.
+
+    :param searchType:  The type of search performed (e.g. "words" or "phrases").
+    :type searchType:   str
+    :param terms:       The terms searched for. The order of the terms, and their case, is not important.
+    :type terms:        list
+    :param codeFormat:  The code format searched.
+    :type codeFormat:   str
+    :param releaseID:   The identifier of the release of the code format's ontology that was searched.
+    :type releaseID:    str
+    :return:            The key for the search.
+    :rtype:             tuple
+
+    """
+
+    return searchType, tuple(sorted({i.lower() for i in terms})), codeFormat, releaseID